@@ -0,0 +1,74 @@
+import argparse
+import copy
+import json
+import resource
+import sys
+from time import perf_counter
+from scenarios import SCENARIOS
+from model.simulation import ENGINES, Simulation
+from model.instrumentation import Profiler
+from model.OEM import OEM
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # bytes vs kB
+
+
+def run_case(
+    engine: str, population: int, days: int, reman: bool, shards: int | None = None
+) -> dict:
+    config = copy.deepcopy(SCENARIOS["Default"])
+    config["main"].update(
+        BtoB_population=population, simulation_length=days, enable_reman=reman
+    )
+    if shards is not None:
+        config["main"]["shards"] = shards
+    simulation = Simulation(config, engine=engine)
+    world = simulation.world()
+
+    # the customers' share of call_next is what is left after the OEM's
+    profiler = Profiler(count_draws=False)
+    world.tick = profiler.timed("tick", world.tick)
+    recorder = simulation.recorder()
+    recorder.record = profiler.timed("record", recorder.record)
+    world.call_next = profiler.timed("call_next", world.call_next)
+    # agents have __slots__, so the OEM's next() is wrapped on the class for this run only
+    oem_next = OEM.next
+    OEM.next = profiler.timed("oem", oem_next)
+    try:
+        start = perf_counter()
+        simulation.run()
+        seconds = perf_counter() - start
+    finally:
+        OEM.next = oem_next
+    phases = {
+        name: row["seconds"] for name, row in profiler.summary()["phases"].items()
+    }
+    phases["customers"] = phases.pop("call_next") - phases["oem"]
+    return {"seconds": seconds, "phases": phases}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time one benchmark case and print it as JSON, see ../benchmark.py"
+    )
+    parser.add_argument("--engine", choices=ENGINES, default="object")
+    parser.add_argument("--population", type=int, default=100)
+    parser.add_argument("--days", type=int, default=1200)
+    parser.add_argument("--no-reman", dest="reman", action="store_false")
+    parser.add_argument(
+        "--shards", type=int, default=None, help="Shards for the sharded engine"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Runs to take the fastest of"
+    )
+    args = parser.parse_args()
+
+    runs = [
+        run_case(args.engine, args.population, args.days, args.reman, args.shards)
+        for _ in range(args.repeat)
+    ]
+    fastest = min(runs, key=lambda run: run["seconds"])
+    fastest["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(fastest))
@@ -0,0 +1,213 @@
+import argparse
+import csv
+import os
+import numpy as np
+from scenarios import SCENARIOS
+from model.ensemble import (
+    CONTROLS,
+    EnsembleStatistics,
+    VarianceReducedEstimate,
+    replication_seeds,
+)
+from model.export import FORMATS, write_run
+from model.pool import SimulationPool
+from model.simulation import ENGINES
+
+
+def write_tables(
+    name: str, statistics: EnsembleStatistics, output_dir: str, confidence: float
+):
+    os.makedirs(output_dir, exist_ok=True)
+
+    rows = statistics.outcome_table(confidence)
+    with open(
+        os.path.join(output_dir, f"{name}_outcomes.csv"), "w", newline=""
+    ) as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    columns = statistics.daily_table(confidence)
+    with open(os.path.join(output_dir, f"{name}_daily.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(columns.keys())
+        writer.writerows(zip(*columns.values()))
+
+
+def write_reduction(name: str, row: dict, output_dir: str):
+    with open(
+        os.path.join(output_dir, f"{name}_variance_reduction.csv"), "w", newline=""
+    ) as file:
+        writer = csv.DictWriter(file, fieldnames=list(row.keys()))
+        writer.writeheader()
+        writer.writerow(row)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run Monte Carlo replications of a scenario with streaming statistics"
+    )
+    parser.add_argument("--scenario", type=str, default="Default")
+    parser.add_argument(
+        "--replications",
+        type=int,
+        default=100,
+        help="Maximum number of replications",
+    )
+    parser.add_argument(
+        "--min-replications",
+        type=int,
+        default=10,
+        help="Replications to run before the stopping rule is checked",
+    )
+    parser.add_argument(
+        "--ci-half-width",
+        type=float,
+        default=None,
+        help="Stop once the confidence interval on net profit is this narrow (€)",
+    )
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--engine", choices=ENGINES, default="object")
+    parser.add_argument(
+        "--stride", type=int, default=1, help="Record the daily series every k days"
+    )
+    parser.add_argument("--output-dir", type=str, default="ensemble_results")
+    parser.add_argument(
+        "--export-dir",
+        type=str,
+        default=None,
+        help="Also write every replication in binary form to this directory",
+    )
+    parser.add_argument("--format", choices=FORMATS, default=None)
+    parser.add_argument(
+        "--antithetic",
+        action="store_true",
+        help="Run every replication twice, on its random streams and their mirror image",
+    )
+    parser.add_argument(
+        "--control-variates",
+        action="store_true",
+        help="Adjust the net profit estimate by the core acceptance and ad adoption noise",
+    )
+    args = parser.parse_args()
+
+    if args.scenario not in SCENARIOS:
+        raise ValueError(
+            f"Scenario '{args.scenario}' not found. Options are: {list(SCENARIOS.keys())}"
+        )
+    config = SCENARIOS[args.scenario]
+    if config["main"].get("convergence") is not None:
+        raise ValueError(
+            f"Scenario '{args.scenario}' stops early once converged, an ensemble needs "
+            "full-length runs"
+        )
+    seeds = replication_seeds(config["main"]["seed"], args.replications)
+    statistics = EnsembleStatistics(
+        days=np.arange(1, config["main"]["simulation_length"] + 1, args.stride)
+    )
+    # mirrored runs only stay in step with their partner on per-customer streams
+    mirrors = [False, True] if args.antithetic else [False]
+    profit = VarianceReducedEstimate(
+        "Net Profit", CONTROLS if args.control_variates else []
+    )
+
+    print(f"Running up to {args.replications} replications of {args.scenario}")
+    with SimulationPool(args.workers) as pool:
+        # replications are folded in seed order, one batch per round of workers, so the
+        # streaming estimates do not depend on which worker finishes first
+        per_round = max(args.workers // len(mirrors), 1)
+        for start in range(0, args.replications, per_round):
+            batch = [
+                (index, seed, mirrored)
+                for index, seed in enumerate(
+                    seeds[start : start + per_round], start=start
+                )
+                for mirrored in mirrors
+            ]
+            runs = pool.run(
+                [
+                    {
+                        "config": config,
+                        "engine": args.engine,
+                        "seed": seed,
+                        "stride": args.stride,
+                        "paired": args.antithetic,
+                        "antithetic": mirrored,
+                    }
+                    for _, seed, mirrored in batch
+                ]
+            )
+            for (index, _, mirrored), run in zip(batch, runs):
+                # the statistics of the daily series and other outcomes take every run as
+                # it is, only the net profit estimate averages antithetic pairs
+                statistics.add(run)
+                if args.export_dir is not None:
+                    write_run(
+                        os.path.join(
+                            args.export_dir,
+                            f"{args.scenario}_{index:05d}{'_mirrored' if mirrored else ''}",
+                        ),
+                        run,
+                        metadata={
+                            "scenario": args.scenario,
+                            "seed": config["main"]["seed"],
+                            "replication": index,
+                            "mirrored": mirrored,
+                            "engine": args.engine,
+                            "stride": args.stride,
+                            "config": config,
+                        },
+                        format=args.format,
+                    )
+            for group in range(0, len(runs), len(mirrors)):
+                profit.add(runs[group : group + len(mirrors)])
+
+            half_width = profit.half_width(args.confidence)
+            print(
+                f"  {profit.groups():>5} replications: net profit €{profit.mean():,.0f} ± {half_width:,.0f}"
+            )
+            if (
+                args.ci_half_width is not None
+                and profit.groups() >= args.min_replications
+                and half_width <= args.ci_half_width
+            ):
+                print(f"Target half-width of €{args.ci_half_width:,.0f} reached")
+                break
+
+    write_tables(args.scenario, statistics, args.output_dir, args.confidence)
+    reduction = profit.reduction()
+    agent_days = (
+        profit.runs()
+        * config["main"]["BtoB_population"]
+        * config["main"]["simulation_length"]
+    )
+    write_reduction(
+        args.scenario,
+        {
+            "outcome": "Net Profit",
+            "mean": profit.mean(),
+            "half_width": profit.half_width(args.confidence),
+            "runs": profit.runs(),
+            "agent_days": agent_days,
+            "antithetic": args.antithetic,
+            "control_variates": args.control_variates,
+            **{f"reduction_{key}": value for key, value in reduction.items()},
+        },
+        args.output_dir,
+    )
+
+    print("-" * 88)
+    print(f"{'OUTCOME':<40}{'MEAN':>16}{f'{args.confidence:.0%} CI':>32}")
+    print("-" * 88)
+    for row in statistics.outcome_table(args.confidence):
+        interval = f"[{row['ci_low']:,.0f}, {row['ci_high']:,.0f}]"
+        print(f"{row['outcome']:<40}{row['mean']:>16,.2f}{interval:>32}")
+    print("-" * 88)
+    print(
+        f"NET PROFIT (€): {profit.mean():,.2f} ± {profit.half_width(args.confidence):,.2f} from {profit.runs()} runs, {agent_days:,} agent-days"
+    )
+    print(
+        f"Variance reduction vs plain replications: x{reduction['total']:.1f} (antithetic x{reduction['antithetic']:.2f}, control variates x{reduction['control_variates']:.2f})"
+    )
+    print(f"Tables written to {args.output_dir}/")
@@ -0,0 +1,82 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# what a batch run imports, see run_scenario
+CORE_IMPORT = "model.simulation"
+budget_ms: float = 300  # cumulative import time of CORE_IMPORT, numpy included
+# modules the core import must not pull in
+FORBIDDEN = ["matplotlib", "scipy", "pyarrow"]
+
+
+def import_times(module: str) -> dict[str, tuple[float, float]]:
+    """Imports `module` in a fresh interpreter under -X importtime. Returns the (self,
+    cumulative) milliseconds of every module it imported."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(own) / 1000, int(cumulative) / 1000)
+    return times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that importing the model stays fast and plot-free"
+    )
+    parser.add_argument("--module", type=str, default=CORE_IMPORT)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=budget_ms,
+        help="Fail if the median cumulative import time is above this",
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=5,
+        help="Fresh interpreters to time, the median is compared with the budget",
+    )
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list")
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.repeats)]
+    total = statistics.median(times[args.module][1] for times in runs)
+    numpy_total = statistics.median(times.get("numpy", (0, 0))[1] for times in runs)
+    last = runs[-1]
+
+    print("-" * 64)
+    print(f"{'MODULE':<44}{'SELF (ms)':>10}{'CUM (ms)':>10}")
+    print("-" * 64)
+    for name, (own, cumulative) in sorted(
+        last.items(), key=lambda item: item[1][0], reverse=True
+    )[: args.top]:
+        print(f"{name:<44}{own:>10.1f}{cumulative:>10.1f}")
+    print("-" * 64)
+    print(
+        f"import {args.module}: {total:.1f} ms median of {args.repeats}, "
+        f"numpy {numpy_total:.1f} ms, budget {args.budget_ms:.0f} ms"
+    )
+
+    failures = []
+    if total > args.budget_ms:
+        failures.append(
+            f"import took {total:.1f} ms, over the {args.budget_ms:.0f} ms budget"
+        )
+    loaded = sorted({name.split(".")[0] for name in last} & set(FORBIDDEN))
+    if loaded:
+        failures.append(f"{args.module} imports {', '.join(loaded)}")
+    if failures:
+        sys.exit("\n".join(failures))
+    print("Within budget")
@@ -1,9 +1,11 @@
 from __future__ import annotations
 from enum import Enum
+from math import floor
 from typing import TYPE_CHECKING
+import numpy as np
 from ._agent import AgentEnum, BaseAgent
 from .message import Message, MessageType
-from .product import ProductEnum
+from .product import NO_PRODUCT, ProductEnum
 
 
 # Setup Parameters
@@ -23,9 +25,26 @@ core_disposal_cost: float = (
 )
 retail_price_V: float = 1200  # retail price of a virgin unit in EUR
 retail_price_R: float = 900
+allocation: str = "first_come"  # how scarce stock is shared out, see ALLOCATIONS
+
+# how the day's orders for a product in short supply are rationed. "first_come" serves them in
+# the order customers take their turns (lowest ids first in the array engines), which favours
+# whoever is stepped first. "random_priority" collects the day's orders and serves a uniformly
+# random subset of them. It is opt-in: who it serves changes who every later event happens
+# to, which weakens paired, antithetic and control variate comparisons
+ALLOCATIONS = ["first_come", "random_priority"]
+
+# oem config keys that may change mid-run, e.g. when forking a checkpoint. Costs and prices
+# are left out since the financial report applies them to whole-run totals
+TUNABLE_PARAMETERS = [
+    "manufacture_delay",
+    "remanufacture_delay",
+    "core_acceptance_rate",
+]
 
 if TYPE_CHECKING:
     from .world import World
+    from .customer import Customer
 
 
 class OEMStatesEnum(str, Enum):
@@ -33,6 +52,28 @@ class OEMStatesEnum(str, Enum):
 
 
 class OEM(BaseAgent):
+    __slots__ = (
+        "_delivery_delay",
+        "_manufacture_delay",
+        "_remanufacture_delay",
+        "_factory_stock",
+        "_production_rate",
+        "_products_sold",
+        "_total_products_produced",
+        "_core_stock",
+        "_core_acceptance_rate",
+        "_total_cores_collected",
+        "_total_cores_rejected",
+        "_expected_cores_accepted",
+        "_unit_production_cost_V",
+        "_unit_production_cost_R",
+        "_core_collection_cost",
+        "_core_disposal_cost",
+        "_retail_price_V",
+        "_retail_price_R",
+        "_allocation",
+        "_orders",
+    )
     _state: OEMStatesEnum
     _delivery_delay: int
     _manufacture_delay: int  # Sort of the time it takes to meet the demand (must be >=1 as you cant divide by 0)
@@ -45,44 +86,131 @@ class OEM(BaseAgent):
     _core_acceptance_rate: float
     _total_cores_collected: int
     _total_cores_rejected: int
+    _expected_cores_accepted: float  # acceptance rate summed over returned cores
     _unit_production_cost_V: float
     _unit_production_cost_R: float
     _core_collection_cost: float
     _core_disposal_cost: float
     _retail_price_V: float
     _retail_price_R: float
+    _allocation: str
+    _orders: list[tuple[Customer, tuple[ProductEnum, ...]]]  # today's, not yet cleared
 
     def __init__(self, id: int, world: World, config: dict) -> None:
-        if config["manufacture_delay"] < 1:
+        # keys missing from the scenario config fall back to the module-level settings above
+        delays = {
+            "manufacture_delay": config["manufacture_delay"],
+            "remanufacture_delay": config.get(
+                "remanufacture_delay", remanufacture_delay
+            ),
+        }
+        for key, value in delays.items():
+            if value < 1:
+                raise ValueError(f"{key} must be >=1. Received: {value}")
+        rule = config.get("allocation", allocation)
+        if rule not in ALLOCATIONS:
             raise ValueError(
-                f"manufacture_delay must be >=1. Received: {config['manufacture_delay']}"
+                f"allocation must be one of {ALLOCATIONS}. Received: {rule}"
             )
         super().__init__(id=id, type=AgentEnum.OEM, world=world)
         self._state = OEMStatesEnum.OPERATIONAL
         self._delivery_delay = delivery_delay
         self._manufacture_delay = config["manufacture_delay"]
-        self._remanufacture_delay = remanufacture_delay
+        self._remanufacture_delay = config.get(
+            "remanufacture_delay", remanufacture_delay
+        )
         self._factory_stock = {
-            ProductEnum.V: virgin_stock,
+            ProductEnum.V: config.get("virgin_stock", virgin_stock),
             ProductEnum.R: reman_stock,
         }
         self._production_rate = {ProductEnum.V: 0, ProductEnum.R: 0}
         self._products_sold = {ProductEnum.V: 0, ProductEnum.R: 0}
         self._total_products_produced = {ProductEnum.V: 0, ProductEnum.R: 0}
         self._core_stock = core_stock
-        self._core_acceptance_rate = core_acceptance_rate
+        self._core_acceptance_rate = config.get(
+            "core_acceptance_rate", core_acceptance_rate
+        )
         self._total_cores_collected = 0
         self._total_cores_rejected = 0
-        self._unit_production_cost_V = unit_production_cost_V
-        self._unit_production_cost_R = unit_production_cost_R
-        self._core_collection_cost = core_collection_cost
-        self._core_disposal_cost = core_disposal_cost
-        self._retail_price_V = retail_price_V
-        self._retail_price_R = retail_price_R
+        self._expected_cores_accepted = 0.0
+        self._unit_production_cost_V = config.get(
+            "unit_production_cost_V", unit_production_cost_V
+        )
+        self._unit_production_cost_R = config.get(
+            "unit_production_cost_R", unit_production_cost_R
+        )
+        self._core_collection_cost = config.get(
+            "core_collection_cost", core_collection_cost
+        )
+        self._core_disposal_cost = config.get("core_disposal_cost", core_disposal_cost)
+        self._retail_price_V = config.get("retail_price_V", retail_price_V)
+        self._retail_price_R = config.get("retail_price_R", retail_price_R)
+        self._allocation = config.get("allocation", allocation)
+        self._orders = []
 
     def next(self, rng):
         self.update_production()
 
+    def apply_config(self, changes: dict):
+        """Changes operating parameters of a running OEM, see TUNABLE_PARAMETERS."""
+        for key, value in changes.items():
+            if key not in TUNABLE_PARAMETERS:
+                raise ValueError(
+                    f"'{key}' cannot be changed mid-run. Options are: {TUNABLE_PARAMETERS}"
+                )
+            if key.endswith("_delay") and value < 1:
+                raise ValueError(f"{key} must be >=1. Received: {value}")
+        for key, value in changes.items():
+            setattr(self, f"_{key}", value)
+
+    def core_stock(self) -> float:
+        return self._core_stock
+
+    def factory_stock(self, product: ProductEnum) -> float:
+        return self._factory_stock[product]
+
+    def products_sold(self, product: ProductEnum) -> int:
+        return self._products_sold[product]
+
+    def cores_collected(self) -> int:
+        return self._total_cores_collected
+
+    def cores_rejected(self) -> int:
+        return self._total_cores_rejected
+
+    def expected_cores_accepted(self) -> float:
+        return self._expected_cores_accepted
+
+    def allocation(self) -> str:
+        return self._allocation
+
+    def batches_orders(self) -> bool:
+        """Whether customers place orders that are served together at the end of the day,
+        rather than buying on their own turn."""
+        return self._allocation != "first_come"
+
+    def totals(self) -> dict[str, float]:
+        """The running totals the financial report is computed from."""
+        return {
+            "produced_V": self._total_products_produced[ProductEnum.V],
+            "produced_R": self._total_products_produced[ProductEnum.R],
+            "sold_V": self._products_sold[ProductEnum.V],
+            "sold_R": self._products_sold[ProductEnum.R],
+            "cores_collected": self._total_cores_collected,
+            "cores_rejected": self._total_cores_rejected,
+        }
+
+    def extrapolate(self, rates: dict[str, float], days: int):
+        """Grows the totals by `days` days at their steady-state daily `rates`, instead of
+        simulating those days. Counts are rounded to whole units."""
+        for product in ProductEnum:
+            self._total_products_produced[product] += (
+                rates[f"produced_{product.name}"] * days
+            )
+            self._products_sold[product] += round(rates[f"sold_{product.name}"] * days)
+        self._total_cores_collected += round(rates["cores_collected"] * days)
+        self._total_cores_rejected += round(rates["cores_rejected"] * days)
+
     def request_product(self, product: ProductEnum) -> bool:
         currentStock = self._factory_stock[product]
 
@@ -93,20 +221,98 @@ class OEM(BaseAgent):
 
         return False
 
+    def request_products(self, product: ProductEnum, quantity: int) -> int:
+        """Batched request_product: serves as many of `quantity` single-unit orders as stock allows."""
+        currentStock = self._factory_stock[product]
+        served = min(quantity, max(floor(currentStock), 0))
+        self._factory_stock[product] -= served
+        self._products_sold[product] += served
+        return served
+
+    def allocate(self, rng, buyers: np.ndarray, preferences: np.ndarray) -> np.ndarray:
+        """Serves a batch of orders in rounds: everyone asks for their first choice, those left
+        without then ask for their next one. `preferences` holds a row of product codes per
+        buyer, padded with NO_PRODUCT. Where a product runs short within a round, it goes to
+        the lowest buyer ids under "first_come" and to a uniformly random subset of those
+        asking under "random_priority". Returns the code each buyer was served, or NO_PRODUCT.
+
+        The random priority is a random() key per buyer, lowest served first, so that an
+        antithetic run (see AntitheticGenerator) serves the buyers this one left out.
+        """
+        served = np.full(len(preferences), NO_PRODUCT, dtype=np.int8)
+        for rank in range(preferences.shape[1]):
+            choice = preferences[:, rank]
+            waiting = served == NO_PRODUCT
+            for code in np.unique(choice[waiting & (choice != NO_PRODUCT)]):
+                asking = np.flatnonzero(waiting & (choice == code))
+                available = self.request_products(ProductEnum(int(code)), len(asking))
+                if available < len(asking):
+                    # in buyer id order, however the engine happened to list the orders
+                    asking = asking[np.argsort(buyers[asking])]
+                    if self._allocation == "random_priority":
+                        keys = self._world.stream(rng, "allocation", self._id).random(
+                            len(asking)
+                        )
+                        asking = asking[np.argsort(keys)]
+                    asking = asking[:available]
+                served[asking] = code
+        return served
+
+    def place_order(self, customer: Customer, products: tuple[ProductEnum, ...]):
+        """Queues an order for the end of the day, `products` in order of preference."""
+        self._orders.append((customer, products))
+
+    def clear_orders(self, rng) -> list[Customer]:
+        """Serves the orders placed today and tells each customer what it got. Returns those
+        customers, since their next turn may have moved."""
+        if not self._orders:
+            return []
+        orders, self._orders = self._orders, []
+        preferences = np.full(
+            (len(orders), max(len(products) for _, products in orders)),
+            NO_PRODUCT,
+            dtype=np.int8,
+        )
+        for row, (_, products) in enumerate(orders):
+            preferences[row, : len(products)] = products
+        buyers = np.array([customer.id() for customer, _ in orders])
+        served = self.allocate(rng, buyers, preferences)
+        for (customer, products), code in zip(orders, served):
+            customer.fill_order(
+                rng, None if code == NO_PRODUCT else ProductEnum(int(code)), products
+            )
+        return [customer for customer, _ in orders]
+
     def return_proudct(self, rng) -> None:
         self._total_cores_collected += 1
-        if rng.random() < self._core_acceptance_rate:
+        self._expected_cores_accepted += self._core_acceptance_rate
+        if (
+            self._world.stream(rng, "core_acceptance", self._id).random()
+            < self._core_acceptance_rate
+        ):
             self._core_stock += 1
         else:
             self._total_cores_rejected += 1
             pass
 
+    def return_products(self, rng, quantity: int) -> None:
+        """Batched return_proudct: one binomial draw decides how many cores are accepted."""
+        accepted = int(
+            self._world.stream(rng, "core_acceptance", self._id).binomial(
+                quantity, self._core_acceptance_rate
+            )
+        )
+        self._total_cores_collected += quantity
+        self._expected_cores_accepted += quantity * self._core_acceptance_rate
+        self._core_stock += accepted
+        self._total_cores_rejected += quantity - accepted
+
     def update_production(self):
         for product in ProductEnum:
             match product:
                 case ProductEnum.V:
                     self._production_rate[product] = (
-                        self._world._num_wants[product] + self._world._num_wants_any
+                        self._world.num_wants(product) + self._world.num_wants_any()
                     ) / self._manufacture_delay
                     self._factory_stock[product] += self._production_rate[product]
                     self._total_products_produced[product] += self._production_rate[
@@ -120,7 +326,7 @@ class OEM(BaseAgent):
                     # )
                 case ProductEnum.R:
                     desired_production = (
-                        self._world._num_wants[product] + self._world._num_wants_any
+                        self._world.num_wants(product) + self._world.num_wants_any()
                     ) / self._remanufacture_delay
                     maximum_production = self._core_stock / self._remanufacture_delay
 
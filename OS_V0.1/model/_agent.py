@@ -13,6 +13,7 @@ class AgentEnum(str, Enum):  # what does that mean 'enumeration'?
 
 
 class BaseAgent:
+    __slots__ = ("_world", "_id", "_type", "_state")  # no per-instance __dict__
     _world: World
     _id: int
     _type: AgentEnum
@@ -35,5 +36,8 @@ class BaseAgent:
     def next(self, rng):
         return
 
+    def wake_day(self) -> int | None:
+        return None  # agents are polled every day unless they know when they are next needed
+
     def handle_message(self, message: Message, rng):
         pass  # specific functionality overridden by specific agent type
@@ -0,0 +1,177 @@
+from __future__ import annotations
+from enum import Enum
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from types import ModuleType
+import numpy as np
+from . import OEM, cohort, customer, world
+from .export import EXTENSIONS, META_FILE, read_run, write_run
+from .simulation import Result, run_scenario
+
+cache_directory: str = ".run_cache"
+cache_max_bytes: int = 2 * 1024**3  # least recently used runs are evicted beyond this
+
+# modules whose module-level settings (retail prices, delays, ...) change results
+CONFIG_MODULES: list[ModuleType] = [OEM, customer, world, cohort]
+
+
+def module_constants(module: ModuleType) -> dict:
+    """Public module-level settings of a model module, e.g. OEM.retail_price_V."""
+    constants = {}
+    for name, value in vars(module).items():
+        if name.startswith("_") or isinstance(value, (type, ModuleType, Enum)):
+            continue
+        if isinstance(value, (bool, int, float, str, tuple, list, dict)):
+            constants[name] = value
+    return constants
+
+
+def model_fingerprint() -> str:
+    """Hash of the model package source, so any code change invalidates the cache."""
+    digest = hashlib.sha256()
+    package = os.path.dirname(__file__)
+    for name in sorted(os.listdir(package)):
+        if name.endswith(".py"):
+            with open(os.path.join(package, name), "rb") as file:
+                digest.update(name.encode())
+                digest.update(file.read())
+    return digest.hexdigest()
+
+
+def seed_description(seed: int | np.random.SeedSequence | None) -> object:
+    if isinstance(seed, np.random.SeedSequence):
+        return {"entropy": seed.entropy, "spawn_key": list(seed.spawn_key)}
+    return seed
+
+
+def cache_key(
+    config: dict,
+    engine: str,
+    seed: int | np.random.SeedSequence | None = None,
+    stride: int = 1,
+    paired: bool = False,
+) -> str:
+    """Content address of a run: resolved config, seed, engine, model settings and source."""
+    description = {
+        "config": {section: config[section] for section in ("main", "oem", "customer")},
+        "engine": engine,
+        "seed": seed_description(seed),
+        "stride": stride,
+        "paired": paired,
+        "constants": {
+            module.__name__: module_constants(module) for module in CONFIG_MODULES
+        },
+        "model": model_fingerprint(),
+    }
+    encoded = json.dumps(description, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ResultCache:
+    """On-disk store of finished runs keyed by `cache_key`, with least-recently-used eviction."""
+
+    _directory: str
+    _max_bytes: int
+
+    def __init__(
+        self, directory: str = cache_directory, max_bytes: int = cache_max_bytes
+    ) -> None:
+        self._directory = directory
+        self._max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self._directory, key + EXTENSIONS["npy"])
+
+    def get(self, key: str) -> Result | None:
+        path = self.path(key)
+        if not os.path.isdir(path):
+            return None
+        os.utime(os.path.join(path, META_FILE))  # marks it as recently used
+        stored = read_run(path)
+        return Result(stored.columns, stored.report)
+
+    def put(self, key: str, run: Result, metadata: dict):
+        # written next to the cache and renamed into place, so readers never see half a run
+        staging = tempfile.mkdtemp(dir=self._directory, prefix=".staging-")
+        written = write_run(os.path.join(staging, key), run, metadata, format="npy")
+        try:
+            os.rename(written, self.path(key))
+        except OSError:
+            pass  # another process stored the same run first
+        shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def get_or_run(
+        self,
+        config: dict,
+        engine: str = "object",
+        seed: int | np.random.SeedSequence | None = None,
+        stride: int = 1,
+        paired: bool = False,
+    ) -> Result:
+        key = cache_key(config, engine, seed, stride, paired)
+        run = self.get(key)
+        if run is None:
+            run = run_scenario(
+                config, engine=engine, seed=seed, stride=stride, paired=paired
+            )
+            self.store(key, run, config, engine, seed, stride, paired)
+        return run
+
+    def store(
+        self,
+        key: str,
+        run: Result,
+        config: dict,
+        engine: str = "object",
+        seed: int | np.random.SeedSequence | None = None,
+        stride: int = 1,
+        paired: bool = False,
+    ):
+        """Puts a run made elsewhere, e.g. by a SimulationPool, under its `cache_key`."""
+        metadata = {
+            "seed": seed_description(seed),
+            "engine": engine,
+            "stride": stride,
+            "paired": paired,
+            "config": config,
+        }
+        self.put(key, run, metadata)
+
+    def size(self) -> int:
+        return sum(size for _, _, size in self.entries())
+
+    def entries(self) -> list[tuple[float, str, int]]:
+        """(last used, path, bytes) of every stored run."""
+        entries = []
+        for name in os.listdir(self._directory):
+            path = os.path.join(self._directory, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                last_used = os.path.getmtime(os.path.join(path, META_FILE))
+                size = sum(
+                    os.path.getsize(os.path.join(path, file))
+                    for file in os.listdir(path)
+                )
+            except OSError:
+                continue  # evicted by another process meanwhile
+            entries.append((last_used, path, size))
+        return entries
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self._max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for _, path, _ in self.entries():
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,41 @@
+from __future__ import annotations
+import gzip
+import os
+import pickle
+from .cache import model_fingerprint
+from .simulation import Result, Simulation
+
+EXTENSION = ".ckpt"
+
+
+def save_checkpoint(path: str, simulation: Simulation) -> str:
+    """Snapshots a simulation (world, agents, OEM, recorder and generator state) as a
+    gzipped pickle. The extension is appended to `path`, which is returned."""
+    path += EXTENSION
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    snapshot = {
+        "day": simulation.world().now(),
+        "model": model_fingerprint(),
+        "simulation": simulation,
+    }
+    with gzip.open(path, "wb", compresslevel=6) as file:
+        pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def load_checkpoint(path: str) -> Simulation:
+    with gzip.open(path, "rb") as file:
+        snapshot = pickle.load(file)
+    if snapshot["model"] != model_fingerprint():
+        raise ValueError(
+            f"{path} was saved by a different version of the model, re-run it from day 0"
+        )
+    return snapshot["simulation"]
+
+
+def run_fork(checkpoint: str, config: dict) -> Result:
+    """Continues the simulation saved at `checkpoint` to the end under `config`, see
+    Simulation.fork."""
+    simulation = load_checkpoint(checkpoint).fork(config).run()
+    simulation.close()
+    return Result(simulation.results(), simulation.report(), simulation.controls())
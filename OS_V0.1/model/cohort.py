@@ -0,0 +1,262 @@
+from __future__ import annotations
+from itertools import permutations
+from typing import TYPE_CHECKING
+import numpy as np
+from ._agent import AgentEnum, BaseAgent
+from . import customer
+from .customer import CustomerStatesEnum, product_params
+from .product import ProductEnum
+
+if TYPE_CHECKING:
+    from .world import World
+    from .OEM import OEM
+
+
+# Customers are split by id into this many bands that are served in order when stock is
+# short under "first_come" allocation, standing in for the object engine serving the lowest
+# ids first (1 = fully random)
+priority_bands: int = 32
+
+PRODUCTS: list[ProductEnum] = list(ProductEnum)
+
+
+class CustomerCohorts(BaseAgent):
+    """Aggregate customer engine: counts customers by (band, state, days until their next event).
+
+    Customers are statistically identical, so instead of stepping them one by one each day draws
+    ad adoption as a multinomial over the active products, lifespans as a multinomial over the
+    lifespan range, and core acceptance as one binomial. The cost of a day does not depend on
+    the population size.
+    """
+
+    _oem: OEM
+    _size: int
+    _patience: int
+    _bands: int
+    _potential: np.ndarray  # (bands,)
+    _fresh: np.ndarray  # (bands, products) wanting again after end of life
+    _waiting: np.ndarray  # (bands, products, days until patience runs out)
+    _pending: np.ndarray  # (bands, products, days until delivery)
+    _using: np.ndarray  # (bands, products, days until end of life)
+    _wants_any: np.ndarray  # (bands,)
+
+    def __init__(self, id: int, world: World, oem: OEM, size: int, config: dict):
+        patience = config.get("patience", customer.patience)
+        if patience < 1:
+            raise ValueError(
+                f"patience must be >=1 for the cohort engine. Received: {patience}"
+            )
+        super().__init__(id=id, type=AgentEnum.CUSTOMER, world=world)
+        self._oem = oem
+        self._size = size
+        self._patience = patience
+        self._bands = max(min(priority_bands, size), 1)
+        longest_lifespan = max(
+            params["lifespan"][1] for params in product_params.values()
+        )
+
+        # band b holds ids [b * size // bands, (b + 1) * size // bands)
+        edges = np.arange(self._bands + 1) * size // self._bands
+        self._potential = np.diff(edges)
+        self._fresh = np.zeros((self._bands, len(PRODUCTS)), dtype=np.int64)
+        self._waiting = np.zeros(
+            (self._bands, len(PRODUCTS), self._patience + 1), dtype=np.int64
+        )
+        self._pending = np.zeros(
+            (self._bands, len(PRODUCTS), oem._delivery_delay + 1), dtype=np.int64
+        )
+        self._using = np.zeros(
+            (self._bands, len(PRODUCTS), longest_lifespan + 1), dtype=np.int64
+        )
+        self._wants_any = np.zeros(self._bands, dtype=np.int64)
+
+    def size(self) -> int:
+        return self._size
+
+    def state_counts(self) -> dict[CustomerStatesEnum, int]:
+        wants = (
+            self._fresh + self._waiting.sum(axis=2) + self._pending.sum(axis=2)
+        ).sum(axis=0)
+        uses = self._using.sum(axis=(0, 2))
+        counts = {state: 0 for state in CustomerStatesEnum}
+        counts[CustomerStatesEnum.POTENTIAL_USER] = int(self._potential.sum())
+        counts[CustomerStatesEnum.WANTS_ANY] = int(self._wants_any.sum())
+        for code, product in enumerate(PRODUCTS):
+            counts[product_params[product]["wants_state"]] += int(wants[code])
+            counts[product_params[product]["uses_state"]] += int(uses[code])
+        return counts
+
+    def next(self, rng):
+        active_products = self._world.get_active_products()
+        active = np.array([PRODUCTS.index(product) for product in active_products])
+
+        # everything due today is taken off the start-of-day counts before anything moves
+        delivered = self._pending[:, :, 0].copy()
+        out_of_patience = self._waiting[:, :, 0].copy()
+        worn_out = self._using[:, :, 0].copy()
+        self._pending[:, :, 0] = 0
+        self._waiting[:, :, 0] = 0
+        self._using[:, :, 0] = 0
+        fresh = self._fresh.copy()
+        self._fresh[:] = 0
+        wants_any = self._wants_any.copy()
+        self._wants_any[:] = 0
+
+        self.become_users(rng, delivered)
+        self._wants_any += out_of_patience.sum(axis=1)
+        self._fresh += worn_out
+        if ProductEnum.R in active_products and worn_out.sum() > 0:
+            self._oem.return_products(rng, int(worn_out.sum()))
+        for code, product in enumerate(PRODUCTS):
+            wants, uses = self.states(product)
+            self.report(wants, uses, delivered[:, code])
+            self.report(wants, CustomerStatesEnum.WANTS_ANY, out_of_patience[:, code])
+            self.report(uses, wants, worn_out[:, code])
+
+        adopters = self.advertise(rng, active)
+
+        # single-product orders are split into groups that fare differently if they miss out:
+        # [adopters, fresh, waiting with 1..patience days left]
+        single = np.concatenate(
+            [adopters[:, :, None], fresh[:, :, None], self._waiting[:, :, 1:]], axis=2
+        )
+        self._waiting[:, :, 1:] = 0
+        orders = list(permutations(active))
+        by_order = self._world.stream(rng, "shuffle", self._id).multinomial(
+            wants_any, [1 / len(orders)] * len(orders)
+        )
+
+        served_single, served_any = self.allocate(rng, single, by_order, orders)
+
+        # the unserved start or keep counting down their patience
+        missed = single - served_single
+        self._waiting[:, :, self._patience] += missed[:, :, 0] + missed[:, :, 1]
+        self._waiting[:, :, 1:] += missed[:, :, 2:]
+        self._wants_any += (by_order - served_any.sum(axis=1)).sum(axis=1)
+
+        self.deliver(rng, served_single.sum(axis=2) + served_any.sum(axis=2))
+        for code, product in enumerate(PRODUCTS):
+            wants, uses = self.states(product)
+            bought = uses if self._oem._delivery_delay == 0 else wants
+            self.report(wants, bought, served_single[:, code])
+            self.report(CustomerStatesEnum.WANTS_ANY, bought, served_any[:, code])
+
+        # a day passes for every countdown
+        for countdown in (self._waiting, self._pending, self._using):
+            countdown[:, :, :-1] = countdown[:, :, 1:]
+            countdown[:, :, -1] = 0
+
+    def advertise(self, rng, active: np.ndarray) -> np.ndarray:
+        """Draws how many potential users of each band the ads win over to each product."""
+        adopters = np.zeros((self._bands, len(PRODUCTS)), dtype=np.int64)
+        if len(active) == 0:
+            return adopters
+        # products are considered in a random order and the first ad that lands wins, so a
+        # product's chance is averaged over every order it can come up in
+        chance = np.zeros(len(PRODUCTS))
+        orders = list(permutations(active))
+        for order in orders:
+            missed = 1.0
+            for code in order:
+                effectiveness = product_params[PRODUCTS[code]][
+                    "advertising_effectiveness"
+                ]
+                chance[code] += missed * effectiveness / len(orders)
+                missed *= 1 - effectiveness
+        outcomes = self._world.stream(rng, "advertising", self._id).multinomial(
+            self._potential, np.append(chance, 1 - chance.sum())
+        )
+        adopters[:] = outcomes[:, :-1]
+        self._world.record_advertising(
+            float(self._potential.sum() * chance.sum()), int(adopters.sum())
+        )
+        self._potential -= adopters.sum(axis=1)
+        for code, product in enumerate(PRODUCTS):
+            wants, _ = self.states(product)
+            self.report(CustomerStatesEnum.POTENTIAL_USER, wants, adopters[:, code])
+        return adopters
+
+    def allocate(
+        self, rng, single: np.ndarray, by_order: np.ndarray, orders: list[tuple]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Rations stock in rounds like the other engines: everyone asks for their first choice
+        and unserved WANTS_ANY customers then ask for their next one. Under "first_come" a short
+        product goes to the lower bands first and at random within the band where it runs out,
+        under "random_priority" to a random subset of everyone asking."""
+        served_single = np.zeros_like(single)
+        served_any = np.zeros((self._bands, len(PRODUCTS), len(orders)), dtype=np.int64)
+        remaining_any = by_order.copy()
+        for rank in range(max((len(order) for order in orders), default=0)):
+            for code in range(len(PRODUCTS)):
+                asking_any = np.zeros_like(remaining_any)
+                for index, order in enumerate(orders):
+                    if order[rank] == code:
+                        asking_any[:, index] = remaining_any[:, index]
+                asking_single = (
+                    single[:, code] if rank == 0 else np.zeros_like(single[:, code])
+                )
+                # per band: the single-product groups followed by the WANTS_ANY orders
+                groups = np.concatenate([asking_single, asking_any], axis=1)
+                demand = groups.sum(axis=1)
+                if demand.sum() == 0:
+                    continue
+                available = self._oem.request_products(
+                    PRODUCTS[code], int(demand.sum())
+                )
+                if self._oem.allocation() == "first_come":
+                    before = np.cumsum(demand) - demand
+                    granted = np.clip(available - before, 0, demand)
+                    won = np.where((granted == demand)[:, None], groups, 0)
+                    partial = np.flatnonzero((granted > 0) & (granted < demand))
+                    for band in partial:
+                        won[band] = self._world.stream(
+                            rng, "shuffle", self._id
+                        ).multivariate_hypergeometric(groups[band], granted[band])
+                elif available < demand.sum():
+                    # over every group at once, O(groups) however many customers ask
+                    won = (
+                        self._world.stream(rng, "allocation", self._id)
+                        .multivariate_hypergeometric(groups.ravel(), available)
+                        .reshape(groups.shape)
+                    )
+                else:
+                    won = groups
+                served_single[:, code] += won[:, : single.shape[2]]
+                served_any[:, code] += won[:, single.shape[2] :]
+                remaining_any -= won[:, single.shape[2] :]
+        return served_single, served_any
+
+    def deliver(self, rng, bought: np.ndarray):
+        if self._oem._delivery_delay == 0:
+            self.become_users(rng, bought)
+        else:
+            self._pending[:, :, self._oem._delivery_delay] += bought
+
+    def become_users(self, rng, counts: np.ndarray):
+        for code, product in enumerate(PRODUCTS):
+            if counts[:, code].sum() == 0:
+                continue
+            low, high = product_params[product]["lifespan"]
+            lifespans = self._world.stream(rng, "lifespan", self._id).multinomial(
+                counts[:, code], [1 / (high - low)] * (high - low)
+            )
+            self._using[:, code, low:high] += lifespans
+
+    def states(
+        self, product: ProductEnum
+    ) -> tuple[CustomerStatesEnum, CustomerStatesEnum]:
+        return (
+            product_params[product]["wants_state"],
+            product_params[product]["uses_state"],
+        )
+
+    def report(
+        self,
+        old_state: CustomerStatesEnum,
+        new_state: CustomerStatesEnum,
+        counts: np.ndarray,
+    ):
+        """Reports a flow of customers between two states, summing `counts` over every band."""
+        total = int(np.sum(counts))
+        if total > 0 and old_state != new_state:
+            self._world.record_state_change(old_state, new_state, total)
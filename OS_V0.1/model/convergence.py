@@ -0,0 +1,162 @@
+from __future__ import annotations
+import copy
+import numpy as np
+from .online_stats import t_quantile
+
+# settings for config["main"]["convergence"], see ConvergenceMonitor
+CONVERGENCE_DEFAULTS: dict = {
+    # the adopter counts drive sales and returns. "core_stock" can be added, but it cycles
+    # slowly in small populations and rarely gets within tolerance
+    "metrics": ["uses_virgin", "uses_reman"],
+    # cumulative series, checked on their increments. Sales lag the adopter counts while the
+    # factory catches up with demand, and they are what gets extrapolated
+    "flows": ["virgin_sold", "reman_sold"],
+    "check_every": 50,  # days
+    "min_days": 200,
+    "tolerance": 0.05,  # largest batch-means half-width, relative to the mean
+    "confidence": 0.95,
+    "batches": 10,
+}
+mser_batch: int = 5  # MSER-5
+
+
+def with_early_stop(config: dict, settings: dict | None = None) -> dict:
+    """A copy of a scenario config whose runs stop once in steady state."""
+    config = copy.deepcopy(config)
+    config["main"]["convergence"] = dict(settings or {})
+    return config
+
+
+def mser(series: np.ndarray, batch: int = mser_batch) -> int | None:
+    """MSER-k warm-up in samples: the truncation that minimises the squared standard error of
+    the mean of what is left, searched over the first half of the series in steps of k. The
+    statistic is erratic over the last few batches, hence the half; a minimum on that boundary
+    means the series has not settled yet and gives None."""
+    batches = len(series) // batch
+    if batches < 2:
+        return 0
+    z = series[: batches * batch].reshape(batches, batch).mean(axis=1)
+    # sums over z[d:] for every d at once
+    kept = np.arange(batches, 0, -1)
+    total = np.cumsum(z[::-1])[::-1]
+    squares = np.cumsum((z**2)[::-1])[::-1]
+    statistic = (squares - total**2 / kept) / kept**2
+    half = batches // 2
+    truncation = int(np.argmin(statistic[: half + 1]))
+    return truncation * batch if truncation < half else None
+
+
+def batch_means(
+    series: np.ndarray, batches: int = 10, confidence: float = 0.95
+) -> tuple[float, float]:
+    """Mean and confidence half-width from the means of `batches` consecutive batches, which
+    are close to independent when batches are long against the autocorrelation."""
+    size = len(series) // batches
+    if size == 0:
+        return float(np.mean(series)) if len(series) else 0.0, np.inf
+    means = series[len(series) - size * batches :].reshape(batches, size).mean(axis=1)
+    half_width = t_quantile(0.5 + confidence / 2, batches - 1) * np.sqrt(
+        np.var(means, ddof=1) / batches
+    )
+    return float(means.mean()), float(half_width)
+
+
+class ConvergenceMonitor:
+    """Decides from the recorded series when a run has settled, so the rest can be extrapolated.
+
+    Every `check_every` days MSER-5 estimates the warm-up of each monitored series, the levels
+    in `metrics` and the increments of the cumulative `flows`. The run is in
+    steady state once every warm-up ends in the first half of the days so far and the
+    batch-means interval on every mean after warm-up, and the difference between the means of
+    its two halves, are within `tolerance` of that mean.
+    The OEM's totals are snapshotted at each check, their growth between the first snapshot
+    after warm-up and now gives the daily rates the remaining days are extrapolated at.
+    """
+
+    _metrics: list[str]
+    _flows: list[str]
+    _check_every: int
+    _min_days: int
+    _tolerance: float
+    _confidence: float
+    _batches: int
+    _snapshots: list[tuple[int, dict[str, float]]]  # (day, OEM totals)
+    _warm_up: int | None  # days, once converged
+    _converged_day: int | None
+
+    def __init__(
+        self,
+        metrics: list[str] = CONVERGENCE_DEFAULTS["metrics"],
+        flows: list[str] = CONVERGENCE_DEFAULTS["flows"],
+        check_every: int = CONVERGENCE_DEFAULTS["check_every"],
+        min_days: int = CONVERGENCE_DEFAULTS["min_days"],
+        tolerance: float = CONVERGENCE_DEFAULTS["tolerance"],
+        confidence: float = CONVERGENCE_DEFAULTS["confidence"],
+        batches: int = CONVERGENCE_DEFAULTS["batches"],
+    ) -> None:
+        if check_every < 1:
+            raise ValueError(f"check_every must be >=1. Received: {check_every}")
+        self._metrics = list(metrics)
+        self._flows = list(flows)
+        self._check_every = check_every
+        self._min_days = min_days
+        self._tolerance = tolerance
+        self._confidence = confidence
+        self._batches = batches
+        self._snapshots = []
+        self._warm_up = None
+        self._converged_day = None
+
+    def due(self, day: int) -> bool:
+        return day % self._check_every == 0 and self._converged_day is None
+
+    def check(
+        self,
+        day: int,
+        columns: dict[str, np.ndarray],
+        stride: int,
+        totals: dict[str, float],
+    ) -> bool:
+        self._snapshots.append((day, totals))
+        if day < self._min_days:
+            return False
+        series = {
+            name: np.asarray(columns[name], dtype=float) for name in self._metrics
+        }
+        for name in self._flows:
+            series[name] = np.diff(columns[name], prepend=0).astype(float)
+        warm_up = 0
+        for values in series.values():
+            truncation = mser(values)
+            if truncation is None:
+                return False
+            mean, half_width = batch_means(
+                values[truncation:], self._batches, self._confidence
+            )
+            # a slow drift can pass MSER, so the two halves after warm-up must agree too
+            halves = np.array_split(values[truncation:], 2)
+            drift = abs(halves[1].mean() - halves[0].mean())
+            if max(half_width, drift) > self._tolerance * abs(mean):
+                return False
+            warm_up = max(warm_up, truncation * stride)
+        # the rates need a snapshot after warm-up other than today's
+        if self.first_snapshot_after(warm_up)[0] == day:
+            return False
+        self._warm_up = warm_up
+        self._converged_day = day
+        return True
+
+    def first_snapshot_after(self, day: int) -> tuple[int, dict[str, float]]:
+        return next(snapshot for snapshot in self._snapshots if snapshot[0] >= day)
+
+    def daily_rates(self) -> dict[str, float]:
+        """How fast each OEM total grew per day over the steady part of the run."""
+        start, before = self.first_snapshot_after(self._warm_up)
+        end, after = self._snapshots[-1]
+        return {key: (after[key] - before[key]) / (end - start) for key in after}
+
+    def warm_up(self) -> int | None:
+        return self._warm_up
+
+    def converged_day(self) -> int | None:
+        return self._converged_day
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from enum import Enum
+from enum import IntEnum
 from typing import TYPE_CHECKING
 from ._agent import AgentEnum, BaseAgent
 from .message import Message, MessageType
@@ -13,13 +13,14 @@ if TYPE_CHECKING:
     from .OEM import OEM
 
 
-class CustomerStatesEnum(str, Enum):
-    POTENTIAL_USER = "potential_user"
-    WANTS_VIRGIN = "wants_virgin"
-    USES_VIRGIN = "uses_virgin"
-    WANTS_REMAN = "wants_reman"
-    USES_REMAN = "uses_reman"
-    WANTS_ANY = "wants_any"
+# small-int codes, they compare and index as plain ints
+class CustomerStatesEnum(IntEnum):
+    POTENTIAL_USER = 0
+    WANTS_VIRGIN = 1
+    USES_VIRGIN = 2
+    WANTS_REMAN = 3
+    USES_REMAN = 4
+    WANTS_ANY = 5
 
 
 product_params = {
@@ -44,8 +45,31 @@ product_params = {
     },
 }  # need to add states here and in next()
 
+# flat aliases and per-product tables for the hot paths below, where Enum attribute lookups
+# and nested product_params lookups cost more than the work they guard
+POTENTIAL_USER = CustomerStatesEnum.POTENTIAL_USER
+WANTS_VIRGIN = CustomerStatesEnum.WANTS_VIRGIN
+USES_VIRGIN = CustomerStatesEnum.USES_VIRGIN
+WANTS_REMAN = CustomerStatesEnum.WANTS_REMAN
+USES_REMAN = CustomerStatesEnum.USES_REMAN
+WANTS_ANY = CustomerStatesEnum.WANTS_ANY
+WANTS_STATE = tuple(product_params[product]["wants_state"] for product in ProductEnum)
+USES_STATE = tuple(product_params[product]["uses_state"] for product in ProductEnum)
+LIFESPAN = tuple(product_params[product]["lifespan"] for product in ProductEnum)
+ADVERTISING_EFFECTIVENESS = tuple(
+    product_params[product]["advertising_effectiveness"] for product in ProductEnum
+)
+
 
 class Customer(BaseAgent):
+    __slots__ = (
+        "_delivery_day",
+        "_end_of_life_day",
+        "_active_product",
+        "_oem",
+        "_patience",
+        "_end_of_patience_day",
+    )
     _state: CustomerStatesEnum
     _delivery_day: int
     _end_of_life_day: int
@@ -61,102 +85,129 @@ class Customer(BaseAgent):
         self._active_product = None
         super().__init__(id=id, type=AgentEnum.CUSTOMER, world=world)
         self._oem = oem
-        self._patience = patience
+        self._patience = config.get("patience", patience)
         self._end_of_patience_day = -1
 
     def next(self, rng):
-        match self._state:
-            case CustomerStatesEnum.POTENTIAL_USER:
-                # this section is needed to avoid bias towards one product by always checking that first
-                productsToConsider = self._world.get_active_products()
-                rng.shuffle(productsToConsider)
-                for product in productsToConsider:
-                    if (
-                        rng.random()
-                        < product_params[product]["advertising_effectiveness"]
-                    ):  # if a potential user is successfully influenced by ads
-                        self.try_and_buy(rng, product)
-                        break
-            case state if state in [
-                CustomerStatesEnum.WANTS_VIRGIN,
-                CustomerStatesEnum.WANTS_REMAN,
-            ]:
-                if self._delivery_day != -1:
-                    if self._world.now() == self._delivery_day:
-                        if self._active_product:
-                            self.become_user(rng, self._active_product)
-                elif (
-                    self._end_of_patience_day != -1
-                    and self._world.now() >= self._end_of_patience_day
-                ):
-                    # Patience ran out
-                    self._state = CustomerStatesEnum.WANTS_ANY
-                else:
+        state = self._state
+        if state == POTENTIAL_USER:
+            # this section is needed to avoid bias towards one product by always checking that first
+            productsToConsider = self._world.get_active_products()
+            self._world.stream(rng, "shuffle", self._id).shuffle(productsToConsider)
+            for product in productsToConsider:
+                effectiveness = ADVERTISING_EFFECTIVENESS[product]
+                swayed = (
+                    self._world.stream(rng, "advertising", self._id).random()
+                    < effectiveness
+                )
+                self._world.record_advertising(effectiveness, swayed)
+                if swayed:  # if a potential user is successfully influenced by ads
+                    self.try_and_buy(rng, product)
+                    break
+        elif state == WANTS_VIRGIN or state == WANTS_REMAN:
+            if self._delivery_day != -1:
+                if self._world.now() == self._delivery_day:
                     if self._active_product is not None:
-                        self.try_and_buy(rng, self._active_product)
-
-            case CustomerStatesEnum.WANTS_ANY:
-                productsToConsider = self._world.get_active_products()
-                rng.shuffle(productsToConsider)
-                for product in productsToConsider:
-                    if self._oem.request_product(product):
-                        # Found something to buy
-                        if self._oem._delivery_delay == 0:
-                            self.become_user(rng, product)
-                        else:
-                            self._state = product_params[product]["wants_state"]
-                            self._active_product = product
-                            self._delivery_day = (
-                                self._world.now() + self._oem._delivery_delay
-                            )
-                            self._end_of_patience_day = -1
-                        return
-
-            case state if state in [
-                CustomerStatesEnum.USES_VIRGIN,
-                CustomerStatesEnum.USES_REMAN,
-            ]:
-                if self._world.now() == self._end_of_life_day:
-                    product_to_rebuy = self._active_product
-
-                    if (
-                        product_to_rebuy is None
-                    ):  # This seems superfluous but its so python/IDE knows that product to rebuy wont be None
-                        if state == CustomerStatesEnum.USES_REMAN:
-                            product_to_rebuy = ProductEnum.R
-                        else:
-                            product_to_rebuy = ProductEnum.V
-
-                    self._state = product_params[product_to_rebuy]["wants_state"]
-                    self._end_of_life_day = -1
-                    if ProductEnum.R in self._world.get_active_products():
-                        self._oem.return_proudct(rng)
+                        self.become_user(rng, self._active_product)
+            elif (
+                self._end_of_patience_day != -1
+                and self._world.now() >= self._end_of_patience_day
+            ):
+                # Patience ran out
+                self.set_state(WANTS_ANY)
+            else:
+                if self._active_product is not None:
+                    self.try_and_buy(rng, self._active_product)
+
+        elif state == WANTS_ANY:
+            productsToConsider = self._world.get_active_products()
+            self._world.stream(rng, "shuffle", self._id).shuffle(productsToConsider)
+            if self._oem.batches_orders():
+                self._oem.place_order(self, tuple(productsToConsider))
+                return
+            for product in productsToConsider:
+                if self._oem.request_product(product):
+                    # Found something to buy
+                    self.bought(rng, product)
+                    return
+
+        elif state == USES_VIRGIN or state == USES_REMAN:
+            if self._world.now() == self._end_of_life_day:
+                product_to_rebuy = self._active_product
+
+                if (
+                    product_to_rebuy is None
+                ):  # This seems superfluous but its so python/IDE knows that product to rebuy wont be None
+                    if state == USES_REMAN:
+                        product_to_rebuy = ProductEnum.R
                     else:
-                        pass
+                        product_to_rebuy = ProductEnum.V
 
-    def try_and_buy(self, rng, product: ProductEnum):
-        purchaseSuccessful = self._oem.request_product(product)
+                self.set_state(WANTS_STATE[product_to_rebuy])
+                self._end_of_life_day = -1
+                if ProductEnum.R in self._world.get_active_products():
+                    self._oem.return_proudct(rng)
+                else:
+                    pass
+
+    def wake_day(self) -> int | None:
+        # users and customers waiting on a delivery sleep until a known day, everyone else is polled
+        state = self._state
+        if state == USES_VIRGIN or state == USES_REMAN:
+            return self._end_of_life_day
+        if (state == WANTS_VIRGIN or state == WANTS_REMAN) and self._delivery_day != -1:
+            return self._delivery_day
+        return None
+
+    def state_counts(self) -> dict[CustomerStatesEnum, int]:
+        return {self._state: 1}
+
+    def set_state(self, state: CustomerStatesEnum):
+        # every transition is reported so the world can keep its counts without rescanning
+        if state != self._state:
+            self._world.record_state_change(self._state, state)
+            self._state = state
 
-        if purchaseSuccessful:
-            if self._oem._delivery_delay == 0:  # checking if delivery is instant
-                self.become_user(rng, product)
-            else:
-                self._state = product_params[product]["wants_state"]
-                self._active_product = product
-                self._delivery_day = self._world.now() + self._oem._delivery_delay
-            self._end_of_patience_day = -1
+    def try_and_buy(self, rng, product: ProductEnum):
+        if self._oem.batches_orders():
+            self._oem.place_order(self, (product,))
+        elif self._oem.request_product(product):
+            self.bought(rng, product)
+        else:
+            self.missed(product)
+
+    def fill_order(
+        self, rng, product: ProductEnum | None, products: tuple[ProductEnum, ...]
+    ):
+        """The OEM's answer to an order placed for `products`: the product served, if any."""
+        if product is not None:
+            self.bought(rng, product)
+        elif self._state != WANTS_ANY:
+            self.missed(products[0])
+
+    def bought(self, rng, product: ProductEnum):
+        if self._oem._delivery_delay == 0:  # checking if delivery is instant
+            self.become_user(rng, product)
         else:
-            self._state = product_params[product]["wants_state"]
+            self.set_state(WANTS_STATE[product])
             self._active_product = product
-            if self._end_of_patience_day == -1:
-                self._end_of_patience_day = self._world.now() + self._patience
+            self._delivery_day = self._world.now() + self._oem._delivery_delay
+        self._end_of_patience_day = -1
+
+    def missed(self, product: ProductEnum):
+        self.set_state(WANTS_STATE[product])
+        self._active_product = product
+        if self._end_of_patience_day == -1:
+            self._end_of_patience_day = self._world.now() + self._patience
 
     def become_user(self, rng, product: ProductEnum):
-        self._state = product_params[product]["uses_state"]
+        self.set_state(USES_STATE[product])
         self._active_product = product
         self._delivery_day = -1
         self._end_of_patience_day = -1
 
-        lifespan_range = product_params[product]["lifespan"]
-        lifespan = rng.integers(*lifespan_range)
+        lifespan_range = LIFESPAN[product]
+        lifespan = self._world.stream(rng, "lifespan", self._id).integers(
+            *lifespan_range
+        )
         self._end_of_life_day = self._world.now() + lifespan
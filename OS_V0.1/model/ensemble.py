@@ -0,0 +1,184 @@
+from __future__ import annotations
+import numpy as np
+from .online_stats import P2Quantile, RunningCovariance, RunningMoments, t_quantile
+from .simulation import RESULT_KEYS, Result
+
+QUANTILES = [0.05, 0.5, 0.95]
+CONTROLS = ["core_acceptance", "ad_adoption"]  # see Simulation.controls
+
+
+def replication_seeds(seed: int, replications: int) -> list[np.random.SeedSequence]:
+    """Independent child seeds for each replication of a scenario, spawned from its seed."""
+    return np.random.SeedSequence(seed).spawn(replications)
+
+
+def report_values(report: dict) -> dict[str, float]:
+    """Flattens a financial report into the scalar outcomes an ensemble tracks."""
+    values = {
+        "Net Profit": report["Total Revenue"] - report["Total Cost"],
+        "Total Cost": report["Total Cost"],
+        "Total Revenue": report["Total Revenue"],
+    }
+    values.update(report["Breakdown"])
+    values.update(report["Statistics"])
+    return values
+
+
+class EnsembleStatistics:
+    """Folds replications in one at a time, keeping only O(days) state per tracked series."""
+
+    _days: np.ndarray  # the days the recorded series were sampled on
+    _series: dict[str, RunningMoments]
+    _series_quantiles: dict[str, list[P2Quantile]]
+    _outcomes: dict[str, RunningMoments]
+    _outcome_quantiles: dict[str, list[P2Quantile]]
+
+    def __init__(self, days: np.ndarray) -> None:
+        self._days = days
+        self._series = {}
+        self._series_quantiles = {}
+        for key in RESULT_KEYS:
+            if key == "day":
+                continue
+            self._series[key] = RunningMoments((len(days),))
+            self._series_quantiles[key] = [
+                P2Quantile(p, (len(days),)) for p in QUANTILES
+            ]
+        self._outcomes = {}
+        self._outcome_quantiles = {}
+
+    def add(self, run: Result):
+        recorded = len(run.results["day"])
+        if recorded != len(self._days):
+            raise ValueError(
+                f"The run recorded {recorded} of {len(self._days)} samples. Runs stopped "
+                "early in steady state (config['main']['convergence']) end their series "
+                "early and cannot be combined day by day"
+            )
+        for key, moments in self._series.items():
+            values = run.results[key]
+            moments.update(values)
+            for quantile in self._series_quantiles[key]:
+                quantile.update(values)
+        for key, value in report_values(run.report).items():
+            if key not in self._outcomes:
+                self._outcomes[key] = RunningMoments()
+                self._outcome_quantiles[key] = [P2Quantile(p) for p in QUANTILES]
+            self._outcomes[key].update(value)
+            for quantile in self._outcome_quantiles[key]:
+                quantile.update(value)
+
+    def replications(self) -> int:
+        return self._outcomes["Net Profit"].count() if self._outcomes else 0
+
+    def outcome(self, key: str) -> RunningMoments:
+        return self._outcomes[key]
+
+    def outcome_table(self, confidence: float = 0.95) -> list[dict]:
+        rows = []
+        for key, moments in self._outcomes.items():
+            low, high = moments.confidence_interval(confidence)
+            row = {
+                "outcome": key,
+                "mean": float(moments.mean()),
+                "std": float(np.sqrt(moments.variance())),
+                "ci_low": float(low),
+                "ci_high": float(high),
+            }
+            for p, quantile in zip(QUANTILES, self._outcome_quantiles[key]):
+                row[f"q{p:g}"] = float(quantile.value())
+            rows.append(row)
+        return rows
+
+    def daily_table(self, confidence: float = 0.95) -> dict[str, np.ndarray]:
+        columns = {"day": self._days}
+        for key, moments in self._series.items():
+            low, high = moments.confidence_interval(confidence)
+            columns[f"{key}_mean"] = moments.mean()
+            columns[f"{key}_ci_low"] = low
+            columns[f"{key}_ci_high"] = high
+            for p, quantile in zip(QUANTILES, self._series_quantiles[key]):
+                columns[f"{key}_q{p:g}"] = quantile.value()
+        return columns
+
+
+class VarianceReducedEstimate:
+    """Streaming estimate of one outcome's mean from groups of runs, an antithetic pair or a
+    single run each, optionally adjusted by control variates whose mean is known to be zero.
+
+    The control variate estimate is the group mean minus beta times the controls' mean, with
+    beta regressed from the groups themselves. The plain variance of single runs is tracked
+    too, so the reduction can be reported as how many times more runs, and agent-days, a plain
+    estimate would need for the same interval.
+    """
+
+    _key: str
+    _controls: list[str]
+    _runs: RunningMoments  # the outcome of every run on its own
+    _groups: RunningCovariance  # (outcome, *controls) averaged over each group
+
+    def __init__(self, key: str = "Net Profit", controls: list[str] | None = None):
+        self._key = key
+        self._controls = controls or []
+        self._runs = RunningMoments()
+        self._groups = RunningCovariance(1 + len(self._controls))
+
+    def add(self, runs: list[Result]):
+        values = []
+        for run in runs:
+            outcome = report_values(run.report)[self._key]
+            self._runs.update(outcome)
+            values.append([outcome] + [run.controls[key] for key in self._controls])
+        self._groups.update(np.mean(values, axis=0))
+
+    def runs(self) -> int:
+        return self._runs.count()
+
+    def groups(self) -> int:
+        return self._groups.count()
+
+    def regression(self) -> tuple[np.ndarray, int]:
+        """beta and the number of controls that vary, a control that is always zero (no cores
+        are returned without reman) is left out."""
+        covariance = self._groups.covariance()
+        controls = covariance[1:, 1:]
+        if len(controls) == 0 or self._groups.count() < 2:
+            return np.zeros(len(controls)), 0
+        return (
+            np.linalg.pinv(controls) @ covariance[1:, 0],
+            int(np.linalg.matrix_rank(controls)),
+        )
+
+    def mean(self) -> float:
+        beta, _ = self.regression()
+        mean = self._groups.mean()
+        return float(mean[0] - beta @ mean[1:])
+
+    def variance_of_mean(self) -> float:
+        groups = self._groups.count()
+        beta, used = self.regression()
+        if groups - 1 - used <= 0:
+            return np.inf
+        covariance = self._groups.covariance()
+        residual = covariance[0, 0] - covariance[0, 1:] @ beta
+        return float(residual / groups * (groups - 1) / (groups - 1 - used))
+
+    def half_width(self, confidence: float = 0.95) -> float:
+        _, used = self.regression()
+        degrees = self._groups.count() - 1 - used
+        if degrees <= 0:
+            return np.inf
+        t = t_quantile(0.5 + confidence / 2, degrees)
+        return t * np.sqrt(self.variance_of_mean())
+
+    def reduction(self) -> dict[str, float]:
+        """Variance of a plain mean over the same number of runs divided by the variance
+        achieved, split into the antithetic and control variate factors."""
+        plain = float(self._runs.variance()) / self._runs.count()
+        grouped = float(self._groups.covariance()[0, 0]) / self._groups.count()
+        achieved = self.variance_of_mean()
+        return {
+            "antithetic": plain / grouped,
+            "control_variates": grouped / achieved,
+            "total": plain / achieved,
+        }
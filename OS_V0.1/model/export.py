@@ -0,0 +1,113 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from glob import glob
+import json
+import os
+from typing import TYPE_CHECKING
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pyarrow is optional, runs are then written as .npy directories
+    pa = None
+
+if TYPE_CHECKING:
+    from .simulation import Result
+
+
+FORMATS = ["arrow", "parquet", "npy"]
+EXTENSIONS = {"arrow": ".arrow", "parquet": ".parquet", "npy": ".npy.d"}
+META_FILE = "meta.json"  # report and metadata of a .npy.d run directory
+
+
+@dataclass
+class StoredRun:
+    """A run read back from disk. Columns are memory-mapped where the format allows it."""
+
+    columns: dict[str, np.ndarray]
+    report: dict
+    metadata: dict
+
+
+def default_format() -> str:
+    return "arrow" if pa is not None else "npy"
+
+
+def write_run(path: str, run: Result, metadata: dict, format: str | None = None) -> str:
+    """Writes a run's daily columns and financial report, tagged with `metadata` (scenario
+    name, seed, config, ...). The format's extension is appended to `path`, which is returned.
+
+    - arrow: uncompressed Arrow IPC file, memory-mapped without copies when read back
+    - parquet: compressed, smallest on disk, decoded into memory when read back
+    - npy: a directory with one .npy per column, memory-mapped, needs only NumPy
+    """
+    format = format or default_format()
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}. Received: {format}")
+    if format != "npy" and pa is None:
+        raise ImportError(f"Writing {format} files needs pyarrow, try format='npy'")
+    path += EXTENSIONS[format]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    meta = {"report": run.report, "metadata": metadata}
+
+    if format == "npy":
+        os.makedirs(path, exist_ok=True)
+        for name, column in run.results.items():
+            np.save(os.path.join(path, f"{name}.npy"), column)
+        with open(os.path.join(path, META_FILE), "w") as file:
+            json.dump(meta, file, default=float)
+        return path
+
+    table = pa.table(dict(run.results))
+    table = table.replace_schema_metadata({"meta": json.dumps(meta, default=float)})
+    if format == "parquet":
+        pa.parquet.write_table(table, path)
+    else:
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    return path
+
+
+def read_run(path: str) -> StoredRun:
+    if path.endswith(EXTENSIONS["npy"]):
+        with open(os.path.join(path, META_FILE)) as file:
+            meta = json.load(file)
+        columns = {
+            name[: -len(".npy")]: np.load(os.path.join(path, name), mmap_mode="r")
+            for name in sorted(os.listdir(path))
+            if name.endswith(".npy")
+        }
+        return StoredRun(columns, meta["report"], meta["metadata"])
+
+    if pa is None:
+        raise ImportError(f"Reading {path} needs pyarrow")
+    if path.endswith(EXTENSIONS["parquet"]):
+        table = pa.parquet.read_table(path, memory_map=True)
+    else:
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    meta = json.loads(table.schema.metadata[b"meta"])
+    columns = {
+        name: table.column(name).combine_chunks().to_numpy()
+        for name in table.column_names
+    }
+    return StoredRun(columns, meta["report"], meta["metadata"])
+
+
+def read_runs(pattern: str) -> list[StoredRun]:
+    """Opens every stored run matching a glob pattern, e.g. 'runs/Default_*'. Memory-mapped
+    columns are only paged in as they are used, so thousands of runs can be opened at once.
+    """
+    paths = [
+        path
+        for path in sorted(glob(pattern))
+        if any(path.endswith(extension) for extension in EXTENSIONS.values())
+    ]
+    return [read_run(path) for path in paths]
+
+
+def stack_column(runs: list[StoredRun], name: str) -> np.ndarray:
+    """One (runs, samples) array of a column across runs of the same length."""
+    return np.stack([run.columns[name] for run in runs])
@@ -0,0 +1,226 @@
+from __future__ import annotations
+from collections import Counter
+import json
+import os
+from time import perf_counter
+from typing import TYPE_CHECKING, Callable
+import numpy as np
+
+if TYPE_CHECKING:
+    from ._agent import BaseAgent
+    from .world import World
+
+# world methods timed as phases when present, the rest of a day is spent in agents' next()
+PHASES = [
+    "tick",
+    "update_production",
+    "deliver_to_retailer",
+    "process_messages",
+    "clear_orders",
+]
+
+
+def agent_label(agent: BaseAgent) -> str:
+    """'customer:potential_user', 'oem:operational', or the class name for agents without a
+    single state such as a whole CustomerPopulation."""
+    state = getattr(agent, "_state", None)
+    if state is None:
+        return f"{agent.type().value}:{type(agent).__name__}"
+    return f"{agent.type().value}:{state.name.lower()}"
+
+
+class CountingGenerator:
+    """Stands in for a numpy Generator and counts the calls to each method and the values drawn."""
+
+    _rng: np.random.Generator
+    _calls: Counter[str]
+    _values: Counter[str]
+
+    def __init__(self, rng: np.random.Generator, calls: Counter, values: Counter):
+        self._rng = rng
+        self._calls = calls
+        self._values = values
+
+    def __getattr__(self, name: str):
+        method = getattr(self._rng, name)
+        if not callable(method):
+            return method
+
+        def counted(*args, **kwargs):
+            result = method(*args, **kwargs)
+            self._calls[name] += 1
+            # shuffle works in place and returns None
+            self._values[name] += np.size(args[0] if result is None else result)
+            return result
+
+        return counted
+
+
+class Profiler:
+    """Switchable timing of a world's daily phases, of agents' next() by state, of customer
+    state transitions and of random draws.
+
+    A world without a profiler (the default) runs its usual code, the only cost left is one
+    `is None` check per call_next and per state transition. `attach` wraps the world's phase
+    methods on the instance and routes call_next through `call_agents`. Detach before pickling
+    the world, e.g. for a checkpoint, since the wrappers are closures.
+    """
+
+    _started: float
+    _phase_seconds: Counter[str]
+    _phase_calls: Counter[str]
+    _next_seconds: Counter[str]
+    _next_calls: Counter[str]
+    _transitions: Counter[tuple[str, str]]
+    _rng_calls: Counter[str]
+    _rng_values: Counter[str]
+    _rngs: dict[int, CountingGenerator]
+    _trace: list[dict] | None  # Chrome trace events, only kept when asked for
+    _count_draws: bool  # off to time phases without the CountingGenerator overhead
+
+    def __init__(self, trace: bool = False, count_draws: bool = True) -> None:
+        self._started = perf_counter()
+        self._phase_seconds = Counter()
+        self._phase_calls = Counter()
+        self._next_seconds = Counter()
+        self._next_calls = Counter()
+        self._transitions = Counter()
+        self._rng_calls = Counter()
+        self._rng_values = Counter()
+        self._rngs = {}
+        self._trace = [] if trace else None
+        self._count_draws = count_draws
+
+    def attach(self, world: World):
+        world._profiler = self
+        for name in PHASES:
+            if hasattr(world, name):
+                setattr(world, name, self.timed(name, getattr(world, name)))
+        world.call_next = self.timed("call_next", world.call_next)
+
+    def detach(self, world: World):
+        world._profiler = None
+        for name in PHASES + ["call_next"]:
+            world.__dict__.pop(name, None)
+
+    def counting(self, rng):
+        if not isinstance(rng, np.random.Generator):
+            return rng  # already counted, or not a generator at all
+        if id(rng) not in self._rngs:
+            self._rngs[id(rng)] = CountingGenerator(
+                rng, self._rng_calls, self._rng_values
+            )
+        return self._rngs[id(rng)]
+
+    def timed(self, name: str, function: Callable) -> Callable:
+        """Wraps a phase so its calls are timed and, with count_draws, any Generator it is
+        given is counted."""
+
+        def wrapper(*args, **kwargs):
+            if self._count_draws:
+                args = [self.counting(arg) for arg in args]
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add_phase(name, start, perf_counter())
+
+        return wrapper
+
+    def add_phase(self, name: str, start: float, end: float):
+        self._phase_seconds[name] += end - start
+        self._phase_calls[name] += 1
+        if self._trace is not None:
+            self._trace.append(self.event(name, start, end, "phases"))
+
+    def call_agents(self, world: World, agents: list, rng, schedule: bool = True):
+        """The body of call_next, with every agent's next() timed under its state at the time."""
+        seconds = Counter()
+        begin = perf_counter()
+        for agent in agents:
+            label = agent_label(agent)
+            start = perf_counter()
+            agent.next(rng)
+            if schedule:
+                world.schedule(agent)
+            seconds[label] += perf_counter() - start
+            self._next_calls[label] += 1
+        self._next_seconds.update(seconds)
+        if self._trace is not None:
+            # one block per state and day, laid end to end inside the call_next phase
+            for label, duration in seconds.items():
+                self._trace.append(
+                    self.event(label, begin, begin + duration, "next() by state")
+                )
+                begin += duration
+
+    def count_transition(self, old_state, new_state, count: int = 1):
+        old = "new" if old_state is None else old_state.name.lower()
+        self._transitions[(old, new_state.name.lower())] += count
+
+    def event(self, name: str, start: float, end: float, category: str) -> dict:
+        return {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self._started) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": 0,
+        }
+
+    def summary(self) -> dict:
+        return {
+            "wall_seconds": perf_counter() - self._started,
+            "phases": {
+                name: {"seconds": seconds, "calls": self._phase_calls[name]}
+                for name, seconds in self._phase_seconds.most_common()
+            },
+            "next_by_state": {
+                label: {
+                    "seconds": seconds,
+                    "calls": self._next_calls[label],
+                    "microseconds_per_call": 1e6 * seconds / self._next_calls[label],
+                }
+                for label, seconds in self._next_seconds.most_common()
+            },
+            "transitions": {
+                f"{old} -> {new}": count
+                for (old, new), count in self._transitions.most_common()
+            },
+            "rng": {
+                name: {"calls": calls, "values": self._rng_values[name]}
+                for name, calls in self._rng_calls.most_common()
+            },
+        }
+
+    def format_summary(self) -> str:
+        summary = self.summary()
+        lines = [f"{'PHASE':<36}{'SECONDS':>12}{'CALLS':>12}"]
+        for name, row in summary["phases"].items():
+            lines.append(f"  {name:<34}{row['seconds']:>12.3f}{row['calls']:>12,}")
+        lines.append(
+            f"{'NEXT() BY STATE':<36}{'SECONDS':>12}{'CALLS':>12}{'µs/CALL':>10}"
+        )
+        for label, row in summary["next_by_state"].items():
+            lines.append(
+                f"  {label:<34}{row['seconds']:>12.3f}{row['calls']:>12,}{row['microseconds_per_call']:>10.2f}"
+            )
+        lines.append(f"{'TRANSITION':<48}{'COUNT':>12}")
+        for transition, count in summary["transitions"].items():
+            lines.append(f"  {transition:<46}{count:>12,}")
+        lines.append(f"{'RNG METHOD':<36}{'CALLS':>12}{'VALUES':>12}")
+        for name, row in summary["rng"].items():
+            lines.append(f"  {name:<34}{row['calls']:>12,}{row['values']:>12,}")
+        return "\n".join(lines)
+
+    def write_summary(self, path: str):
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def write_trace(self, path: str):
+        """Chrome trace-event JSON, open it in chrome://tracing or ui.perfetto.dev."""
+        if self._trace is None:
+            raise RuntimeError("Create the Profiler with trace=True to record a trace")
+        with open(path, "w") as file:
+            json.dump({"traceEvents": self._trace, "displayTimeUnit": "ms"}, file)
@@ -1,5 +1,8 @@
+from __future__ import annotations
 from enum import Enum
 from dataclasses import dataclass
+from typing import Iterator
+import numpy as np
 
 
 class MessageType(str, Enum):
@@ -7,8 +10,87 @@ class MessageType(str, Enum):
     BUY_R = "buy_reman_product"
 
 
-@dataclass
+@dataclass(slots=True)
 class Message:
     sender_id: int
     recipient_id: int
     content: MessageType
+
+
+MESSAGE_TYPES: list[MessageType] = list(MessageType)
+MESSAGE_CODE: dict[MessageType, int] = {
+    content: code for code, content in enumerate(MESSAGE_TYPES)
+}
+
+
+class MessageBus:
+    """The messages of one tick as parallel integer arrays instead of one object each.
+
+    Arrays grow geometrically and are reused from tick to tick. Message objects are only
+    built for the messages that are actually delivered.
+    """
+
+    _senders: np.ndarray
+    _recipients: np.ndarray
+    _contents: np.ndarray  # codes into MESSAGE_TYPES
+    _size: int
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._senders = np.empty(capacity, dtype=np.int64)
+        self._recipients = np.empty(capacity, dtype=np.int64)
+        self._contents = np.empty(capacity, dtype=np.int8)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def reserve(self, count: int):
+        needed = self._size + count
+        if needed > len(self._senders):
+            capacity = max(needed, 2 * len(self._senders))
+            self._senders = np.resize(self._senders, capacity)
+            self._recipients = np.resize(self._recipients, capacity)
+            self._contents = np.resize(self._contents, capacity)
+
+    def post(self, sender_id: int, recipient_id: int, content: MessageType):
+        self.reserve(1)
+        self._senders[self._size] = sender_id
+        self._recipients[self._size] = recipient_id
+        self._contents[self._size] = MESSAGE_CODE[content]
+        self._size += 1
+
+    def post_many(
+        self,
+        senders: np.ndarray,
+        recipients: np.ndarray,
+        contents: np.ndarray,
+    ):
+        """Posts len(senders) messages at once, `contents` given as MESSAGE_CODE codes."""
+        count = len(senders)
+        self.reserve(count)
+        end = self._size + count
+        self._senders[self._size : end] = senders
+        self._recipients[self._size : end] = recipients
+        self._contents[self._size : end] = contents
+        self._size = end
+
+    def first_per_recipient(self) -> np.ndarray:
+        """Positions of each recipient's first message this tick, in posting order."""
+        recipients = self._recipients[: self._size]
+        order = np.argsort(recipients, kind="stable")
+        first = np.ones(self._size, dtype=bool)
+        np.not_equal(recipients[order[1:]], recipients[order[:-1]], out=first[1:])
+        return np.sort(order[first])
+
+    def messages(self, positions: np.ndarray | None = None) -> Iterator[Message]:
+        if positions is None:
+            positions = np.arange(self._size)
+        for sender_id, recipient_id, code in zip(
+            self._senders[positions].tolist(),
+            self._recipients[positions].tolist(),
+            self._contents[positions].tolist(),
+        ):
+            yield Message(sender_id, recipient_id, MESSAGE_TYPES[code])
+
+    def clear(self):
+        self._size = 0
@@ -0,0 +1,177 @@
+from __future__ import annotations
+from statistics import NormalDist
+import numpy as np
+
+
+def t_quantile(p: float, df: int) -> float:
+    """Student-t quantile. Exact for df 1 and 2, from the normal one (Abramowitz & Stegun
+    26.7.5) to ~1e-3 for df >= 3."""
+    if df <= 0:
+        return float("inf")
+    if df == 1:  # Cauchy
+        return float(np.tan(np.pi * (p - 0.5)))
+    if df == 2:
+        return float((2 * p - 1) / np.sqrt(2 * p * (1 - p)))
+    z = NormalDist().inv_cdf(p)
+    return (
+        z
+        + (z**3 + z) / (4 * df)
+        + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * df**2)
+        + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * df**3)
+        + (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z)
+        / (92160 * df**4)
+    )
+
+
+class RunningMoments:
+    """Welford's online mean and variance, element-wise over arrays of a fixed shape."""
+
+    _count: int
+    _mean: np.ndarray
+    _m2: np.ndarray  # running sum of squared deviations from the mean
+
+    def __init__(self, shape: tuple = ()) -> None:
+        self._count = 0
+        self._mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+
+    def update(self, values) -> None:
+        values = np.asarray(values, dtype=float)
+        self._count += 1
+        delta = values - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (values - self._mean)
+
+    def count(self) -> int:
+        return self._count
+
+    def mean(self) -> np.ndarray:
+        return self._mean
+
+    def variance(self) -> np.ndarray:
+        if self._count < 2:
+            return np.full_like(self._mean, np.nan)
+        return self._m2 / (self._count - 1)
+
+    def half_width(self, confidence: float = 0.95) -> np.ndarray:
+        """Half-width of the two-sided Student-t confidence interval on the mean."""
+        if self._count < 2:
+            return np.full_like(self._mean, np.inf)
+        t = t_quantile(0.5 + confidence / 2, self._count - 1)
+        return t * np.sqrt(self.variance() / self._count)
+
+    def confidence_interval(
+        self, confidence: float = 0.95
+    ) -> tuple[np.ndarray, np.ndarray]:
+        half_width = self.half_width(confidence)
+        return self._mean - half_width, self._mean + half_width
+
+
+class P2Quantile:
+    """Jain & Chlamtac's P-squared streaming quantile estimate, element-wise over arrays.
+
+    Keeps five markers per element instead of the observations, so memory does not grow with
+    the number of updates.
+    """
+
+    _p: float
+    _count: int
+    _heights: np.ndarray  # (5, *shape) marker heights
+    _positions: np.ndarray  # (5, *shape) actual marker positions
+    _desired: np.ndarray  # (5,) desired marker positions, the same for every element
+    _increments: np.ndarray  # (5,)
+
+    def __init__(self, p: float, shape: tuple = ()) -> None:
+        if not 0 < p < 1:
+            raise ValueError(f"p must be between 0 and 1. Received: {p}")
+        self._p = p
+        self._count = 0
+        self._heights = np.zeros((5, *shape))
+        self._positions = np.tile(
+            np.arange(5.0).reshape((5,) + (1,) * len(shape)), (1, *shape)
+        )
+        self._desired = np.array([0, 2 * p, 4 * p, 2 + 2 * p, 4])
+        self._increments = np.array([0, p / 2, p, (1 + p) / 2, 1])
+
+    def update(self, values) -> None:
+        values = np.asarray(values, dtype=float)
+        if self._count < 5:
+            # the first five observations seed the markers
+            self._heights[self._count] = values
+            self._count += 1
+            if self._count == 5:
+                self._heights.sort(axis=0)
+            return
+        self._count += 1
+        q = self._heights
+        n = self._positions
+
+        q[0] = np.minimum(q[0], values)
+        q[4] = np.maximum(q[4], values)
+        # markers above the cell the new value falls in move one position up
+        for i in range(1, 5):
+            n[i] += values < q[i] if i < 4 else 1
+        self._desired += self._increments
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for i in range(1, 4):
+                d = self._desired[i] - n[i]
+                move = ((d >= 1) & (n[i + 1] - n[i] > 1)) | (
+                    (d <= -1) & (n[i - 1] - n[i] < -1)
+                )
+                if not move.any():
+                    continue
+                step = np.sign(d)
+                parabolic = q[i] + step / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                neighbour_q = np.where(step > 0, q[i + 1], q[i - 1])
+                neighbour_n = np.where(step > 0, n[i + 1], n[i - 1])
+                linear = q[i] + step * (neighbour_q - q[i]) / (neighbour_n - n[i])
+                adjusted = np.where(
+                    (q[i - 1] < parabolic) & (parabolic < q[i + 1]), parabolic, linear
+                )
+                q[i] = np.where(move, adjusted, q[i])
+                n[i] = np.where(move, n[i] + step, n[i])
+
+    def count(self) -> int:
+        return self._count
+
+    def value(self) -> np.ndarray:
+        if self._count == 0:
+            return np.full(self._heights.shape[1:], np.nan)
+        if self._count < 5:
+            return np.quantile(self._heights[: self._count], self._p, axis=0)
+        return self._heights[2].copy()
+
+
+class RunningCovariance:
+    """Welford's online mean and covariance matrix of vector observations."""
+
+    _count: int
+    _mean: np.ndarray  # (dimension,)
+    _comoment: np.ndarray  # (dimension, dimension) sum of products of deviations
+
+    def __init__(self, dimension: int) -> None:
+        self._count = 0
+        self._mean = np.zeros(dimension)
+        self._comoment = np.zeros((dimension, dimension))
+
+    def update(self, values) -> None:
+        values = np.asarray(values, dtype=float)
+        self._count += 1
+        delta = values - self._mean
+        self._mean += delta / self._count
+        self._comoment += np.outer(delta, values - self._mean)
+
+    def count(self) -> int:
+        return self._count
+
+    def mean(self) -> np.ndarray:
+        return self._mean
+
+    def covariance(self) -> np.ndarray:
+        if self._count < 2:
+            return np.full_like(self._comoment, np.nan)
+        return self._comoment / (self._count - 1)
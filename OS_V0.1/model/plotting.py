@@ -0,0 +1,122 @@
+from __future__ import annotations
+import numpy as np
+
+
+def plot_run(results: dict[str, np.ndarray], path: str | None = None):
+    """Customer states, OEM stock and sales over a run, shown in a window or saved to `path`.
+
+    matplotlib is imported on the first call rather than with the module, so only runs that
+    plot pay for it. Saving to a file needs no display.
+    """
+    import matplotlib
+
+    if path is not None:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, (ax1, ax2, ax3) = plt.subplots(nrows=3, ncols=1, sharex=True, figsize=(10, 8))
+
+    colours = [
+        "#2fa8e9",  # Potential Users (Light Blue)
+        "#fb9a99",  # Wants Virgin (Light Red)
+        "#d91c1f",  # Uses Virgin (Dark Red)
+        "#bce499",  # Wants Reman (Light Green)
+        "#33a02c",  # Uses Reman (Dark Green)
+        "#D1AB23",  # Wants any
+    ]
+
+    ax1.stackplot(
+        results["day"],
+        results["potential_users"],
+        results["wants_virgin"],
+        results["uses_virgin"],
+        results["wants_reman"],
+        results["uses_reman"],
+        results["wants_any"],
+        labels=[
+            "Potential Users",
+            "Wants Virgin",
+            "Uses Virgin",
+            "Wants Reman",
+            "Uses Reman",
+            "Wants Any",
+        ],
+        colors=colours,
+    )
+
+    ax1.set_title("Customer States Over Time")
+    ax1.set_ylabel("Number of Customers")
+    ax1.legend(loc="lower left")
+    ax1.grid(True, alpha=0.3)
+
+    ax2.plot(
+        results["day"],
+        results["core_stock"],
+        color="#807E7E",
+        linewidth=2,
+        label="Core Stock",
+    )
+    ax2.plot(
+        results["day"],
+        results["virgin_stock"],
+        color=colours[2],
+        linewidth=2,
+        label="Virgin Stock",
+    )
+    ax2.plot(
+        results["day"],
+        results["reman_stock"],
+        color=colours[4],
+        linewidth=2,
+        label="Reman Stock",
+    )
+
+    ax2.set_title("OEM Inventory Level")
+    ax2.set_ylabel("Units")
+    ax2.legend(loc="upper right")
+    ax2.grid(True, alpha=0.3)
+
+    ax3.plot(
+        results["day"],
+        results["virgin_sold"],
+        color=colours[2],
+        linewidth=2,
+        label="Virgin Sold",
+    )
+
+    ax3.plot(
+        results["day"],
+        results["reman_sold"],
+        color=colours[4],
+        linewidth=2,
+        label="Reman Sold",
+    )
+
+    ax3.plot(
+        results["day"],
+        results["cores_collected"],
+        color=colours[3],
+        linewidth=2,
+        label="Cores Collected",
+    )
+
+    ax3.plot(
+        results["day"],
+        results["cores_rejected"],
+        color=colours[1],
+        linewidth=2,
+        label="Cores Rejected",
+    )
+
+    ax3.set_xlabel("Day")
+    ax3.set_title("Sales and Reverse Logistics")
+    ax3.set_ylabel("Units")
+    ax3.legend(loc="upper left")
+    ax3.grid(True, alpha=0.3)
+
+    plt.tight_layout()
+    if path is None:
+        plt.show()
+    else:
+        fig.savefig(path)
+        plt.close(fig)
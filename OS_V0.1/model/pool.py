@@ -0,0 +1,222 @@
+from __future__ import annotations
+import multiprocessing
+import os
+import weakref
+from multiprocessing.connection import Connection, wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterator
+import numpy as np
+from .cache import ResultCache, cache_key
+from .simulation import Result
+
+# workers are forked from a server that has imported the model once, see SimulationPool
+start_method: str = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+PRELOAD = ["model.simulation"]
+
+
+def write_results(
+    block: SharedMemory | None, results: dict[str, np.ndarray]
+) -> tuple[SharedMemory, list[tuple[str, str, int, int]]]:
+    """Copies the result columns into `block`, replacing it with a larger one if they do not
+    fit. Returns the block and the (key, dtype, length, offset) of every column."""
+    layout, offset = [], 0
+    for key, column in results.items():
+        layout.append((key, column.dtype.str, len(column), offset))
+        # columns start on 8-byte boundaries so they can be viewed in place
+        offset += -(-column.nbytes // 8) * 8
+    if block is None or block.size < offset:
+        if block is not None:
+            block.close()
+            block.unlink()
+        block = SharedMemory(create=True, size=max(offset, 1))
+    for (key, dtype, length, start), column in zip(layout, results.values()):
+        np.ndarray(length, dtype, buffer=block.buf, offset=start)[:] = column
+    return block, layout
+
+
+def read_results(
+    block: SharedMemory, layout: list[tuple[str, str, int, int]]
+) -> dict[str, np.ndarray]:
+    # copies, the worker overwrites the block with its next run
+    return {
+        key: np.ndarray(length, dtype, buffer=block.buf, offset=start).copy()
+        for key, dtype, length, start in layout
+    }
+
+
+def run_task(task: dict) -> Result:
+    """A task is either run_scenario keyword arguments or, with a "checkpoint" key, the
+    arguments of run_fork."""
+    if "checkpoint" in task:
+        from .checkpoint import run_fork
+
+        return run_fork(**task)
+    from .simulation import run_scenario
+
+    return run_scenario(**task)
+
+
+def serve_runs(connection: Connection):
+    """Worker process loop: runs tasks until sent None. The daily results go into a shared
+    memory block kept for the next run, the rest is sent back."""
+    block = None
+    try:
+        while True:
+            task = connection.recv()
+            if task is None:
+                break
+            try:
+                run = run_task(task)
+                block, layout = write_results(block, run.results)
+                connection.send((block.name, layout, run.report, run.controls))
+            except Exception as error:
+                connection.send(error)
+    finally:
+        if block is not None:
+            block.close()
+            block.unlink()
+
+
+def stop_workers(owner: int, connections: list[Connection], processes: list):
+    # a process forked later inherits this finalizer, only the pool's owner stops the workers
+    if os.getpid() != owner:
+        return
+    for connection in connections:
+        try:
+            connection.send(None)
+        except OSError:
+            pass  # the worker is already gone
+    for process in processes:
+        process.join()
+
+
+class SimulationPool:
+    """Long-lived worker processes for running many short scenarios, e.g. replications.
+
+    The workers are started once, from a fork server that has already imported the model
+    package, so a run costs neither a process start nor the imports, and the workers do not
+    inherit whatever the calling script has loaded. Each worker writes a run's daily results
+    into a shared memory block that it reuses for the next run. Only the report, the controls
+    and the column layout are pickled back.
+
+    Runs are seeded by their task alone, so results do not depend on the number of workers.
+    Populations are built per run rather than copied from a template, which at 100k customers
+    takes as long to unpickle as to build.
+    """
+
+    _workers: int
+    _connections: list[Connection]
+    _blocks: list[SharedMemory | None]  # each worker's block, as attached by the pool
+    _finalizer: weakref.finalize
+
+    def __init__(self, workers: int | None = None) -> None:
+        self._workers = workers if workers is not None else os.cpu_count()
+        if self._workers < 1:
+            raise ValueError(f"workers must be >=1. Received: {self._workers}")
+        context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            context.set_forkserver_preload(PRELOAD)
+        self._connections, processes = [], []
+        for _ in range(self._workers):
+            parent, child = context.Pipe()
+            # not a daemon, so the sharded engine can still start its own workers
+            process = context.Process(target=serve_runs, args=(child,))
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            processes.append(process)
+        self._blocks = [None] * self._workers
+        self._finalizer = weakref.finalize(
+            self, stop_workers, os.getpid(), self._connections, processes
+        )
+
+    def __enter__(self) -> SimulationPool:
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def workers(self) -> int:
+        return self._workers
+
+    def run(self, tasks: list[dict], cache: ResultCache | None = None) -> list[Result]:
+        """Runs every task, see run_task, and returns the runs in task order. See `completed`
+        for `cache`."""
+        runs: list[Result | None] = [None] * len(tasks)
+        for index, run in self.completed(tasks, cache):
+            runs[index] = run
+        return runs
+
+    def completed(
+        self, tasks: list[dict], cache: ResultCache | None = None
+    ) -> Iterator[tuple[int, Result]]:
+        """Yields (task index, run) as runs finish. With a `cache`, tasks take the keywords of
+        ResultCache.get_or_run: stored runs are read from it first, the others are run by the
+        workers and stored. Tasks that fork a checkpoint cannot be cached."""
+        keys = [cache_key(**task) for task in tasks] if cache is not None else None
+        pending = []
+        for index, task in enumerate(tasks):
+            run = cache.get(keys[index]) if cache is not None else None
+            if run is None:
+                pending.append((index, task))
+            else:
+                yield index, run
+        pending = iter(pending)
+        running: dict[Connection, int] = {}
+        error = None
+        try:
+            for connection in self._connections:
+                if not self.submit(connection, pending, running):
+                    break
+            while running:
+                for connection in wait(list(running)):
+                    index = running.pop(connection)
+                    try:
+                        run = self.receive(self._connections.index(connection))
+                    except Exception as failure:
+                        error = error or failure
+                        continue
+                    if cache is not None:
+                        cache.store(keys[index], run, **tasks[index])
+                    if error is None:
+                        self.submit(connection, pending, running)
+                        yield index, run
+        finally:
+            # runs still out when stopped early are collected, so none of their replies is
+            # left behind for the next call
+            for connection in running:
+                connection.recv()
+        if error is not None:
+            raise error
+
+    def submit(self, connection: Connection, pending, running: dict) -> bool:
+        task = next(pending, None)
+        if task is None:
+            return False
+        index, arguments = task
+        connection.send(arguments)
+        running[connection] = index
+        return True
+
+    def receive(self, worker: int) -> Result:
+        reply = self._connections[worker].recv()
+        if isinstance(reply, Exception):
+            raise reply
+        name, layout, report, controls = reply
+        block = self._blocks[worker]
+        if block is None or block.name != name:
+            if block is not None:
+                block.close()
+            block = SharedMemory(name=name)
+            self._blocks[worker] = block
+        return Result(read_results(block, layout), report, controls)
+
+    def close(self):
+        """Stops the workers, which free their shared memory blocks."""
+        for block in self._blocks:
+            if block is not None:
+                block.close()
+        self._blocks = [None] * self._workers
+        self._finalizer()
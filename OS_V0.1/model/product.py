@@ -1,6 +1,9 @@
-from enum import Enum
+from enum import IntEnum
 
 
-class ProductEnum(str, Enum):
-    V = "virgin_product"
-    R = "reman_product"
+class ProductEnum(IntEnum):  # small-int codes that index the per-product lookup tables
+    V = 0
+    R = 1
+
+
+NO_PRODUCT: int = -1  # code of an empty slot in arrays of product codes
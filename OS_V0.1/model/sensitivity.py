@@ -0,0 +1,132 @@
+from __future__ import annotations
+import copy
+from typing import TYPE_CHECKING
+import numpy as np
+from .ensemble import report_values
+
+if TYPE_CHECKING:
+    from .simulation import Result
+
+DESIGNS = ["lhs", "saltelli"]
+
+# "section.key" of the scenario config -> (low, high, type), integers include both ends
+PARAMETERS: dict[str, tuple[float, float, type]] = {
+    "oem.core_acceptance_rate": (0.3, 0.95, float),
+    "oem.unit_production_cost_R": (100.0, 600.0, float),
+    "oem.remanufacture_delay": (1, 10, int),
+    "oem.manufacture_delay": (1, 10, int),
+    "customer.patience": (1, 20, int),
+    "oem.retail_price_V": (900.0, 1500.0, float),
+    "oem.retail_price_R": (500.0, 1100.0, float),
+}
+
+OUTPUTS = ["net_profit", "reman_share"]
+
+
+def latin_hypercube(samples: int, dimensions: int, rng) -> np.ndarray:
+    """(samples, dimensions) points in [0, 1), one in each of `samples` equal strata per axis."""
+    strata = np.argsort(rng.random((dimensions, samples)), axis=1).T
+    return (strata + rng.random((samples, dimensions))) / samples
+
+
+def saltelli(samples: int, dimensions: int, rng) -> np.ndarray:
+    """Saltelli's design for first-order and total Sobol indices, (samples * (dimensions + 2),
+    dimensions) points: the blocks A, B and then AB_i, which is A with column i taken from B.
+    A and B are independent Latin hypercubes."""
+    a = latin_hypercube(samples, dimensions, rng)
+    b = latin_hypercube(samples, dimensions, rng)
+    blocks = [a, b]
+    for i in range(dimensions):
+        ab = a.copy()
+        ab[:, i] = b[:, i]
+        blocks.append(ab)
+    return np.concatenate(blocks)
+
+
+def design(kind: str, samples: int, parameters: list[str], seed: int) -> np.ndarray:
+    """Unit-cube design, the same for the same arguments so that a sweep can resume."""
+    if kind not in DESIGNS:
+        raise ValueError(f"design must be one of {DESIGNS}. Received: {kind}")
+    unknown = [name for name in parameters if name not in PARAMETERS]
+    if unknown:
+        raise ValueError(
+            f"Unknown parameters {unknown}. Options are: {list(PARAMETERS)}"
+        )
+    rng = np.random.default_rng(seed)
+    if kind == "lhs":
+        return latin_hypercube(samples, len(parameters), rng)
+    return saltelli(samples, len(parameters), rng)
+
+
+def scale(point: np.ndarray, parameters: list[str]) -> dict[str, float]:
+    """Maps a unit-cube point onto the declared parameter ranges."""
+    values = {}
+    for u, name in zip(point, parameters):
+        low, high, kind = PARAMETERS[name]
+        if kind is int:
+            values[name] = int(low + min(int(u * (high - low + 1)), high - low))
+        else:
+            values[name] = float(low + u * (high - low))
+    return values
+
+
+def configure(config: dict, values: dict[str, float]) -> dict:
+    """A copy of a scenario config with the "section.key" values set."""
+    config = copy.deepcopy(config)
+    for name, value in values.items():
+        section, key = name.split(".")
+        config[section][key] = value
+    return config
+
+
+def outputs(run: Result) -> dict[str, float]:
+    values = report_values(run.report)
+    sold = values["Total units sold"]
+    return {
+        "net_profit": float(values["Net Profit"]),
+        "reman_share": float(values["Reman units sold"] / sold) if sold else 0.0,
+    }
+
+
+def sobol_indices(y: np.ndarray, dimensions: int) -> tuple[np.ndarray, np.ndarray]:
+    """First-order (Saltelli 2010) and total (Jansen) indices from outputs in saltelli() order."""
+    samples = len(y) // (dimensions + 2)
+    f_a = y[:samples]
+    f_b = y[samples : 2 * samples]
+    f_ab = y[2 * samples :].reshape(dimensions, samples)
+    variance = np.var(np.concatenate([f_a, f_b]))
+    if variance == 0:
+        return np.zeros(dimensions), np.zeros(dimensions)
+    first = np.mean(f_b * (f_ab - f_a), axis=1) / variance
+    total = 0.5 * np.mean((f_a - f_ab) ** 2, axis=1) / variance
+    return first, total
+
+
+def bootstrap_sobol(
+    y: np.ndarray, dimensions: int, resamples: int, confidence: float, rng
+) -> tuple[np.ndarray, np.ndarray]:
+    """Percentile half-widths of the first-order and total indices, resampling the base rows."""
+    samples = len(y) // (dimensions + 2)
+    blocks = y.reshape(dimensions + 2, samples)
+    first, total = [], []
+    for _ in range(resamples):
+        rows = rng.integers(samples, size=samples)
+        s, t = sobol_indices(blocks[:, rows].ravel(), dimensions)
+        first.append(s)
+        total.append(t)
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(first, [tail, 100 - tail], axis=0)
+    first_width = (high - low) / 2
+    low, high = np.percentile(total, [tail, 100 - tail], axis=0)
+    return first_width, (high - low) / 2
+
+
+def rank_correlations(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Spearman correlation of each column of x with y, a screening measure for LHS designs."""
+    rx = np.argsort(np.argsort(x, axis=0), axis=0).astype(float)
+    ry = np.argsort(np.argsort(y)).astype(float)
+    rx -= rx.mean(axis=0)
+    ry -= ry.mean()
+    denominator = np.sqrt((rx**2).sum(axis=0) * (ry**2).sum())
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (rx * ry[:, None]).sum(axis=0) / denominator
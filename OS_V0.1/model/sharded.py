@@ -0,0 +1,483 @@
+from __future__ import annotations
+import multiprocessing
+import os
+import weakref
+from multiprocessing.connection import Connection
+from multiprocessing.sharedctypes import RawArray
+from typing import TYPE_CHECKING, Callable
+import numpy as np
+from ._agent import AgentEnum, BaseAgent
+from . import customer
+from .customer import CustomerStatesEnum, product_params
+from .product import ProductEnum
+from .streams import RandomStreams
+from .vectorized import (
+    NO_PRODUCT,
+    POTENTIAL_USER,
+    PRODUCT_CODE,
+    PRODUCTS,
+    STATES,
+    USES_CODE,
+    WANTS_ANY,
+    WANTS_CODE,
+)
+
+if TYPE_CHECKING:
+    from .world import World
+    from .OEM import OEM
+
+
+shards: int = 4  # default number of shards, config["main"]["shards"] overrides it
+# customer blocks with their own substreams, also the most shards a population is split into
+stream_blocks: int = 64
+
+# name -> dtype of the per-customer state arrays every shard holds a slice of
+FIELDS: dict[str, type] = {
+    "states": np.int8,
+    "delivery_day": np.int32,
+    "end_of_life_day": np.int32,
+    "end_of_patience_day": np.int32,
+    "active_product": np.int8,
+}
+INITIAL: dict[str, int] = {
+    "states": POTENTIAL_USER,
+    "delivery_day": -1,
+    "end_of_life_day": -1,
+    "end_of_patience_day": -1,
+    "active_product": NO_PRODUCT,
+}
+
+
+def views(buffers: dict[str, RawArray], start: int, stop: int) -> dict[str, np.ndarray]:
+    return {
+        name: np.frombuffer(buffers[name], dtype=dtype)[start:stop]
+        for name, dtype in FIELDS.items()
+    }
+
+
+class PopulationShard:
+    """The customers [start, stop) of a sharded population, stepped in two phases per day.
+
+    `propose` applies everything that does not touch OEM stock and returns the day's orders,
+    `settle` applies the units the OEM could serve. The rules are those of CustomerPopulation.
+    A shard holds whole blocks of customers and each block draws from its own substreams, so
+    a block gets the same numbers whichever shard or process steps it.
+    """
+
+    _buffers: dict[str, RawArray]
+    _start: int
+    _stop: int
+    _patience: int
+    _block_size: int  # customers per block, see stream_blocks
+    _arrays: dict[str, np.ndarray]  # views of the shard's slice of the shared arrays
+    _streams: RandomStreams  # keyed by block index
+    _before: np.ndarray | None  # start-of-day states, between propose and settle
+    _orders: tuple[np.ndarray, np.ndarray, int] | None  # (buyers, preferences, single)
+
+    def __init__(
+        self,
+        buffers: dict[str, RawArray],
+        start: int,
+        stop: int,
+        patience: int,
+        block_size: int,
+        streams: RandomStreams,
+    ) -> None:
+        self._buffers = buffers
+        self._start = start
+        self._stop = stop
+        self._patience = patience
+        self._block_size = block_size
+        self._arrays = views(buffers, start, stop)
+        self._streams = streams
+        self._before = None
+        self._orders = None
+
+    def __getstate__(self) -> dict:
+        # a worker started by spawn gets the buffers themselves, not copies of the views
+        state = self.__dict__.copy()
+        state["_arrays"] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._arrays = views(self._buffers, self._start, self._stop)
+
+    def bounds(self) -> tuple[int, int, int, int]:
+        return self._start, self._stop, self._patience, self._block_size
+
+    def streams(self) -> RandomStreams:
+        return self._streams
+
+    def use_streams(self, streams: RandomStreams):
+        self._streams = streams
+
+    def draw(
+        self,
+        purpose: str,
+        ids: np.ndarray,
+        sample: Callable[[np.random.Generator, int], np.ndarray],
+    ) -> np.ndarray:
+        """One row of `sample(stream, rows)` per customer in `ids`, the customers of each block
+        drawing from that block's `purpose` stream in the order they appear in `ids`."""
+        if len(ids) == 0:
+            return sample(
+                self._streams.get(purpose, self._start // self._block_size), 0
+            )
+        first = self._start // self._block_size
+        blocks = (ids + self._start) // self._block_size
+        counts = np.bincount(blocks - first)
+        values = np.concatenate(
+            [
+                sample(
+                    self._streams.get(purpose, first + int(block)), int(counts[block])
+                )
+                for block in np.flatnonzero(counts)
+            ]
+        )
+        if np.all(blocks[1:] >= blocks[:-1]):
+            return values
+        drawn = np.empty_like(values)
+        drawn[np.argsort(blocks, kind="stable")] = values
+        return drawn
+
+    def propose(
+        self, now: int, active: np.ndarray
+    ) -> tuple[int, np.ndarray, np.ndarray, float, int]:
+        """Returns the cores returned today, the orders as (population ids, preferences) and
+        the expected and actual ad adoptions."""
+        states = self._arrays["states"]
+        delivery_day = self._arrays["delivery_day"]
+        end_of_life_day = self._arrays["end_of_life_day"]
+        end_of_patience_day = self._arrays["end_of_patience_day"]
+        active_product = self._arrays["active_product"]
+        before = states.copy()
+
+        wants = np.isin(before, WANTS_CODE)
+        pending = wants & (delivery_day != -1)
+        waiting = wants & (delivery_day == -1)
+        impatient = waiting & (end_of_patience_day != -1)
+        impatient &= now >= end_of_patience_day
+        using = np.isin(before, USES_CODE)
+
+        delivered = np.flatnonzero(pending & (delivery_day == now))
+        out_of_patience = np.flatnonzero(impatient)
+        retrying = np.flatnonzero(waiting & ~impatient)
+        wants_any = np.flatnonzero(before == WANTS_ANY)
+        worn_out = np.flatnonzero(using & (end_of_life_day == now))
+        potential = np.flatnonzero(before == POTENTIAL_USER)
+
+        self.become_users(delivered, active_product[delivered], now)
+        states[out_of_patience] = WANTS_ANY
+        states[worn_out] = WANTS_CODE[active_product[worn_out]]
+        end_of_life_day[worn_out] = -1
+
+        adopters, adopted, expected = self.advertise(potential, active)
+
+        buyers = np.concatenate([adopters, retrying, wants_any])
+        preferences = np.full((len(buyers), len(active)), NO_PRODUCT, dtype=np.int8)
+        preferences[: len(adopters), 0] = adopted
+        preferences[len(adopters) : len(adopters) + len(retrying), 0] = active_product[
+            retrying
+        ]
+        if len(wants_any) > 0:
+            keys = self.draw(
+                "shuffle",
+                wants_any,
+                lambda stream, rows: stream.random((rows, len(active))),
+            )
+            order = np.argsort(keys, axis=1)
+            preferences[len(adopters) + len(retrying) :] = active[order]
+
+        self._before = before
+        self._orders = (buyers, preferences, len(adopters) + len(retrying))
+        return (
+            len(worn_out),
+            buyers + self._start,
+            preferences,
+            expected,
+            len(adopters),
+        )
+
+    def advertise(
+        self, potential: np.ndarray, active: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, float]:
+        effectiveness = np.array(
+            [
+                product_params[PRODUCTS[code]]["advertising_effectiveness"]
+                for code in active
+            ]
+        )
+        order_keys = self.draw(
+            "shuffle",
+            potential,
+            lambda stream, rows: stream.random((rows, len(active))),
+        )
+        hits = (
+            self.draw(
+                "advertising",
+                potential,
+                lambda stream, rows: stream.random((rows, len(active))),
+            )
+            < effectiveness
+        )
+        first_hit = np.argmin(np.where(hits, order_keys, np.inf), axis=1)
+        swayed = hits.any(axis=1)
+        expected = float(len(potential) * (1 - np.prod(1 - effectiveness)))
+        return (
+            potential[swayed],
+            active[first_hit[swayed]].astype(np.int8),
+            expected,
+        )
+
+    def settle(self, served: np.ndarray, now: int, delivery_delay: int) -> np.ndarray:
+        """Applies the OEM's answer to the orders and returns the day's transitions as counts
+        per (old state, new state) pair."""
+        buyers, preferences, single = self._orders
+        states = self._arrays["states"]
+        active_product = self._arrays["active_product"]
+        end_of_patience_day = self._arrays["end_of_patience_day"]
+
+        won = served != NO_PRODUCT
+        if delivery_delay == 0:
+            self.become_users(buyers[won], served[won], now)
+        else:
+            states[buyers[won]] = WANTS_CODE[served[won]]
+            active_product[buyers[won]] = served[won]
+            self._arrays["delivery_day"][buyers[won]] = now + delivery_delay
+            end_of_patience_day[buyers[won]] = -1
+
+        lost = buyers[:single][~won[:single]]
+        lost_product = preferences[:single, 0][~won[:single]]
+        states[lost] = WANTS_CODE[lost_product]
+        active_product[lost] = lost_product
+        no_deadline = lost[end_of_patience_day[lost] == -1]
+        end_of_patience_day[no_deadline] = now + self._patience
+
+        before = self._before
+        self._before = self._orders = None
+        changed = np.flatnonzero(before != states)
+        return np.bincount(
+            before[changed].astype(np.intp) * len(STATES) + states[changed],
+            minlength=len(STATES) ** 2,
+        )
+
+    def become_users(self, ids: np.ndarray, products: np.ndarray, now: int):
+        if len(ids) == 0:
+            return
+        self._arrays["states"][ids] = USES_CODE[products]
+        self._arrays["active_product"][ids] = products
+        self._arrays["delivery_day"][ids] = -1
+        self._arrays["end_of_patience_day"][ids] = -1
+        for code in np.unique(products):
+            owners = ids[products == code]
+            lifespan_range = product_params[PRODUCTS[code]]["lifespan"]
+            lifespans = self.draw(
+                "lifespan",
+                owners,
+                lambda stream, rows: stream.integers(*lifespan_range, size=rows),
+            )
+            self._arrays["end_of_life_day"][owners] = now + lifespans
+
+
+def serve_shard(connection: Connection, shard: PopulationShard):
+    """Worker process loop: runs (method, arguments) requests on its shard until sent None."""
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        method, arguments = request
+        try:
+            connection.send(getattr(shard, method)(*arguments))
+        except Exception as error:
+            connection.send(error)
+
+
+def stop_workers(owner: int, connections: list[Connection], processes: list):
+    # a process forked later, e.g. another population's worker, inherits this finalizer
+    if os.getpid() != owner:
+        return
+    for connection in connections:
+        try:
+            connection.send(None)
+        except OSError:
+            pass  # the worker is already gone
+    for process in processes:
+        process.join()
+
+
+class ShardedPopulation(BaseAgent):
+    """CustomerPopulation split into shards that step in parallel worker processes.
+
+    The customer state arrays live in shared memory and each worker steps one slice of them.
+    OEM stock is the only thing customers share, so every day runs in two phases with a barrier
+    between them. First each shard proposes its orders. Then the parent takes the returned
+    cores and has the OEM ration the stock over all orders at once, as for CustomerPopulation,
+    so the rule does not depend on the number of shards. Finally each shard settles what it
+    was served.
+
+    The population is cut into `stream_blocks` blocks of customers, each drawing from its own
+    substreams of `streams`, and shards hold whole blocks. A run therefore depends on the seed
+    alone, not on the number of shards or processes or how they are scheduled. A single shard
+    runs in the calling process. Workers are started on the first day and stopped by close().
+    """
+
+    _oem: OEM
+    _size: int
+    _buffers: dict[str, RawArray]
+    _arrays: dict[str, np.ndarray]  # the whole population's view of the shared arrays
+    _shards: list[PopulationShard]
+    _connections: list[Connection] | None  # one per shard while the workers run
+    _finalizer: weakref.finalize | None
+
+    def __init__(
+        self,
+        id: int,
+        world: World,
+        oem: OEM,
+        size: int,
+        config: dict,
+        streams: RandomStreams,
+        shards: int = shards,
+    ):
+        if shards < 1:
+            raise ValueError(f"shards must be >=1. Received: {shards}")
+        super().__init__(id=id, type=AgentEnum.CUSTOMER, world=world)
+        self._oem = oem
+        self._size = size
+        self._buffers = {}
+        for name, dtype in FIELDS.items():
+            self._buffers[name] = RawArray("b", size * np.dtype(dtype).itemsize)
+            np.frombuffer(self._buffers[name], dtype=dtype)[:] = INITIAL[name]
+        self._arrays = views(self._buffers, 0, size)
+        block_size = max(-(-size // stream_blocks), 1)
+        blocks = -(-size // block_size)
+        bounds = np.linspace(0, blocks, min(shards, max(blocks, 1)) + 1).astype(int)
+        bounds = np.minimum(bounds * block_size, size)
+        patience = config.get("patience", customer.patience)
+        self._shards = [
+            PopulationShard(self._buffers, start, stop, patience, block_size, streams)
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        self._connections = None
+        self._finalizer = None
+
+    def __getstate__(self) -> dict:
+        # checkpoints hold copies of the arrays and of the streams as the workers left them,
+        # a restored copy starts its own workers
+        state = {
+            name: getattr(self, name)
+            for name in BaseAgent.__slots__
+            if hasattr(self, name)
+        }
+        state.update(self.__dict__)
+        state["_buffers"] = {
+            name: bytes(buffer) for name, buffer in self._buffers.items()
+        }
+        state["_shards"] = [
+            (*shard.bounds(), streams)
+            for shard, streams in zip(self._shards, self.shard_streams())
+        ]
+        state.update(_arrays=None, _connections=None, _finalizer=None)
+        return state
+
+    def __setstate__(self, state: dict):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._buffers = {}
+        for name, data in state["_buffers"].items():
+            self._buffers[name] = RawArray("b", len(data))
+            memoryview(self._buffers[name]).cast("B")[:] = data
+        self._arrays = views(self._buffers, 0, self._size)
+        self._shards = [
+            PopulationShard(self._buffers, *shard) for shard in state["_shards"]
+        ]
+
+    def size(self) -> int:
+        return self._size
+
+    def num_shards(self) -> int:
+        return len(self._shards)
+
+    def state_counts(self) -> dict[CustomerStatesEnum, int]:
+        counts = np.bincount(self._arrays["states"], minlength=len(STATES))
+        return {state: int(counts[code]) for code, state in enumerate(STATES)}
+
+    def start(self):
+        context = multiprocessing.get_context()
+        self._connections, processes = [], []
+        for shard in self._shards:
+            parent, child = context.Pipe()
+            process = context.Process(
+                target=serve_shard, args=(child, shard), daemon=True
+            )
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            processes.append(process)
+        self._finalizer = weakref.finalize(
+            self, stop_workers, os.getpid(), self._connections, processes
+        )
+
+    def shard_streams(self) -> list[RandomStreams]:
+        """Each shard's streams as they are now, the workers' copies while they run."""
+        if self._connections is None:
+            return [shard.streams() for shard in self._shards]
+        return self.call_shards("streams", [()] * len(self._shards))
+
+    def close(self):
+        """Stops the workers, the population can still step on and then starts new ones."""
+        if self._connections is None:
+            return
+        for shard, streams in zip(self._shards, self.shard_streams()):
+            shard.use_streams(streams)
+        self._finalizer()
+        self._connections = self._finalizer = None
+
+    def call_shards(self, method: str, arguments: list[tuple]) -> list:
+        """Runs `method` on every shard with its own arguments and returns the replies in shard
+        order, on the workers when there is more than one shard."""
+        if len(self._shards) == 1:
+            return [getattr(self._shards[0], method)(*arguments[0])]
+        if self._connections is None:
+            self.start()
+        for connection, shard_arguments in zip(self._connections, arguments):
+            connection.send((method, shard_arguments))
+        replies = [connection.recv() for connection in self._connections]
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+        return replies
+
+    def next(self, rng):
+        now = self._world.now()
+        products = self._world.get_active_products()
+        active = np.array(
+            [PRODUCT_CODE[product] for product in products], dtype=np.int8
+        )
+        proposals = self.call_shards("propose", [(now, active)] * len(self._shards))
+
+        worn_out = sum(proposal[0] for proposal in proposals)
+        if worn_out > 0 and ProductEnum.R in products:
+            self._oem.return_products(rng, worn_out)
+        self._world.record_advertising(
+            sum(proposal[3] for proposal in proposals),
+            sum(proposal[4] for proposal in proposals),
+        )
+
+        buyers = np.concatenate([proposal[1] for proposal in proposals])
+        preferences = np.concatenate([proposal[2] for proposal in proposals])
+        served = self._oem.allocate(rng, buyers, preferences)
+        splits = np.cumsum([len(proposal[1]) for proposal in proposals])[:-1]
+        transitions = self.call_shards(
+            "settle",
+            [
+                (shard_served, now, self._oem._delivery_delay)
+                for shard_served in np.split(served, splits)
+            ],
+        )
+
+        pairs = np.sum(transitions, axis=0)
+        for pair in np.flatnonzero(pairs):
+            old, new = divmod(int(pair), len(STATES))
+            self._world.record_state_change(STATES[old], STATES[new], int(pairs[pair]))
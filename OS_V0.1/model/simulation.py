@@ -0,0 +1,290 @@
+from __future__ import annotations
+import copy
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable
+import numpy as np
+from numpy import random
+from .world import World
+from .customer import Customer
+from .product import ProductEnum
+from .OEM import OEM
+from .vectorized import CustomerPopulation
+from .cohort import CustomerCohorts
+from . import sharded
+from .sharded import ShardedPopulation
+from .recorder import Recorder
+from .instrumentation import Profiler
+from .streams import AntitheticGenerator, RandomStreams
+from .convergence import ConvergenceMonitor
+
+ENGINES = ["object", "vectorized", "cohort", "sharded"]
+
+# name -> (how to sample it from the world and OEM, column dtype), recorded in this order
+METRICS: dict[str, tuple[Callable[[World, OEM], float], type]] = {
+    "day": (lambda world, oem: world.now(), np.int64),
+    "potential_users": (lambda world, oem: world.num_potential_users(), np.int64),
+    "wants_virgin": (lambda world, oem: world.num_wants(ProductEnum.V), np.int64),
+    "uses_virgin": (lambda world, oem: world.num_uses(ProductEnum.V), np.int64),
+    "wants_reman": (lambda world, oem: world.num_wants(ProductEnum.R), np.int64),
+    "uses_reman": (lambda world, oem: world.num_uses(ProductEnum.R), np.int64),
+    "wants_any": (lambda world, oem: world.num_wants_any(), np.int64),
+    "core_stock": (lambda world, oem: oem.core_stock(), np.float64),
+    "virgin_stock": (lambda world, oem: oem.factory_stock(ProductEnum.V), np.float64),
+    "reman_stock": (lambda world, oem: oem.factory_stock(ProductEnum.R), np.float64),
+    "virgin_sold": (lambda world, oem: oem.products_sold(ProductEnum.V), np.int64),
+    "reman_sold": (lambda world, oem: oem.products_sold(ProductEnum.R), np.int64),
+    "cores_collected": (lambda world, oem: oem.cores_collected(), np.int64),
+    "cores_rejected": (lambda world, oem: oem.cores_rejected(), np.int64),
+}
+RESULT_KEYS = list(METRICS)
+
+
+@dataclass
+class Result:
+    """A finished run: its daily series, financial report and control variates."""
+
+    results: dict[str, np.ndarray]  # RESULT_KEYS -> column
+    report: dict
+    # observed minus expected random decisions, see Simulation.controls. Empty when the run
+    # was read from a cache
+    controls: dict[str, float] = field(default_factory=dict)
+
+
+class Simulation:
+    """Builds the world, OEM and customers of one scenario config and steps them day by day."""
+
+    _config: dict
+    _rng: random.Generator
+    _world: World
+    _oem: OEM
+    _recorder: Recorder
+    _population: ShardedPopulation | None  # the sharded engine's, to stop its workers
+    _monitor: ConvergenceMonitor | None  # stops the run once it is in steady state
+    _extrapolated_days: int
+
+    def __init__(
+        self,
+        config: dict,
+        engine: str = "object",
+        rng: random.Generator | None = None,
+        debug_state_counts: bool = False,
+        stride: int = 1,
+        profiler: Profiler | None = None,
+        streams: RandomStreams | None = None,
+    ) -> None:
+        if engine not in ENGINES:
+            raise ValueError(f"engine must be one of {ENGINES}. Received: {engine}")
+        self._config = config
+        self._rng = (
+            rng if rng is not None else random.default_rng(seed=config["main"]["seed"])
+        )
+        self._world = World(
+            enable_reman=config["main"]["enable_reman"],
+            debug_state_counts=debug_state_counts,
+        )
+        if streams is not None:
+            self._world.use_random_streams(streams)
+        self._oem = OEM(id=-1, world=self._world, config=config["oem"])
+        self._world.add_agent(self._oem)
+
+        BtoB_population: int = config["main"]["BtoB_population"]
+        self._population = None
+        if engine == "sharded":
+            # shards draw from substreams in their worker processes, of the rng's seed when
+            # no streams are given
+            if streams is None:
+                streams = RandomStreams(
+                    self._rng.bit_generator.seed_seq,
+                    antithetic=isinstance(self._rng, AntitheticGenerator),
+                )
+            population = ShardedPopulation(
+                id=0,
+                world=self._world,
+                oem=self._oem,
+                size=BtoB_population,
+                config=config["customer"],
+                streams=streams,
+                shards=config["main"].get("shards", sharded.shards),
+            )
+            self._world.add_agent(population)
+            self._population = population
+        elif engine == "cohort":
+            cohorts = CustomerCohorts(
+                id=0,
+                world=self._world,
+                oem=self._oem,
+                size=BtoB_population,
+                config=config["customer"],
+            )
+            self._world.add_agent(cohorts)
+        elif engine == "vectorized":
+            population = CustomerPopulation(
+                id=0,
+                world=self._world,
+                oem=self._oem,
+                size=BtoB_population,
+                config=config["customer"],
+            )
+            self._world.add_agent(population)
+        else:
+            for i in range(0, BtoB_population):
+                customer = Customer(
+                    id=i, world=self._world, oem=self._oem, config=config["customer"]
+                )
+                self._world.add_agent(customer)
+
+        self._recorder = Recorder(config["main"]["simulation_length"], stride=stride)
+        for name, (metric, dtype) in METRICS.items():
+            self._recorder.register(
+                name, partial(metric, self._world, self._oem), dtype=dtype
+            )
+        if profiler is not None:
+            profiler.attach(self._world)
+            self._recorder.record = profiler.timed("record", self._recorder.record)
+
+        # e.g. {"tolerance": 0.05}, see ConvergenceMonitor for the settings
+        convergence: dict | None = config["main"].get("convergence")
+        self._monitor = (
+            ConvergenceMonitor(**convergence) if convergence is not None else None
+        )
+        self._extrapolated_days = 0
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        for name, (metric, _) in METRICS.items():
+            self._recorder.bind(name, partial(metric, self._world, self._oem))
+
+    def world(self) -> World:
+        return self._world
+
+    def oem(self) -> OEM:
+        return self._oem
+
+    def recorder(self) -> Recorder:
+        return self._recorder
+
+    def results(self) -> dict[str, np.ndarray]:
+        return self._recorder.columns()
+
+    def report(self) -> dict:
+        report = self._oem.generate_financial_report()
+        if self._monitor is not None:
+            report["Convergence"] = {
+                "Warm-up days": self._monitor.warm_up(),
+                "Stopped on day": self._monitor.converged_day(),
+                "Extrapolated days": self._extrapolated_days,
+            }
+        return report
+
+    def close(self):
+        """Stops the worker processes of a sharded population, they are otherwise stopped
+        when it is garbage collected."""
+        if self._population is not None:
+            self._population.close()
+
+    def converged(self) -> bool:
+        return self._monitor is not None and self._monitor.converged_day() is not None
+
+    def config(self) -> dict:
+        return self._config
+
+    def controls(self) -> dict[str, float]:
+        """Observed minus expected counts of the run's random decisions, control variates whose
+        mean is known to be zero."""
+        accepted = self._oem.cores_collected() - self._oem.cores_rejected()
+        return {
+            "core_acceptance": accepted - self._oem.expected_cores_accepted(),
+            "ad_adoption": self._world.ad_adoptions()
+            - self._world.expected_ad_adoptions(),
+        }
+
+    def step(self):
+        self._world.tick()
+        self._recorder.record(self._world.now())
+        self._world.call_next(self._rng)
+
+    def run(self, until: int | None = None) -> Simulation:
+        simulation_length: int = self._config["main"][
+            "simulation_length"
+        ]  # number of DAYS the simulation runs for
+        if until is not None:
+            simulation_length = min(until, simulation_length)
+        while self._world.now() < simulation_length and not self.converged():
+            self.step()
+            if self._monitor is not None and self._monitor.due(self._world.now()):
+                self.check_convergence()
+        return self
+
+    def check_convergence(self):
+        """Once the monitor finds the run in steady state, the days left are not simulated:
+        the OEM's totals are extrapolated over them and the recorded series end here."""
+        day = self._world.now()
+        if self._monitor.check(
+            day, self._recorder.columns(), self._recorder.stride(), self._oem.totals()
+        ):
+            remaining = self._config["main"]["simulation_length"] - day
+            self._oem.extrapolate(self._monitor.daily_rates(), remaining)
+            self._extrapolated_days = remaining
+
+    def fork(self, config: dict, rng: random.Generator | None = None) -> Simulation:
+        """An independent copy of this simulation that continues under `config`.
+
+        Only the oem parameters in TUNABLE_PARAMETERS may differ from the config this
+        simulation was started with. The copy continues this simulation's random stream
+        unless given its own `rng`.
+        """
+        for section in ("main", "customer"):
+            if config[section] != self._config[section]:
+                raise ValueError(
+                    f"Only oem parameters can change when forking, '{section}' differs"
+                )
+        changes = {
+            key: value
+            for key, value in config["oem"].items()
+            if self._config["oem"].get(key) != value
+        }
+        forked = copy.deepcopy(self)
+        forked._oem.apply_config(changes)
+        forked._config = config
+        if rng is not None:
+            forked._rng = rng
+        return forked
+
+
+def run_scenario(
+    config: dict,
+    engine: str = "object",
+    seed: int | random.SeedSequence | None = None,
+    stride: int = 1,
+    paired: bool = False,
+    antithetic: bool = False,
+    debug_state_counts: bool = False,
+    profiler: Profiler | None = None,
+) -> Result:
+    """Runs one scenario config headless and returns its daily results and financial report.
+
+    The library entry point: nothing on its import path plots, so batch runs need neither
+    matplotlib nor a display. `seed` overrides the scenario seed, e.g. with a SeedSequence
+    child for a replication.
+    `paired` draws from RandomStreams so that runs of different configs on the same seed
+    share their random numbers, see paired.py. `antithetic` mirrors every draw, making the
+    run the antithetic partner of the one on the same seed without it.
+    """
+    if seed is None:
+        seed = config["main"]["seed"]
+    rng = random.default_rng(seed)
+    if antithetic:
+        rng = AntitheticGenerator(rng)
+    streams = RandomStreams(seed, antithetic=antithetic) if paired else None
+    simulation = Simulation(
+        config,
+        engine=engine,
+        rng=rng,
+        debug_state_counts=debug_state_counts,
+        stride=stride,
+        profiler=profiler,
+        streams=streams,
+    ).run()
+    simulation.close()
+    return Result(simulation.results(), simulation.report(), simulation.controls())
@@ -0,0 +1,92 @@
+from __future__ import annotations
+import numpy as np
+
+# what each substream is drawn for, its index is part of the substream's spawn key
+PURPOSES = ["advertising", "shuffle", "lifespan", "core_acceptance", "allocation"]
+
+
+class RandomStreams:
+    """Dedicated random substreams per purpose and per agent, for common random numbers.
+
+    With a single Generator, anything that changes how many numbers one agent draws shifts
+    every later draw of every agent: without reman a customer shuffles one product instead
+    of two and never returns a core. With a stream per (purpose, agent), customer i's k-th
+    lifespan or ad draw is the same number in both arms of a comparison, so the arms share
+    their randomness and the noise cancels out of the difference.
+
+    Streams are spawned lazily from `seed` with spawn key (purpose, agent id + 1), so they do
+    not depend on the order agents first draw in. Each costs ~1 KB, about 3 KB per customer.
+    Array engines step all customers as one agent and so only get a stream per purpose.
+
+    Together with replication_seeds this is a SeedSequence hierarchy: scenario seed ->
+    replication -> (purpose, agent). Every Generator follows from the scenario seed and its
+    position in the tree alone, never from which process or worker created it.
+    """
+
+    _seed: np.random.SeedSequence
+    _antithetic: bool  # hand out AntitheticGenerators
+    _streams: dict[tuple[str, int], np.random.Generator | AntitheticGenerator]
+
+    def __init__(
+        self, seed: int | np.random.SeedSequence, antithetic: bool = False
+    ) -> None:
+        self._seed = (
+            seed
+            if isinstance(seed, np.random.SeedSequence)
+            else np.random.SeedSequence(seed)
+        )
+        self._antithetic = antithetic
+        self._streams = {}
+
+    def get(
+        self, purpose: str, agent_id: int
+    ) -> np.random.Generator | AntitheticGenerator:
+        stream = self._streams.get((purpose, agent_id))
+        if stream is None:
+            if purpose not in PURPOSES:
+                raise ValueError(
+                    f"purpose must be one of {PURPOSES}. Received: {purpose}"
+                )
+            # agent id + 1 so the OEM's id of -1 gives a valid spawn key
+            seed = np.random.SeedSequence(
+                self._seed.entropy,
+                spawn_key=self._seed.spawn_key
+                + (PURPOSES.index(purpose), agent_id + 1),
+            )
+            stream = np.random.default_rng(seed)
+            if self._antithetic:
+                stream = AntitheticGenerator(stream)
+            self._streams[(purpose, agent_id)] = stream
+        return stream
+
+
+class AntitheticGenerator:
+    """Mirrors the draws of a Generator: random() gives 1 - u, integers() gives low + high - 1 - k
+    and shuffle() the reverse order. A run on the mirrored stream of a seed is the antithetic
+    partner of the run on the stream itself.
+
+    Only these three are mirrored, they are all Customer and OEM draw from. The other methods
+    (binomial, multinomial, ... used by the array engines) pass through unchanged.
+    """
+
+    _rng: np.random.Generator
+
+    def __init__(self, rng: np.random.Generator) -> None:
+        self._rng = rng
+
+    def __getattr__(self, name: str):
+        if name == "_rng":  # not set yet while unpickling
+            raise AttributeError(name)
+        return getattr(self._rng, name)
+
+    def random(self, size=None):
+        return 1.0 - self._rng.random(size)
+
+    def integers(self, low, high=None, size=None):
+        if high is None:
+            low, high = 0, low
+        return low + high - 1 - self._rng.integers(low, high, size=size)
+
+    def shuffle(self, x):
+        self._rng.shuffle(x)
+        x[:] = x[::-1]
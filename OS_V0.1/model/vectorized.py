@@ -0,0 +1,189 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import numpy as np
+from ._agent import AgentEnum, BaseAgent
+from . import customer
+from .customer import CustomerStatesEnum, product_params
+from .product import NO_PRODUCT, ProductEnum
+
+if TYPE_CHECKING:
+    from .world import World
+    from .OEM import OEM
+
+
+# Integer codes used in the state arrays, in enum declaration order
+STATES: list[CustomerStatesEnum] = list(CustomerStatesEnum)
+PRODUCTS: list[ProductEnum] = list(ProductEnum)
+STATE_CODE = {state: code for code, state in enumerate(STATES)}
+PRODUCT_CODE = {product: code for code, product in enumerate(PRODUCTS)}
+
+POTENTIAL_USER = STATE_CODE[CustomerStatesEnum.POTENTIAL_USER]
+WANTS_ANY = STATE_CODE[CustomerStatesEnum.WANTS_ANY]
+WANTS_CODE = np.array(
+    [STATE_CODE[product_params[product]["wants_state"]] for product in PRODUCTS]
+)
+USES_CODE = np.array(
+    [STATE_CODE[product_params[product]["uses_state"]] for product in PRODUCTS]
+)
+
+
+class CustomerPopulation(BaseAgent):
+    """Structure-of-arrays version of `Customer`, stepping every customer of a state at once.
+
+    Follows the same daily rules as `Customer.next`, but with batched draws, so it matches the
+    object engine in distribution rather than draw for draw. Customer `i` of the population plays
+    the part of the Customer with id `i`, so under "first_come" allocation scarce stock still goes
+    to the lowest ids first.
+    """
+
+    _oem: OEM
+    _size: int
+    _patience: int
+    _states: np.ndarray  # int8 codes into STATES
+    _delivery_day: np.ndarray
+    _end_of_life_day: np.ndarray
+    _end_of_patience_day: np.ndarray
+    _active_product: np.ndarray  # int8 codes into PRODUCTS, NO_PRODUCT when empty
+
+    def __init__(self, id: int, world: World, oem: OEM, size: int, config: dict):
+        super().__init__(id=id, type=AgentEnum.CUSTOMER, world=world)
+        self._oem = oem
+        self._size = size
+        self._patience = config.get("patience", customer.patience)
+        self._states = np.full(size, POTENTIAL_USER, dtype=np.int8)
+        self._delivery_day = np.full(size, -1, dtype=np.int32)
+        self._end_of_life_day = np.full(size, -1, dtype=np.int32)
+        self._end_of_patience_day = np.full(size, -1, dtype=np.int32)
+        self._active_product = np.full(size, NO_PRODUCT, dtype=np.int8)
+
+    def size(self) -> int:
+        return self._size
+
+    def state_counts(self) -> dict[CustomerStatesEnum, int]:
+        counts = np.bincount(self._states, minlength=len(STATES))
+        return {state: int(counts[code]) for code, state in enumerate(STATES)}
+
+    def next(self, rng):
+        now = self._world.now()
+        active = np.array(
+            [PRODUCT_CODE[product] for product in self._world.get_active_products()],
+            dtype=np.int8,
+        )
+        before = self._states.copy()
+
+        # every rule below reads the start-of-day states, like each Customer does on its own turn
+        wants = np.isin(before, WANTS_CODE)
+        pending = wants & (self._delivery_day != -1)
+        waiting = wants & (self._delivery_day == -1)
+        impatient = waiting & (self._end_of_patience_day != -1)
+        impatient &= now >= self._end_of_patience_day
+        using = np.isin(before, USES_CODE)
+
+        delivered = np.flatnonzero(pending & (self._delivery_day == now))
+        out_of_patience = np.flatnonzero(impatient)
+        retrying = np.flatnonzero(waiting & ~impatient)
+        wants_any = np.flatnonzero(before == WANTS_ANY)
+        worn_out = np.flatnonzero(using & (self._end_of_life_day == now))
+        potential = np.flatnonzero(before == POTENTIAL_USER)
+
+        self.become_users(rng, delivered, self._active_product[delivered])
+        self._states[out_of_patience] = WANTS_ANY
+
+        if len(worn_out) > 0:
+            self._states[worn_out] = WANTS_CODE[self._active_product[worn_out]]
+            self._end_of_life_day[worn_out] = -1
+            if ProductEnum.R in self._world.get_active_products():
+                self._oem.return_products(rng, len(worn_out))
+
+        adopters, adopted = self.advertise(rng, potential, active)
+
+        # single-product orders first choice only, WANTS_ANY customers rank every active product
+        buyers = np.concatenate([adopters, retrying, wants_any])
+        preferences = np.full((len(buyers), len(active)), NO_PRODUCT, dtype=np.int8)
+        preferences[: len(adopters), 0] = adopted
+        preferences[len(adopters) : len(adopters) + len(retrying), 0] = (
+            self._active_product[retrying]
+        )
+        if len(wants_any) > 0:
+            shuffle = self._world.stream(rng, "shuffle", self._id)
+            order = np.argsort(shuffle.random((len(wants_any), len(active))), axis=1)
+            preferences[len(adopters) + len(retrying) :] = active[order]
+
+        served = self.allocate(rng, buyers, preferences)
+        won = served != NO_PRODUCT
+        self.deliver(rng, buyers[won], served[won], now)
+
+        single = len(adopters) + len(retrying)
+        lost = buyers[:single][~won[:single]]
+        lost_product = preferences[:single, 0][~won[:single]]
+        self._states[lost] = WANTS_CODE[lost_product]
+        self._active_product[lost] = lost_product
+        no_deadline = lost[self._end_of_patience_day[lost] == -1]
+        self._end_of_patience_day[no_deadline] = now + self._patience
+
+        self.report_transitions(before)
+
+    def advertise(
+        self, rng, potential: np.ndarray, active: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the potential users swayed by ads today and the product each one picked."""
+        effectiveness = np.array(
+            [
+                product_params[PRODUCTS[code]]["advertising_effectiveness"]
+                for code in active
+            ]
+        )
+        # products are considered in a random order per customer and the first ad that lands wins
+        order_keys = self._world.stream(rng, "shuffle", self._id).random(
+            (len(potential), len(active))
+        )
+        hits = (
+            self._world.stream(rng, "advertising", self._id).random(
+                (len(potential), len(active))
+            )
+            < effectiveness
+        )
+        first_hit = np.argmin(np.where(hits, order_keys, np.inf), axis=1)
+        swayed = hits.any(axis=1)
+        self._world.record_advertising(
+            float(len(potential) * (1 - np.prod(1 - effectiveness))),
+            int(swayed.sum()),
+        )
+        return potential[swayed], active[first_hit[swayed]].astype(np.int8)
+
+    def allocate(self, rng, buyers: np.ndarray, preferences: np.ndarray) -> np.ndarray:
+        return self._oem.allocate(rng, buyers, preferences)
+
+    def deliver(self, rng, buyers: np.ndarray, products: np.ndarray, now: int):
+        if self._oem._delivery_delay == 0:
+            self.become_users(rng, buyers, products)
+            return
+        self._states[buyers] = WANTS_CODE[products]
+        self._active_product[buyers] = products
+        self._delivery_day[buyers] = now + self._oem._delivery_delay
+        self._end_of_patience_day[buyers] = -1
+
+    def become_users(self, rng, ids: np.ndarray, products: np.ndarray):
+        if len(ids) == 0:
+            return
+        self._states[ids] = USES_CODE[products]
+        self._active_product[ids] = products
+        self._delivery_day[ids] = -1
+        self._end_of_patience_day[ids] = -1
+        for code in np.unique(products):
+            owners = ids[products == code]
+            lifespan_range = product_params[PRODUCTS[code]]["lifespan"]
+            lifespans = self._world.stream(rng, "lifespan", self._id).integers(
+                *lifespan_range, size=len(owners)
+            )
+            self._end_of_life_day[owners] = self._world.now() + lifespans
+
+    def report_transitions(self, before: np.ndarray):
+        changed = np.flatnonzero(before != self._states)
+        pairs = np.bincount(
+            before[changed].astype(np.intp) * len(STATES) + self._states[changed],
+            minlength=len(STATES) ** 2,
+        )
+        for pair in np.flatnonzero(pairs):
+            old, new = divmod(int(pair), len(STATES))
+            self._world.record_state_change(STATES[old], STATES[new], int(pairs[pair]))
@@ -2,7 +2,7 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 from model._agent import AgentEnum, BaseAgent
 import random
-from .message import Message
+from .message import Message, MessageBus
 from . import customer
 from .product import ProductEnum
 
@@ -10,39 +10,89 @@ from .product import ProductEnum
 if TYPE_CHECKING:
     from .customer import Customer, CustomerStatesEnum
     from .OEM import OEM, OEMStatesEnum
+    from .instrumentation import Profiler
+    from .streams import RandomStreams
 
 
 class World:
     _now: int
     _agents: dict[int, BaseAgent]
     _agents_by_type: dict[AgentEnum, list[int]]
-    _num_potential_users: int
-    _num_wants: dict[ProductEnum, int]
-    _num_uses: dict[ProductEnum, int]
-    _num_wants_any: int
-    _message_queue: list[Message]
+    _state_counts: list[int]  # customers per state, indexed by CustomerStatesEnum code
+    _message_bus: MessageBus
     _active_products: list[ProductEnum]
+    _debug_state_counts: bool  # recount every tick, compare with the running tallies
+    _agent_order: dict[int, int]  # insertion position, the order agents take turns in
+    _polled: set[int]  # agents that need a turn every day
+    _wake_calendar: dict[int, list[int]]  # day -> agents sleeping until that day
+    _profiler: Profiler | None  # see Profiler.attach
+    _streams: RandomStreams | None  # None: every draw comes from the rng passed in
+    _ad_adoptions: int  # potential users won over by an ad
+    _expected_ad_adoptions: float  # the same in expectation, given who saw which ads
 
-    def __init__(self, enable_reman: bool = True) -> None:
+    def __init__(
+        self, enable_reman: bool = True, debug_state_counts: bool = False
+    ) -> None:
         self._now = 0
         self._agents = {}
         self._agents_by_type = {AgentEnum.CUSTOMER: [], AgentEnum.OEM: []}
-        self._num_potential_users = 0
-        self._num_wants = {ProductEnum.V: 0, ProductEnum.R: 0}
-        self._num_uses = {ProductEnum.V: 0, ProductEnum.R: 0}
-        self._num_wants_any = 0
-        self._message_queue = []
+        self._state_counts = [0] * len(customer.CustomerStatesEnum)
+        self._message_bus = MessageBus()
         self._active_products = [ProductEnum.V]
         if enable_reman:
             self._active_products.append(ProductEnum.R)
+        self._debug_state_counts = debug_state_counts
+        self._agent_order = {}
+        self._polled = set()
+        self._wake_calendar = {}
+        self._profiler = None
+        self._streams = None
+        self._ad_adoptions = 0
+        self._expected_ad_adoptions = 0.0
 
     def tick(self) -> None:
         self._now += 1
-        self.update_customer_state_counts()
+        if self._debug_state_counts:
+            self.verify_customer_state_counts()
 
     def now(self) -> int:
         return self._now
 
+    def num_potential_users(self) -> int:
+        return self._state_counts[customer.POTENTIAL_USER]
+
+    def num_wants(self, product: ProductEnum) -> int:
+        return self._state_counts[customer.WANTS_STATE[product]]
+
+    def num_uses(self, product: ProductEnum) -> int:
+        return self._state_counts[customer.USES_STATE[product]]
+
+    def num_wants_any(self) -> int:
+        return self._state_counts[customer.WANTS_ANY]
+
+    def use_random_streams(self, streams: RandomStreams):
+        """Agents then draw from dedicated substreams instead of the rng they are given."""
+        self._streams = streams
+
+    def stream(self, rng, purpose: str, agent_id: int):
+        """The Generator an agent should draw from for `purpose`, see RandomStreams."""
+        if self._streams is None:
+            return rng
+        stream = self._streams.get(purpose, agent_id)
+        if self._profiler is not None:
+            return self._profiler.counting(stream)
+        return stream
+
+    def record_advertising(self, expected: float, adopted: int):
+        self._expected_ad_adoptions += expected
+        self._ad_adoptions += adopted
+
+    def ad_adoptions(self) -> int:
+        return self._ad_adoptions
+
+    def expected_ad_adoptions(self) -> float:
+        return self._expected_ad_adoptions
+
     def get_active_products(self) -> list[ProductEnum]:
         return self._active_products[:]  # returns a copy to avoid editing
 
@@ -51,41 +101,82 @@ class World:
             exit(f"Agent with id already exists. Received: {agent.id}")
         self._agents[agent.id()] = agent
         self._agents_by_type[agent.type()].append(agent.id())
+        self._agent_order[agent.id()] = len(self._agent_order)
+        self._polled.add(agent.id())
+        if agent.type() == AgentEnum.CUSTOMER:
+            for state, count in agent.state_counts().items():
+                self.record_state_change(None, state, count)
 
     def call_next(self, rng):
-        for _, agent in self._agents.items():
-            agent.next(rng)
-
-    def update_customer_state_counts(self):
-        from .customer import CustomerStatesEnum
-
-        self._num_wants = {product: 0 for product in ProductEnum}
-        self._num_uses = {product: 0 for product in ProductEnum}
-        self._num_wants_any = 0
-        potential_users = 0
-
-        for agent in self._agents.values():
-            if isinstance(agent, customer.Customer):
-                if agent.state() == CustomerStatesEnum.POTENTIAL_USER:
-                    potential_users += 1
-                elif agent.state() == CustomerStatesEnum.WANTS_VIRGIN:
-                    self._num_wants[ProductEnum.V] += 1
-                elif agent.state() == CustomerStatesEnum.USES_VIRGIN:
-                    self._num_uses[ProductEnum.V] += 1
-                elif agent.state() == CustomerStatesEnum.WANTS_REMAN:
-                    self._num_wants[ProductEnum.R] += 1
-                elif agent.state() == CustomerStatesEnum.USES_REMAN:
-                    self._num_uses[ProductEnum.R] += 1
-                elif agent.state() == CustomerStatesEnum.WANTS_ANY:
-                    self._num_wants_any += 1
-        self._num_potential_users = potential_users
+        # only agents that are polled or due today get a turn, still in insertion order
+        due = self._wake_calendar.pop(self._now, [])
+        awake = sorted(self._polled.union(due), key=self._agent_order.__getitem__)
+        if self._profiler is not None:
+            agents = [self._agents[agent_id] for agent_id in awake]
+            self._profiler.call_agents(self, agents, rng)
+        else:
+            for agent_id in awake:
+                agent = self._agents[agent_id]
+                agent.next(rng)
+                self.schedule(agent)
+        self.clear_orders(rng)
+
+    def clear_orders(self, rng):
+        """Has each OEM serve the orders placed during the day, see OEM.batches_orders."""
+        for oem_id in self._agents_by_type[AgentEnum.OEM]:
+            for customer in self._agents[oem_id].clear_orders(rng):
+                self.schedule(customer)
+
+    def schedule(self, agent: BaseAgent):
+        """Files the agent under the day it next needs a turn, or polls it daily if it has none."""
+        wake_day = agent.wake_day()
+        if wake_day is None or wake_day <= self._now:
+            self._polled.add(agent.id())
+        else:
+            self._polled.discard(agent.id())
+            self._wake_calendar.setdefault(wake_day, []).append(agent.id())
+
+    def record_state_change(
+        self,
+        old_state: CustomerStatesEnum | None,
+        new_state: CustomerStatesEnum,
+        count: int = 1,
+    ):
+        """Moves `count` customers between states in the running tallies (O(1) per call)."""
+        if self._profiler is not None:
+            self._profiler.count_transition(old_state, new_state, count)
+        if old_state is not None:
+            self._state_counts[old_state] -= count
+        self._state_counts[new_state] += count
+
+    def count_customer_states(self) -> dict[CustomerStatesEnum, int]:
+        """Full O(N) recount of customer states, only used to check the running tallies."""
+        counts = {state: 0 for state in customer.CustomerStatesEnum}
+        for agent_id in self._agents_by_type[AgentEnum.CUSTOMER]:
+            # a CustomerPopulation reports all of its customers at once
+            for state, count in self._agents[agent_id].state_counts().items():
+                counts[state] += count
+        return counts
+
+    def verify_customer_state_counts(self):
+        counts = self.count_customer_states()
+        tallies = {
+            state: self._state_counts[state] for state in customer.CustomerStatesEnum
+        }
+        if counts != tallies:
+            raise RuntimeError(
+                f"Customer state tallies drifted on day {self._now}. Recount: {counts}, tallies: {tallies}"
+            )
 
     def recieve_message(self, message: Message):
-        self._message_queue.append(message)
+        self._message_bus.post(message.sender_id, message.recipient_id, message.content)
 
     def process_messages(self, rng):
-        for message in self._message_queue:
+        if len(self._message_bus) == 0:
+            return
+        for message in self._message_bus.messages():
             recipient = self._agents.get(message.recipient_id)
             if recipient:
                 recipient.handle_message(message, rng)
-        self._message_queue.clear()
+                self.schedule(recipient)
+        self._message_bus.clear()
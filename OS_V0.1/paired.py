@@ -0,0 +1,160 @@
+import argparse
+import os
+import numpy as np
+from scenarios import SCENARIOS
+from model.ensemble import replication_seeds, report_values
+from model.online_stats import RunningMoments, t_quantile
+from model.pool import SimulationPool
+from model.simulation import ENGINES
+
+
+def pair_tasks(
+    first: str, second: str, engine: str, seed: np.random.SeedSequence, paired: bool
+) -> list[dict]:
+    """Both arms of one replication on the same seed, as SimulationPool tasks."""
+    return [
+        {"config": SCENARIOS[name], "engine": engine, "seed": seed, "paired": paired}
+        for name in (first, second)
+    ]
+
+
+class PairedStatistics:
+    """Running moments of each outcome in both arms and of their per-replication difference."""
+
+    _arms: tuple[dict[str, RunningMoments], dict[str, RunningMoments]]
+    _differences: dict[str, RunningMoments]
+
+    def __init__(self) -> None:
+        self._arms = ({}, {})
+        self._differences = {}
+
+    def add(self, first: dict[str, float], second: dict[str, float]):
+        for key in first:
+            if key not in self._differences:
+                self._differences[key] = RunningMoments()
+                for arm in self._arms:
+                    arm[key] = RunningMoments()
+            self._arms[0][key].update(first[key])
+            self._arms[1][key].update(second[key])
+            self._differences[key].update(first[key] - second[key])
+
+    def difference(self, key: str) -> RunningMoments:
+        return self._differences[key]
+
+    def table(self, confidence: float = 0.95) -> list[dict]:
+        """The paired estimate of each difference next to what independent arms would give.
+
+        Independent arms have Var(A - B) = Var(A) + Var(B), the ratio of that to the paired
+        Var(A - B) is how many times more replications they would need for the same interval.
+        """
+        rows = []
+        for key, difference in self._differences.items():
+            first, second = self._arms[0][key], self._arms[1][key]
+            independent = first.variance() + second.variance()
+            count = difference.count()
+            t = t_quantile(0.5 + confidence / 2, count - 1) if count > 1 else np.inf
+            rows.append(
+                {
+                    "outcome": key,
+                    "first": float(first.mean()),
+                    "second": float(second.mean()),
+                    "difference": float(difference.mean()),
+                    "half_width": float(difference.half_width(confidence)),
+                    "independent_half_width": float(t * np.sqrt(independent / count)),
+                    "variance_ratio": float(independent / difference.variance()),
+                }
+            )
+        return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Estimate the difference between two scenarios on common random numbers"
+    )
+    parser.add_argument("--scenario", type=str, default="Default")
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default="Default_no_reman",
+        help="The scenario the difference is taken against",
+    )
+    parser.add_argument(
+        "--replications", type=int, default=100, help="Maximum number of pairs"
+    )
+    parser.add_argument(
+        "--min-replications",
+        type=int,
+        default=10,
+        help="Pairs to run before the stopping rule is checked",
+    )
+    parser.add_argument(
+        "--ci-half-width",
+        type=float,
+        default=None,
+        help="Stop once the confidence interval on the net profit difference is this narrow (€)",
+    )
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--engine", choices=ENGINES, default="object")
+    parser.add_argument(
+        "--unpaired",
+        action="store_true",
+        help="Draw each arm from a single generator on the same seed, as separate runs do",
+    )
+    args = parser.parse_args()
+
+    for name in (args.scenario, args.baseline):
+        if name not in SCENARIOS:
+            raise ValueError(
+                f"Scenario '{name}' not found. Options are: {list(SCENARIOS.keys())}"
+            )
+    seeds = replication_seeds(
+        SCENARIOS[args.scenario]["main"]["seed"], args.replications
+    )
+    statistics = PairedStatistics()
+
+    print(
+        f"Running up to {args.replications} {'unpaired' if args.unpaired else 'paired'} replications of {args.scenario} - {args.baseline}"
+    )
+    with SimulationPool(args.workers) as pool:
+        # pairs are folded in seed order, as in ensemble.py
+        for start in range(0, args.replications, args.workers):
+            tasks = [
+                task
+                for seed in seeds[start : start + args.workers]
+                for task in pair_tasks(
+                    args.scenario, args.baseline, args.engine, seed, not args.unpaired
+                )
+            ]
+            runs = pool.run(tasks)
+            for first, second in zip(runs[::2], runs[1::2]):
+                statistics.add(
+                    report_values(first.report), report_values(second.report)
+                )
+
+            profit = statistics.difference("Net Profit")
+            half_width = float(profit.half_width(args.confidence))
+            print(
+                f"  {profit.count():>5} pairs: net profit difference €{float(profit.mean()):,.0f} ± {half_width:,.0f}"
+            )
+            if (
+                args.ci_half_width is not None
+                and profit.count() >= args.min_replications
+                and half_width <= args.ci_half_width
+            ):
+                print(f"Target half-width of €{args.ci_half_width:,.0f} reached")
+                break
+
+    print("-" * 112)
+    print(
+        f"{'OUTCOME':<32}{args.scenario:>16}{args.baseline:>18}{'DIFFERENCE':>16}{'± PAIRED':>12}{'± INDEP.':>12}{'VAR RATIO':>12}"
+    )
+    print("-" * 112)
+    for row in statistics.table(args.confidence):
+        print(
+            f"{row['outcome']:<32}{row['first']:>16,.0f}{row['second']:>18,.0f}{row['difference']:>16,.0f}{row['half_width']:>12,.0f}{row['independent_half_width']:>12,.0f}{row['variance_ratio']:>12.1f}"
+        )
+    print("-" * 112)
+    print(
+        "VAR RATIO: replications independent arms would need for the same interval, per pair run here"
+    )
@@ -0,0 +1,215 @@
+import argparse
+import csv
+import json
+import os
+import numpy as np
+from scenarios import SCENARIOS
+from model.cache import ResultCache, cache_directory
+from model.convergence import with_early_stop
+from model.sensitivity import (
+    DESIGNS,
+    OUTPUTS,
+    PARAMETERS,
+    bootstrap_sobol,
+    configure,
+    design,
+    outputs,
+    rank_correlations,
+    scale,
+    sobol_indices,
+)
+from model.pool import SimulationPool
+from model.simulation import ENGINES
+
+
+def point_task(config: dict, engine: str) -> dict:
+    # every point runs on the scenario seed, so the design rows share their random numbers
+    return {"config": config, "engine": engine}
+
+
+def read_checkpoint(path: str, header: dict) -> dict[int, dict]:
+    """Rows already finished by an earlier, interrupted run of the same sweep."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return {}
+    with open(path) as file:
+        lines = file.read().splitlines()
+    if json.loads(lines[0]) != header:
+        raise ValueError(
+            f"{path} was written for a different sweep, remove it or pass another --checkpoint"
+        )
+    done = {}
+    for line in lines[1:]:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue  # cut off mid-line by the interruption
+        if not isinstance(record, dict) or "row" not in record:
+            continue  # e.g. a repeated header, written by earlier versions on resume
+        done[record["row"]] = record
+    return done
+
+
+def write_indices(path: str, rows: list[dict]):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Global sensitivity analysis of net profit and reman share"
+    )
+    parser.add_argument("--scenario", type=str, default="Default")
+    parser.add_argument("--design", choices=DESIGNS, default="saltelli")
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=64,
+        help="Base samples, a Saltelli design runs samples * (parameters + 2) points",
+    )
+    parser.add_argument(
+        "--parameters",
+        nargs="+",
+        choices=list(PARAMETERS),
+        default=list(PARAMETERS),
+        help="Parameters to vary over their declared ranges, the rest keep the scenario's values",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the design")
+    parser.add_argument("--engine", choices=ENGINES, default="object")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always run the model, neither reading nor storing cached results",
+    )
+    parser.add_argument("--cache-dir", type=str, default=cache_directory)
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        default=None,
+        help="JSON lines file finished points are appended to, and resumed from "
+        "(default: <output dir>/<scenario>_<design>.jsonl)",
+    )
+    parser.add_argument("--output-dir", type=str, default="sensitivity_results")
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=200,
+        help="Resamples for the confidence intervals on Sobol indices",
+    )
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument(
+        "--early-stop",
+        action="store_true",
+        help="Stop each run once in steady state and extrapolate its outputs",
+    )
+    args = parser.parse_args()
+
+    if args.scenario not in SCENARIOS:
+        raise ValueError(
+            f"Scenario '{args.scenario}' not found. Options are: {list(SCENARIOS.keys())}"
+        )
+    config = SCENARIOS[args.scenario]
+    if args.early_stop:
+        config = with_early_stop(config)
+    points = design(args.design, args.samples, args.parameters, args.seed)
+    checkpoint = args.checkpoint or os.path.join(
+        args.output_dir, f"{args.scenario}_{args.design}.jsonl"
+    )
+    header = {
+        "scenario": args.scenario,
+        "design": args.design,
+        "samples": args.samples,
+        "parameters": args.parameters,
+        "seed": args.seed,
+        "engine": args.engine,
+        "early_stop": args.early_stop,
+    }
+    done = read_checkpoint(checkpoint, header)
+    pending = [row for row in range(len(points)) if row not in done]
+    print(
+        f"{args.design} design over {len(args.parameters)} parameters: {len(points)} points, "
+        f"{len(done)} already in {checkpoint}"
+    )
+
+    os.makedirs(os.path.dirname(checkpoint) or ".", exist_ok=True)
+    with open(checkpoint, "a") as file:
+        # only a new file gets the header, one interrupted before its first point has it
+        if file.tell() == 0:
+            file.write(json.dumps(header) + "\n")
+        cache = None if args.no_cache else ResultCache(args.cache_dir)
+        with SimulationPool(args.workers) as pool:
+            values = [scale(points[row], args.parameters) for row in pending]
+            tasks = [
+                point_task(configure(config, point), args.engine) for point in values
+            ]
+            for finished, (index, run) in enumerate(
+                pool.completed(tasks, cache), start=1
+            ):
+                row = pending[index]
+                done[row] = {
+                    "row": row,
+                    "values": values[index],
+                    "outputs": outputs(run),
+                }
+                # one flushed line per point, so an interruption loses only running points
+                file.write(json.dumps(done[row]) + "\n")
+                file.flush()
+                if finished % 50 == 0 or finished == len(pending):
+                    print(f"  {len(done):>6} / {len(points)} points")
+
+    rows = []
+    for output in OUTPUTS:
+        y = np.array([done[row]["outputs"][output] for row in range(len(points))])
+        if args.design == "saltelli":
+            first, total = sobol_indices(y, len(args.parameters))
+            first_width, total_width = bootstrap_sobol(
+                y,
+                len(args.parameters),
+                args.bootstrap,
+                args.confidence,
+                np.random.default_rng(args.seed),
+            )
+            for i, name in enumerate(args.parameters):
+                rows.append(
+                    {
+                        "output": output,
+                        "parameter": name,
+                        "first_order": first[i],
+                        "first_order_half_width": first_width[i],
+                        "total": total[i],
+                        "total_half_width": total_width[i],
+                    }
+                )
+        else:
+            correlations = rank_correlations(points, y)
+            for i, name in enumerate(args.parameters):
+                rows.append(
+                    {
+                        "output": output,
+                        "parameter": name,
+                        "rank_correlation": correlations[i],
+                    }
+                )
+
+    print("-" * 88)
+    if args.design == "saltelli":
+        print(f"{'OUTPUT':<14}{'PARAMETER':<32}{'FIRST ORDER':>21}{'TOTAL':>21}")
+        print("-" * 88)
+        for row in rows:
+            first = f"{row['first_order']:.3f} ± {row['first_order_half_width']:.3f}"
+            total = f"{row['total']:.3f} ± {row['total_half_width']:.3f}"
+            print(f"{row['output']:<14}{row['parameter']:<32}{first:>21}{total:>21}")
+    else:
+        print(f"{'OUTPUT':<14}{'PARAMETER':<32}{'RANK CORRELATION':>21}")
+        print("-" * 88)
+        for row in rows:
+            print(
+                f"{row['output']:<14}{row['parameter']:<32}{row['rank_correlation']:>21.3f}"
+            )
+    print("-" * 88)
+    path = os.path.join(args.output_dir, f"{args.scenario}_{args.design}_indices.csv")
+    write_indices(path, rows)
+    print(f"Indices written to {path}")
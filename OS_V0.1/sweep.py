@@ -0,0 +1,146 @@
+import argparse
+import csv
+import os
+from fnmatch import fnmatch
+from scenarios import SCENARIOS
+from model.cache import ResultCache, cache_directory
+from model.convergence import with_early_stop
+from model.export import FORMATS, write_run
+from model.pool import SimulationPool
+from model.simulation import ENGINES, RESULT_KEYS, Result
+
+
+def select_scenarios(patterns: list[str]) -> list[str]:
+    """Expands scenario names and glob patterns (e.g. 'Default*') against SCENARIOS, in SCENARIOS order."""
+    selected = [
+        name
+        for name in SCENARIOS
+        if any(fnmatch(name, pattern) for pattern in patterns)
+    ]
+    unmatched = [
+        pattern
+        for pattern in patterns
+        if not any(fnmatch(name, pattern) for name in SCENARIOS)
+    ]
+    if unmatched:
+        raise ValueError(
+            f"No scenario matches {unmatched}. Options are: {list(SCENARIOS.keys())}"
+        )
+    return selected
+
+
+def scenario_task(name: str, engine: str, early_stop: bool = False) -> dict:
+    # every task seeds its own generator from the scenario seed, so results don't depend on
+    # which worker picks it up or how many workers there are
+    config = with_early_stop(SCENARIOS[name]) if early_stop else SCENARIOS[name]
+    return {"config": config, "engine": engine}
+
+
+def summary_row(name: str, run: Result) -> dict:
+    report = run.report
+    row = {
+        "scenario": name,
+        "seed": SCENARIOS[name]["main"]["seed"],
+        "Total Cost": report["Total Cost"],
+        "Total Revenue": report["Total Revenue"],
+        "Net Profit": report["Total Revenue"] - report["Total Cost"],
+    }
+    row.update(report["Breakdown"])
+    row.update(report["Statistics"])
+    return row
+
+
+def write_tables(runs: dict[str, Result], output_dir: str):
+    os.makedirs(output_dir, exist_ok=True)
+
+    summary = [summary_row(name, run) for name, run in runs.items()]
+    with open(os.path.join(output_dir, "summary.csv"), "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(summary[0].keys()))
+        writer.writeheader()
+        writer.writerows(summary)
+
+    with open(os.path.join(output_dir, "timeseries.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["scenario"] + RESULT_KEYS)
+        for name, run in runs.items():
+            columns = [run.results[key] for key in RESULT_KEYS]
+            for values in zip(*columns):
+                writer.writerow([name, *values])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run several scenarios in parallel, headless"
+    )
+    parser.add_argument(
+        "scenarios",
+        nargs="+",
+        help="Scenario names or glob patterns, e.g. 'Default*'",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes (default: all cores)",
+    )
+    parser.add_argument("--engine", choices=ENGINES, default="object")
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        default="sweep_results",
+        help="Where summary.csv and timeseries.csv are written",
+    )
+    parser.add_argument(
+        "--export-dir",
+        type=str,
+        default=None,
+        help="Also write every run in binary form to this directory",
+    )
+    parser.add_argument("--format", choices=FORMATS, default=None)
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always run the model, neither reading nor storing cached results",
+    )
+    parser.add_argument("--cache-dir", type=str, default=cache_directory)
+    parser.add_argument(
+        "--early-stop",
+        action="store_true",
+        help="Stop each run once in steady state and extrapolate the financial totals "
+        "over the remaining days, timeseries.csv then ends where the run stopped",
+    )
+    args = parser.parse_args()
+
+    names = select_scenarios(args.scenarios)
+    cache = None if args.no_cache else ResultCache(args.cache_dir)
+    print(f"Running {len(names)} scenarios on {args.workers} workers: {names}")
+
+    with SimulationPool(args.workers) as pool:
+        tasks = [scenario_task(name, args.engine, args.early_stop) for name in names]
+        runs = dict(zip(names, pool.run(tasks, cache)))
+
+    write_tables(runs, args.output_dir)
+    if args.export_dir is not None:
+        for name, run in runs.items():
+            write_run(
+                os.path.join(args.export_dir, name),
+                run,
+                metadata={
+                    "scenario": name,
+                    "seed": SCENARIOS[name]["main"]["seed"],
+                    "engine": args.engine,
+                    "config": SCENARIOS[name],
+                },
+                format=args.format,
+            )
+
+    print("-" * 72)
+    print(f"{'SCENARIO':<32}{'COST (€)':>13}{'REVENUE (€)':>13}{'PROFIT (€)':>14}")
+    print("-" * 72)
+    for name, run in runs.items():
+        row = summary_row(name, run)
+        print(
+            f"{name:<32}{row['Total Cost']:>13,.0f}{row['Total Revenue']:>13,.0f}{row['Net Profit']:>+14,.0f}"
+        )
+    print("-" * 72)
+    print(f"Tables written to {args.output_dir}/")
@@ -0,0 +1,161 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from statistics import NormalDist
+import numpy as np
+from scenarios import SCENARIOS
+from model.ensemble import replication_seeds, report_values
+from model.online_stats import RunningMoments
+from model.pool import SimulationPool
+from model.simulation import ENGINES, Result
+
+COMPARED_OUTCOMES = [
+    "Net Profit",
+    "Virgin units sold",
+    "Reman units sold",
+    "Cores collected",
+]
+COMPARED_SERIES = ["potential_users", "uses_virgin", "uses_reman", "wants_any"]
+
+
+def run_summary(run: Result) -> dict[str, float]:
+    """Outcomes of one run plus the time-averaged customer state series."""
+    values = report_values(run.report)
+    summary = {key: float(values[key]) for key in COMPARED_OUTCOMES}
+    for key in COMPARED_SERIES:
+        summary[f"mean {key}"] = float(np.mean(run.results[key]))
+    return summary
+
+
+def run_digest(run: Result) -> str:
+    """Hash of every recorded series and the report, equal only for bit-identical runs."""
+    digest = hashlib.sha256()
+    for key, column in run.results.items():
+        digest.update(key.encode())
+        digest.update(column.tobytes())
+    digest.update(json.dumps(run.report, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def shard_digests(
+    pool: SimulationPool, config: dict, shards: int, replications: int, paired: bool
+) -> list[str]:
+    config = {**config, "main": {**config["main"], "shards": shards}}
+    seeds = replication_seeds(config["main"]["seed"], replications)
+    tasks = [
+        {"config": config, "engine": "sharded", "seed": seed, "paired": paired}
+        for seed in seeds
+    ]
+    return [run_digest(run) for run in pool.run(tasks)]
+
+
+def check_shard_counts(
+    pool: SimulationPool, config: dict, replications: int, shard_counts: list[int]
+) -> int:
+    """Runs the same replications on the sharded engine, the one engine that steps a single
+    run across processes, split into each number of shards. Counts the seedings whose runs
+    are not bit-identical across them."""
+    failures = 0
+    print("-" * 64)
+    print(f"{'ENGINE':<16}{'SEEDING':<16}{'SHARDS':>20}{'':>12}")
+    print("-" * 64)
+    for paired in (False, True):
+        digests = [
+            shard_digests(pool, config, shards, replications, paired)
+            for shards in shard_counts
+        ]
+        verdict = "identical" if all(d == digests[0] for d in digests) else "DIFFER"
+        failures += verdict != "identical"
+        seeding = "streams" if paired else "single rng"
+        counts = ", ".join(str(shards) for shards in shard_counts)
+        print(f"{'sharded':<16}{seeding:<16}{counts:>20}{verdict:>12}")
+    print("-" * 64)
+    return failures
+
+
+def engine_moments(
+    pool: SimulationPool, config: dict, engine: str, replications: int
+) -> dict[str, RunningMoments]:
+    seeds = replication_seeds(config["main"]["seed"], replications)
+    tasks = [{"config": config, "engine": engine, "seed": seed} for seed in seeds]
+    moments = {}
+    for run in pool.run(tasks):
+        for key, value in run_summary(run).items():
+            moments.setdefault(key, RunningMoments()).update(value)
+    return moments
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that two engines agree in distribution on a scenario"
+    )
+    parser.add_argument("--scenario", type=str, default="Default")
+    parser.add_argument(
+        "--engines", nargs=2, choices=ENGINES, default=["object", "cohort"]
+    )
+    parser.add_argument("--replications", type=int, default=40)
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.01,
+        help="Family-wise significance level (Bonferroni-corrected over the compared values)",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--shard-counts",
+        nargs="+",
+        type=int,
+        default=None,
+        help="Instead of comparing engines, check that the sharded engine gives "
+        "bit-identical replications on each of these numbers of shards, e.g. 1 2 4",
+    )
+    args = parser.parse_args()
+
+    config = SCENARIOS[args.scenario]
+    with SimulationPool(args.workers) as pool:
+        if args.shard_counts is not None:
+            if check_shard_counts(pool, config, args.replications, args.shard_counts):
+                print(f"Results depend on the number of shards {args.shard_counts}")
+                sys.exit(1)
+            print(f"Results are identical on {args.shard_counts} shards")
+            sys.exit(0)
+
+        reference, candidate = (
+            engine_moments(pool, config, engine, args.replications)
+            for engine in args.engines
+        )
+
+    # Welch's two-sample test with a normal approximation, fine for a few dozen replications
+    threshold = args.alpha / len(reference)
+    failures = 0
+    print("-" * 96)
+    print(
+        f"{'VALUE':<28}{args.engines[0]:>20}{args.engines[1]:>20}{'z':>10}{'p':>10}{'':>8}"
+    )
+    print("-" * 96)
+    for key, expected in reference.items():
+        observed = candidate[key]
+        error = np.sqrt(
+            expected.variance() / expected.count()
+            + observed.variance() / observed.count()
+        )
+        difference = float(observed.mean() - expected.mean())
+        z = (
+            difference / float(error)
+            if error > 0
+            else (0.0 if difference == 0 else np.inf)
+        )
+        p = 2 * (1 - NormalDist().cdf(abs(z)))
+        verdict = "ok" if p >= threshold else "DIFFERS"
+        failures += verdict != "ok"
+        print(
+            f"{key:<28}{float(expected.mean()):>20,.1f}{float(observed.mean()):>20,.1f}{z:>10.2f}{p:>10.3f}{verdict:>8}"
+        )
+    print("-" * 96)
+
+    if failures:
+        print(f"{failures} values differ at family-wise alpha={args.alpha}")
+        sys.exit(1)
+    print(f"Engines agree at family-wise alpha={args.alpha}")
@@ -0,0 +1,102 @@
+import argparse
+import copy
+import os
+import pickle
+import time
+from scenarios import SCENARIOS
+from model.cache import cache_key
+from model.checkpoint import EXTENSION, load_checkpoint, save_checkpoint
+from model.OEM import TUNABLE_PARAMETERS
+from model.pool import SimulationPool
+from model.simulation import ENGINES, Simulation
+
+
+def parse_variant(text: str) -> dict:
+    """'core_acceptance_rate=0.5,remanufacture_delay=5' -> oem config changes."""
+    changes = {}
+    for assignment in text.split(","):
+        key, _, value = assignment.partition("=")
+        if key not in TUNABLE_PARAMETERS:
+            raise ValueError(
+                f"'{key}' cannot be changed mid-run. Options are: {TUNABLE_PARAMETERS}"
+            )
+        changes[key] = float(value) if key == "core_acceptance_rate" else int(value)
+    return changes
+
+
+def reusable(checkpoint: str) -> bool:
+    """Whether `checkpoint` exists and loads, e.g. it was not cut short while being saved."""
+    if not os.path.exists(checkpoint):
+        return False
+    try:
+        load_checkpoint(checkpoint)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError) as error:
+        print(f"Warming up again, {checkpoint} cannot be reused: {error}")
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a scenario up to a day once, then fork what-if variants from there"
+    )
+    parser.add_argument("--scenario", type=str, default="Default")
+    parser.add_argument("--engine", choices=ENGINES, default="object")
+    parser.add_argument(
+        "--day", type=int, required=True, help="Day the variants branch off at"
+    )
+    parser.add_argument(
+        "--set",
+        dest="variants",
+        action="append",
+        default=[],
+        help="One variant, e.g. 'core_acceptance_rate=0.5,remanufacture_delay=5'. Repeatable",
+    )
+    parser.add_argument(
+        "--checkpoint-dir",
+        type=str,
+        default=os.path.join("runs", "checkpoints"),
+        help="Where the warm-up snapshot is kept and reused from",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    config = SCENARIOS[args.scenario]
+    variants = {"unchanged": config}
+    for text in args.variants:
+        variant = copy.deepcopy(config)
+        variant["oem"].update(parse_variant(text))
+        variants[text] = variant
+
+    start = time.perf_counter()
+    # the key covers the config and the model source, so an edit to either warms up anew
+    checkpoint = os.path.join(
+        args.checkpoint_dir,
+        f"{args.scenario}_{args.engine}_day{args.day}_{cache_key(config, args.engine)[:16]}",
+    )
+    if reusable(checkpoint + EXTENSION):
+        checkpoint += EXTENSION
+        print(f"Reusing warm-up snapshot {checkpoint}")
+    else:
+        warm_up = Simulation(config, engine=args.engine).run(until=args.day)
+        checkpoint = save_checkpoint(checkpoint, warm_up)
+        print(
+            f"Warm-up to day {args.day} took {time.perf_counter() - start:.2f}s, saved to {checkpoint}"
+        )
+
+    with SimulationPool(args.workers) as pool:
+        tasks = [
+            {"checkpoint": checkpoint, "config": variant}
+            for variant in variants.values()
+        ]
+        runs = dict(zip(variants, pool.run(tasks)))
+    print(f"{len(variants)} variants done in {time.perf_counter() - start:.2f}s")
+
+    print("-" * 72)
+    print(f"{'VARIANT':<44}{'COST (€)':>14}{'PROFIT (€)':>14}")
+    print("-" * 72)
+    for name, run in runs.items():
+        report = run.report
+        profit = report["Total Revenue"] - report["Total Cost"]
+        print(f"{name:<44}{report['Total Cost']:>14,.0f}{profit:>+14,.0f}")
+    print("-" * 72)
@@ -0,0 +1,213 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import numpy
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# each package's benchmark.py times one case in a fresh process, both packages are called `model`
+PACKAGES = {
+    "OS_V0.1": ["object", "vectorized", "cohort", "sharded"],
+    "prelimModel": ["object"],
+}
+
+SUITES = {
+    "quick": {
+        "populations": [10**2, 10**3, 10**4],
+        "days": [10**2, 10**3],
+        "budget_seconds": 10,
+    },
+    "full": {
+        "populations": [10**2, 10**3, 10**4, 10**5, 10**6],
+        "days": [10**2, 10**3, 10**4],
+        "budget_seconds": 600,
+    },
+}
+
+# rough agent-days per second, only used to skip cases that would blow the time budget
+ESTIMATED_RATES = {
+    ("OS_V0.1", "object"): 5e5,
+    ("OS_V0.1", "vectorized"): 1e7,
+    ("OS_V0.1", "sharded"): 1e7,  # per core, with the default 4 shards
+    ("prelimModel", "object"): 2e5,
+}
+# the cohort engine's cost does not grow with the population
+COHORT_DAYS_PER_SECOND = 1000
+
+
+def estimated_seconds(package: str, engine: str, population: int, days: int) -> float:
+    if engine == "cohort":
+        return days / COHORT_DAYS_PER_SECOND
+    return population * days / ESTIMATED_RATES[(package, engine)]
+
+
+def suite_cases(suite: dict, packages: list[str]) -> list[dict]:
+    cases = []
+    for package in packages:
+        for engine in PACKAGES[package]:
+            # prelimModel has no remanufacturing to switch on and off
+            for reman in [True, False] if package == "OS_V0.1" else [None]:
+                for population in suite["populations"]:
+                    for days in suite["days"]:
+                        cases.append(
+                            {
+                                "id": case_id(package, engine, population, days, reman),
+                                "package": package,
+                                "engine": engine,
+                                "population": population,
+                                "days": days,
+                                "reman": reman,
+                            }
+                        )
+    return cases
+
+
+def case_id(
+    package: str, engine: str, population: int, days: int, reman: bool | None
+) -> str:
+    id = f"{package}/{engine}/population={population}/days={days}"
+    if reman is not None:
+        id += f"/reman={'on' if reman else 'off'}"
+    return id
+
+
+def run_case(case: dict, repeat: int) -> dict:
+    command = [
+        sys.executable,
+        "benchmark.py",
+        "--population",
+        str(case["population"]),
+        "--days",
+        str(case["days"]),
+        "--repeat",
+        str(repeat),
+    ]
+    if case["package"] == "OS_V0.1":
+        command += ["--engine", case["engine"]]
+        if not case["reman"]:
+            command.append("--no-reman")
+    completed = subprocess.run(
+        command,
+        cwd=os.path.join(ROOT, case["package"]),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    measured = json.loads(completed.stdout.strip().splitlines()[-1])
+    agent_days = case["population"] * case["days"]
+    return {
+        **case,
+        "seconds": measured["seconds"],
+        "agent_days_per_second": agent_days / measured["seconds"],
+        "peak_rss_mb": measured["peak_rss_mb"],
+        "phases": measured["phases"],
+    }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "machine": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results: list[dict], baseline: dict, threshold: float) -> list[str]:
+    """Cases that got slower or bigger than the baseline by more than `threshold`."""
+    reference = {case["id"]: case for case in baseline["cases"]}
+    regressions = []
+    for case in results:
+        before = reference.get(case["id"])
+        if before is None:
+            continue
+        speed = case["agent_days_per_second"] / before["agent_days_per_second"]
+        memory = case["peak_rss_mb"] / before["peak_rss_mb"]
+        if speed < 1 - threshold:
+            regressions.append(f"{case['id']}: throughput x{speed:.2f}")
+        if memory > 1 + threshold:
+            regressions.append(f"{case['id']}: peak RSS x{memory:.2f}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time both model generations across population sizes and run lengths"
+    )
+    parser.add_argument("--suite", choices=SUITES, default="quick")
+    parser.add_argument(
+        "--packages", nargs="+", choices=PACKAGES, default=list(PACKAGES)
+    )
+    parser.add_argument(
+        "--budget-seconds",
+        type=float,
+        default=None,
+        help="Skip cases estimated to take longer than this (default: the suite's budget)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per case, the fastest is kept"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=os.path.join("benchmark_results", "latest.json"),
+    )
+    parser.add_argument(
+        "--baseline", type=str, default=None, help="Earlier results to compare against"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative slowdown or memory growth reported as a regression",
+    )
+    args = parser.parse_args()
+
+    suite = SUITES[args.suite]
+    budget = args.budget_seconds or suite["budget_seconds"]
+    results = []
+    print(f"{'CASE':<58}{'AGENT-DAYS/S':>14}{'SECONDS':>10}{'RSS (MB)':>10}")
+    print("-" * 92)
+    for case in suite_cases(suite, args.packages):
+        estimate = estimated_seconds(
+            case["package"], case["engine"], case["population"], case["days"]
+        )
+        if estimate > budget:
+            print(f"{case['id']:<58}{'skipped, estimated ' + f'{estimate:,.0f}s':>34}")
+            continue
+        result = run_case(case, args.repeat)
+        results.append(result)
+        print(
+            f"{case['id']:<58}{result['agent_days_per_second']:>14,.0f}{result['seconds']:>10.2f}{result['peak_rss_mb']:>10.0f}"
+        )
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as file:
+        json.dump({"environment": environment(), "cases": results}, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
@@ -0,0 +1,65 @@
+import argparse
+import contextlib
+import json
+import os
+import resource
+import sys
+from time import perf_counter
+from numpy import random
+from model.world import World
+from model.customer import Customer
+from model.instrumentation import Profiler
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # bytes vs kB
+
+
+def run_case(population: int, days: int) -> dict:
+    rng = random.default_rng(seed=1)
+    world = World()
+    for i in range(0, population):
+        world.add_agent(Customer(id=i, world=world))
+
+    # the customers' share of call_next is what is left after the other phases
+    profiler = Profiler(count_draws=False)
+    world.tick = profiler.timed("tick", world.tick)
+    world.call_next = profiler.timed("call_next", world.call_next)
+    world.update_production = profiler.timed("production", world.update_production)
+    world.deliver_to_retailer = profiler.timed("delivery", world.deliver_to_retailer)
+    world.process_messages = profiler.timed("messages", world.process_messages)
+
+    start = perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(0, days):
+            world.tick()
+            world.call_next(rng)
+    seconds = perf_counter() - start
+    phases = {
+        name: row["seconds"] for name, row in profiler.summary()["phases"].items()
+    }
+    phases["customers"] = (
+        phases.pop("call_next")
+        - phases["production"]
+        - phases["delivery"]
+        - phases["messages"]
+    )
+    return {"seconds": seconds, "phases": phases}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time one benchmark case and print it as JSON, see ../benchmark.py"
+    )
+    parser.add_argument("--population", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Runs to take the fastest of"
+    )
+    args = parser.parse_args()
+
+    runs = [run_case(args.population, args.days) for _ in range(args.repeat)]
+    fastest = min(runs, key=lambda run: run["seconds"])
+    fastest["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(fastest))
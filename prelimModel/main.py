@@ -1,30 +1,90 @@
+import argparse
 from model.world import World
 from model._agent import AgentEnum
 from model.customer import Customer, CustomerStatesEnum
 from model.product import ProductEnum
+from model.recorder import Recorder
+from model.network import GRAPHS, build_network
+from model.instrumentation import Profiler
+from model.streams import RandomStreams
+import numpy as np
 from numpy import random
 import matplotlib.pyplot as plt
 
 if __name__ == "__main__":
-    rng = random.default_rng(seed=1)
+    parser = argparse.ArgumentParser(description="Run the preliminary product model")
+    parser.add_argument(
+        "--network",
+        choices=["uniform"] + GRAPHS,
+        default="uniform",
+        help="Who word-of-mouth reaches: anyone at random, or neighbours in a contact graph",
+    )
+    parser.add_argument("--mean-degree", type=int, default=10)
+    parser.add_argument(
+        "--edge-list", type=str, default=None, help="Graph file for --network edge_list"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time each phase and customer state, count transitions and random draws",
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="With --profile, also write a Chrome trace-event JSON to this path",
+    )
+    parser.add_argument(
+        "--profile-output",
+        type=str,
+        default=None,
+        help="With --profile, also write the summary as JSON to this path",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--streams",
+        action="store_true",
+        help="Give every agent its own random substreams per purpose, so results do not "
+        "depend on the order agents are stepped in",
+    )
+    args = parser.parse_args()
+
+    rng = random.default_rng(seed=args.seed)
     world = World()
+    if args.streams:
+        world.use_random_streams(RandomStreams(args.seed))
+    profiler = Profiler(trace=args.trace is not None) if args.profile else None
 
     customer_population: int = 1000
     simulation_length: int = 180
 
-    results = {
-        "day": [],
-        "wants_A": [],
-        "uses_A": [],
-        "wants_B": [],
-        "uses_B": [],
-        "wants_any": [],
-    }
+    recorder = Recorder(days=simulation_length)
+    recorder.register("day", world.now, dtype=np.int64)
+    recorder.register("wants_A", lambda: world.num_wants(ProductEnum.A), dtype=np.int64)
+    recorder.register("uses_A", lambda: world.num_uses(ProductEnum.A), dtype=np.int64)
+    recorder.register("wants_B", lambda: world.num_wants(ProductEnum.B), dtype=np.int64)
+    recorder.register("uses_B", lambda: world.num_uses(ProductEnum.B), dtype=np.int64)
+    recorder.register("wants_any", world.num_wants_any, dtype=np.int64)
 
     for i in range(0, customer_population):
         customer = Customer(id=i, world=world)
         world.add_agent(customer)
 
+    if args.network != "uniform":
+        world.use_contact_network(
+            build_network(
+                args.network,
+                customer_population,
+                mean_degree=args.mean_degree,
+                # a child of the seed, so the graph's draws are not those of `rng`
+                seed=random.SeedSequence(args.seed).spawn(1)[0],
+                edge_list=args.edge_list,
+            )
+        )
+
+    if profiler is not None:
+        profiler.attach(world)
+
     for i in range(0, simulation_length):  # model time unit is days bc i said it is
         world.tick()
         print(f"Day {world.now()}")
@@ -33,18 +93,23 @@ if __name__ == "__main__":
         )
 
         print(
-            f"Potential users: {world._num_potential_users},\n Wanting A: {world._num_wants[ProductEnum.A]}, Using A: {world._num_uses[ProductEnum.A]},\n Wanting B: {world._num_wants[ProductEnum.B]}, Using B: {world._num_uses[ProductEnum.B], }\n Wanting Any: {world._num_wants_any}"
+            f"Potential users: {world.num_potential_users()},\n Wanting A: {world.num_wants(ProductEnum.A)}, Using A: {world.num_uses(ProductEnum.A)},\n Wanting B: {world.num_wants(ProductEnum.B)}, Using B: {world.num_uses(ProductEnum.B)}\n Wanting Any: {world.num_wants_any()}"
         )
 
-        results["day"].append(world.now())
-        results["wants_A"].append(world._num_wants[ProductEnum.A])
-        results["uses_A"].append(world._num_uses[ProductEnum.A])
-        results["wants_B"].append(world._num_wants[ProductEnum.B])
-        results["uses_B"].append(world._num_uses[ProductEnum.B])
-        results["wants_any"].append(world._num_wants_any)
+        recorder.record(world.now())
 
         world.call_next(rng)
 
+    if profiler is not None:
+        print(profiler.format_summary())
+        if args.profile_output is not None:
+            profiler.write_summary(args.profile_output)
+            print(f"Profile summary written to {args.profile_output}")
+        if args.trace is not None:
+            profiler.write_trace(args.trace)
+            print(f"Trace written to {args.trace}")
+
+    results = recorder.columns()
     plt.stackplot(
         results["day"],
         results["uses_A"],
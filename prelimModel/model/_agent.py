@@ -12,6 +12,7 @@ class AgentEnum(str, Enum):  # what does that mean 'enumeration'?
 
 
 class BaseAgent:
+    __slots__ = ("_world", "_id", "_type", "_state")  # no per-instance __dict__
     _world: World
     _id: int
     _type: AgentEnum
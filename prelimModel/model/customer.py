@@ -1,5 +1,5 @@
 from __future__ import annotations
-from enum import Enum
+from enum import IntEnum
 from typing import TYPE_CHECKING
 from ._agent import AgentEnum, BaseAgent
 from .message import Message, MessageType
@@ -15,13 +15,14 @@ if TYPE_CHECKING:
     from .world import World
 
 
-class CustomerStatesEnum(str, Enum):
-    POTENTIAL_USER = "potential_user"
-    WANTS_A = "wants_A"
-    USES_A = "uses_A"
-    WANTS_B = "wants_B"
-    USES_B = "uses_B"
-    WANTS_ANY = "wants_any"
+# small-int codes, they compare and index as plain ints
+class CustomerStatesEnum(IntEnum):
+    POTENTIAL_USER = 0
+    WANTS_A = 1
+    USES_A = 2
+    WANTS_B = 3
+    USES_B = 4
+    WANTS_ANY = 5
 
 
 product_params = {
@@ -43,8 +44,35 @@ product_params = {
     },
 }
 
+# flat aliases and per-product tables for the hot paths below, where Enum attribute lookups
+# and nested product_params lookups cost more than the work they guard
+POTENTIAL_USER = CustomerStatesEnum.POTENTIAL_USER
+WANTS_A = CustomerStatesEnum.WANTS_A
+USES_A = CustomerStatesEnum.USES_A
+WANTS_B = CustomerStatesEnum.WANTS_B
+USES_B = CustomerStatesEnum.USES_B
+WANTS_ANY = CustomerStatesEnum.WANTS_ANY
+WANTS_STATE = tuple(product_params[product]["wants_state"] for product in ProductEnum)
+USES_STATE = tuple(product_params[product]["uses_state"] for product in ProductEnum)
+LIFESPAN = tuple(product_params[product]["lifespan"] for product in ProductEnum)
+ADVERTISING_EFFECTIVENESS = tuple(
+    product_params[product]["advertising_effectiveness"] for product in ProductEnum
+)
+WOM_THRESHOLD = tuple(
+    product_params[product]["wom_threshold"] for product in ProductEnum
+)
+BUY_MESSAGE = tuple(product_params[product]["buy_message"] for product in ProductEnum)
+WANTED_PRODUCT = {WANTS_STATE[product]: product for product in ProductEnum}
+USED_PRODUCT = {USES_STATE[product]: product for product in ProductEnum}
+
 
 class Customer(BaseAgent):
+    __slots__ = (
+        "_delivery_day",
+        "_end_of_life_day",
+        "_end_of_patience_day",
+        "_active_product",
+    )
     _state: CustomerStatesEnum
     _delivery_day: int
     _end_of_life_day: int
@@ -60,121 +88,77 @@ class Customer(BaseAgent):
         super().__init__(id=id, type=AgentEnum.CUSTOMER, world=world)
 
     def next(self, rng):
-        match self._state:
-            case CustomerStatesEnum.POTENTIAL_USER:
-                # this section is needed to avoid bias towards one product by always checking that first
+        state = self._state
+        if state == POTENTIAL_USER:
+            # this section is needed to avoid bias towards one product by always checking that first
+            productsToConsider = [ProductEnum.A, ProductEnum.B]
+            self._world.stream(rng, "shuffle", self._id).shuffle(productsToConsider)
+            for product in productsToConsider:
+                if (
+                    self._world.stream(rng, "advertising", self._id).random()
+                    < ADVERTISING_EFFECTIVENESS[product]
+                ):  # if a potential user is successfully influenced by ads
+                    self.try_and_buy(rng, product)
+                    break
+
+        elif state == WANTS_A or state == WANTS_B:
+            product = WANTED_PRODUCT[state]
+            if self._delivery_day != -1:
+                if self._world.now() == self._delivery_day:
+                    self.become_user(rng, product)
+            else:
+                if self._world._retailer_stock[product] >= 1:
+                    self._world.confirm_order(product)
+                    if delivery_time == 0:
+                        self.become_user(rng, product)
+                    else:
+                        self._delivery_day = self._world.now() + delivery_time
+                elif self._world._retailer_stock[product] < 1:
+                    if (
+                        self._end_of_patience_day != -1
+                        and self._world.now() == self._end_of_patience_day
+                    ):
+                        self.set_state(WANTS_ANY)
+                        self._end_of_patience_day = -1
+                        self._active_product = None
+
+        elif state == WANTS_ANY:
+            if self._active_product != None:
+                if self._world.now() == self._delivery_day:
+                    self.become_user(rng, self._active_product)
+            else:
                 productsToConsider = [ProductEnum.A, ProductEnum.B]
-                rng.shuffle(productsToConsider)
+                self._world.stream(rng, "shuffle", self._id).shuffle(productsToConsider)
                 for product in productsToConsider:
-                    if (
-                        rng.random()
-                        < product_params[product]["advertising_effectiveness"]
-                    ):  # if a potential user is successfully influenced by ads
-                        self.try_and_buy(rng, product)
-                        break
-
-            case CustomerStatesEnum.WANTS_A:
-                if self._delivery_day != -1:
-                    if self._world.now() == self._delivery_day:
-                        self.become_user(rng, ProductEnum.A)
-                else:
-                    if self._world._retailer_stock[ProductEnum.A] >= 1:
-                        self._world.confirm_order(ProductEnum.A)
+                    if self._world._retailer_stock[product] >= 1:
+                        self._world.confirm_order(product)
                         if delivery_time == 0:
-                            self.become_user(rng, ProductEnum.A)
+                            self.become_user(rng, product)
                         else:
+                            self._active_product = product
                             self._delivery_day = self._world.now() + delivery_time
-                    elif self._world._retailer_stock[ProductEnum.A] < 1:
-                        if (
-                            self._end_of_patience_day != -1
-                            and self._world.now() == self._end_of_patience_day
-                        ):
-                            self._state = CustomerStatesEnum.WANTS_ANY
-                            self._end_of_patience_day = -1
-                            self._active_product = None
-
-            case CustomerStatesEnum.WANTS_B:
-                if self._delivery_day != -1:
-                    if self._world.now() == self._delivery_day:
-                        self.become_user(rng, ProductEnum.B)
-                else:
-                    if self._world._retailer_stock[ProductEnum.B] >= 1:
-                        self._world.confirm_order(ProductEnum.B)
-                        if delivery_time == 0:
-                            self.become_user(rng, ProductEnum.B)
-                        else:
-                            self._delivery_day = self._world.now() + delivery_time
-                    elif self._world._retailer_stock[ProductEnum.B] < 1:
-                        if (
-                            self._end_of_patience_day != -1
-                            and self._world.now() == self._end_of_patience_day
-                        ):
-                            self._state = CustomerStatesEnum.WANTS_ANY
-                            self._end_of_patience_day = -1
-                            self._active_product = None
-
-            case CustomerStatesEnum.WANTS_ANY:
-                if self._active_product != None:
-                    if self._world.now() == self._delivery_day:
-                        self.become_user(rng, self._active_product)
-                else:
-                    productsToConsider = [ProductEnum.A, ProductEnum.B]
-                    rng.shuffle(productsToConsider)
-                    for product in productsToConsider:
-                        if self._world._retailer_stock[product] >= 1:
-                            self._world.confirm_order(product)
-                            if delivery_time == 0:
-                                self.become_user(rng, product)
-                            else:
-                                self._active_product = product
-                                self._delivery_day = self._world.now() + delivery_time
-                            break
-
-            case CustomerStatesEnum.USES_A:
-                if self._world.now() == self._end_of_life_day:
-                    self._state = product_params[ProductEnum.A]["wants_state"]
-                    self._end_of_life_day = -1
-                else:
-                    for _ in range(contact_per_day):
-                        if (
-                            rng.random()
-                            < product_params[ProductEnum.A]["wom_threshold"]
-                        ):
-                            recipient_id = self._world.get_random_agent_id(
-                                exclude_id=self._id
-                            )
-                            if (
-                                recipient_id != -1
-                            ):  # checks if there is someone to send to
-                                message = Message(
-                                    sender_id=self._id,
-                                    recipient_id=recipient_id,
-                                    content=MessageType.BUY_A,
-                                )
-                                self._world.recieve_message(message)
-
-            case CustomerStatesEnum.USES_B:
-                if self._world.now() == self._end_of_life_day:
-                    self._state = product_params[ProductEnum.B]["wants_state"]
-                    self._end_of_life_day = -1
-                else:
-                    for _ in range(contact_per_day):
-                        if (
-                            rng.random()
-                            < product_params[ProductEnum.B]["wom_threshold"]
-                        ):
-                            recipient_id = self._world.get_random_agent_id(
-                                exclude_id=self._id
-                            )
-                            if (
-                                recipient_id != -1
-                            ):  # checks if there is someone to send to
-                                message = Message(
-                                    sender_id=self._id,
-                                    recipient_id=recipient_id,
-                                    content=MessageType.BUY_B,
-                                )
-                                self._world.recieve_message(message)
+                        break
+
+        elif state == USES_A or state == USES_B:
+            product = USED_PRODUCT[state]
+            if self._world.now() == self._end_of_life_day:
+                self.set_state(WANTS_STATE[product])
+                self._end_of_life_day = -1
+            else:
+                # each of the day's contacts passes the word on with probability wom_threshold
+                contacts = self._world.stream(rng, "word_of_mouth", self._id).binomial(
+                    contact_per_day, WOM_THRESHOLD[product]
+                )
+                if contacts > 0:
+                    self._world.spread_word_of_mouth(
+                        self._id, int(contacts), BUY_MESSAGE[product]
+                    )
+
+    def set_state(self, state: CustomerStatesEnum):
+        # every transition is reported so the world can keep its counts without rescanning
+        if state != self._state:
+            self._world.record_state_change(self._state, state)
+            self._state = state
 
     def try_and_buy(self, rng, product: ProductEnum):
         if self._world._retailer_stock[product] >= 1:
@@ -182,35 +166,31 @@ class Customer(BaseAgent):
             if delivery_time == 0:  # checking if delivery is instant
                 self.become_user(rng, product)
             else:
-                self._state = product_params[product]["wants_state"]
+                self.set_state(WANTS_STATE[product])
                 self._active_product = product
                 self._delivery_day = self._world.now() + delivery_time
         else:
-            self._state = product_params[product]["wants_state"]
+            self.set_state(WANTS_STATE[product])
             self._active_product = product
             self._end_of_patience_day = self._world.now() + patience
 
     def become_user(self, rng, product: ProductEnum):
-        self._state = product_params[product]["uses_state"]
+        self.set_state(USES_STATE[product])
         self._active_product = product
         self._delivery_day = -1
         self._end_of_patience_day = -1
 
-        lifespan_range = product_params[product]["lifespan"]
-        lifespan = rng.integers(*lifespan_range)
+        lifespan_range = LIFESPAN[product]
+        lifespan = self._world.stream(rng, "lifespan", self._id).integers(
+            *lifespan_range
+        )
         self._end_of_life_day = self._world.now() + lifespan
 
     def state(self):
         return self._state
 
     def handle_message(self, message: Message, rng):
-        if (
-            self._state == CustomerStatesEnum.POTENTIAL_USER
-            and message.content == MessageType.BUY_A
-        ):
+        if self._state == POTENTIAL_USER and message.content == MessageType.BUY_A:
             self.try_and_buy(rng, ProductEnum.A)
-        elif (
-            self._state == CustomerStatesEnum.POTENTIAL_USER
-            and message.content == MessageType.BUY_B
-        ):
+        elif self._state == POTENTIAL_USER and message.content == MessageType.BUY_B:
             self.try_and_buy(rng, ProductEnum.B)
@@ -0,0 +1,196 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import numpy as np
+
+GRAPHS = ["erdos_renyi", "watts_strogatz", "barabasi_albert", "edge_list"]
+network_cache_directory: str = ".network_cache"
+rewire_probability: float = 0.1  # Watts-Strogatz
+
+
+class ContactNetwork:
+    """Undirected contact graph stored as compressed sparse rows.
+
+    The neighbours of node i are neighbours[offsets[i]:offsets[i + 1]]. Nodes are agent ids
+    0..n-1. Built from edge arrays without any per-node Python objects, so 10^6 nodes with
+    ~10 contacts each take a few hundred MB while building and ~50 MB afterwards.
+    """
+
+    _offsets: np.ndarray  # (n + 1,) int64
+    _neighbours: np.ndarray  # (2 * edges,) int32
+
+    def __init__(self, offsets: np.ndarray, neighbours: np.ndarray) -> None:
+        self._offsets = offsets
+        self._neighbours = neighbours
+
+    @classmethod
+    def from_edges(
+        cls, size: int, sources: np.ndarray, targets: np.ndarray
+    ) -> ContactNetwork:
+        """Symmetrises the edges and drops self-loops and duplicates."""
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        keep = sources != targets
+        sources, targets = sources[keep], targets[keep]
+        # one sorted key per directed edge gives the CSR order and exposes duplicates
+        keys = np.concatenate([sources * size + targets, targets * size + sources])
+        del sources, targets
+        keys.sort()  # in place, np.unique would need another copy
+        first = np.ones(len(keys), dtype=bool)
+        np.not_equal(keys[1:], keys[:-1], out=first[1:])
+        keys = keys[first]
+        rows = keys // size
+        offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=size), out=offsets[1:])
+        return cls(offsets, (keys % size).astype(np.int32))
+
+    @classmethod
+    def load(cls, path: str) -> ContactNetwork:
+        with np.load(path) as arrays:
+            return cls(arrays["offsets"], arrays["neighbours"])
+
+    def save(self, path: str):
+        np.savez(path, offsets=self._offsets, neighbours=self._neighbours)
+
+    def size(self) -> int:
+        return len(self._offsets) - 1
+
+    def num_edges(self) -> int:
+        return len(self._neighbours) // 2
+
+    def degrees(self) -> np.ndarray:
+        return np.diff(self._offsets)
+
+    def neighbours(self, node: int) -> np.ndarray:
+        return self._neighbours[self._offsets[node] : self._offsets[node + 1]]
+
+    def sample(self, rng, exclude_id: int) -> int:
+        return int(self.sample_many(rng, np.array([exclude_id]))[0])
+
+    def sample_many(self, rng, senders: np.ndarray) -> np.ndarray:
+        """One random neighbour per entry of `senders`, -1 for nodes without any."""
+        senders = np.asarray(senders, dtype=np.int64)
+        start = self._offsets[senders]
+        degree = self._offsets[senders + 1] - start
+        picks = (rng.random(len(senders)) * degree).astype(np.int64)
+        recipients = np.full(len(senders), -1, dtype=np.int64)
+        connected = degree > 0
+        recipients[connected] = self._neighbours[start[connected] + picks[connected]]
+        return recipients
+
+
+def erdos_renyi(size: int, mean_degree: float, rng) -> ContactNetwork:
+    """G(n, p) with p = mean_degree / (n - 1), drawn as a binomial number of random pairs."""
+    pairs = size * (size - 1) // 2
+    edges = rng.binomial(pairs, min(mean_degree / max(size - 1, 1), 1.0))
+    sources = rng.integers(size, size=edges)
+    targets = rng.integers(size, size=edges)
+    return ContactNetwork.from_edges(size, sources, targets)
+
+
+def watts_strogatz(size: int, mean_degree: int, rng) -> ContactNetwork:
+    """Ring lattice joining each node to its mean_degree nearest nodes, each edge rewired
+    to a random target with rewire_probability."""
+    nodes = np.arange(size, dtype=np.int64)
+    sources = np.tile(nodes, mean_degree // 2)
+    targets = (sources + np.repeat(np.arange(1, mean_degree // 2 + 1), size)) % size
+    rewired = rng.random(len(targets)) < rewire_probability
+    targets[rewired] = rng.integers(size, size=int(rewired.sum()))
+    return ContactNetwork.from_edges(size, sources, targets)
+
+
+def barabasi_albert(size: int, mean_degree: int, rng) -> ContactNetwork:
+    """Preferential attachment, each new node bringing m = mean_degree // 2 edges.
+
+    Picking a uniformly random endpoint of the earlier edges picks a node in proportion to its
+    degree. An endpoint is either the earlier edge's source, known up front, or its target,
+    itself a random pick. All picks are drawn at once and chains of picks are resolved by
+    pointer jumping, so the whole graph takes O(E log E) array work.
+    """
+    m = max(mean_degree // 2, 1)
+    if size <= m:
+        raise ValueError(f"barabasi_albert needs more than {m} nodes. Received: {size}")
+    num_edges = (size - m) * m
+    edges = np.arange(num_edges, dtype=np.int64)
+    sources = m + edges // m
+    first_edge = (edges // m) * m  # the first edge of the node that brings edge e
+
+    targets = np.full(num_edges, -1, dtype=np.int64)
+    targets[:m] = np.arange(m)  # node m joins the m seed nodes
+    picks = (rng.random(num_edges) * 2 * first_edge).astype(np.int64)
+    from_source = (picks % 2 == 0) & (edges >= m)
+    targets[from_source] = sources[picks[from_source] // 2]
+    pointer = np.where(targets == -1, picks // 2, edges)
+
+    unresolved = np.flatnonzero(targets == -1)
+    while len(unresolved) > 0:
+        known = targets[pointer[unresolved]]
+        found = known != -1
+        targets[unresolved[found]] = known[found]
+        unresolved = unresolved[~found]
+        pointer[unresolved] = pointer[pointer[unresolved]]
+    return ContactNetwork.from_edges(size, sources, targets)
+
+
+def read_edge_list(path: str, size: int | None = None) -> ContactNetwork:
+    """Whitespace separated 'source target' lines, '#' starts a comment."""
+    edges = np.loadtxt(path, dtype=np.int64, comments="#", ndmin=2)
+    if size is None:
+        size = int(edges.max()) + 1 if len(edges) else 0
+    return ContactNetwork.from_edges(size, edges[:, 0], edges[:, 1])
+
+
+def build_network(
+    kind: str,
+    size: int,
+    mean_degree: int = 10,
+    seed: int | np.random.SeedSequence = 1,
+    edge_list: str | None = None,
+    cache_directory: str | None = network_cache_directory,
+) -> ContactNetwork:
+    """Generates or reads a contact network, reusing the copy cached on disk if there is one."""
+    if kind not in GRAPHS:
+        raise ValueError(f"kind must be one of {GRAPHS}. Received: {kind}")
+    if kind == "edge_list" and edge_list is None:
+        raise ValueError("An edge list file is needed for kind='edge_list'")
+
+    description = {"kind": kind, "size": size}
+    if kind == "edge_list":
+        status = os.stat(edge_list)
+        description.update(
+            path=os.path.abspath(edge_list),
+            modified=status.st_mtime_ns,
+            bytes=status.st_size,
+        )
+    else:
+        if isinstance(seed, np.random.SeedSequence):
+            seed_key = {"entropy": seed.entropy, "spawn_key": list(seed.spawn_key)}
+        else:
+            seed_key = seed
+        description.update(mean_degree=mean_degree, seed=seed_key)
+        if kind == "watts_strogatz":
+            description["rewire_probability"] = rewire_probability
+    key = hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    path = None
+    if cache_directory is not None:
+        path = os.path.join(cache_directory, f"{kind}_{size}_{key[:16]}.npz")
+        if os.path.exists(path):
+            return ContactNetwork.load(path)
+
+    rng = np.random.default_rng(seed)
+    match kind:
+        case "erdos_renyi":
+            network = erdos_renyi(size, mean_degree, rng)
+        case "watts_strogatz":
+            network = watts_strogatz(size, mean_degree, rng)
+        case "barabasi_albert":
+            network = barabasi_albert(size, mean_degree, rng)
+        case "edge_list":
+            network = read_edge_list(edge_list, size)
+
+    if path is not None:
+        os.makedirs(cache_directory, exist_ok=True)
+        network.save(path)
+    return network
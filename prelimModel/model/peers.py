@@ -0,0 +1,50 @@
+from __future__ import annotations
+import numpy as np
+
+
+class PeerSampler:
+    """Draws uniformly random contacts for word-of-mouth from a contiguous array of agent ids.
+
+    A draw picks one of the other n-1 slots and steps over the sender's own slot, so it is
+    O(1) and never needs to retry. Randomness comes from the simulation's Generator.
+    """
+
+    _ids: np.ndarray  # agent ids, only the first _size entries are used
+    _size: int
+    _index: dict[int, int]  # agent id -> slot in _ids
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._size = 0
+        self._index = {}
+
+    def add(self, id: int):
+        if self._size == len(self._ids):
+            self._ids = np.resize(self._ids, 2 * len(self._ids))  # grows geometrically
+        self._ids[self._size] = id
+        self._index[id] = self._size
+        self._size += 1
+
+    def size(self) -> int:
+        return self._size
+
+    def sample(self, rng, exclude_id: int) -> int:
+        """One random agent id other than `exclude_id`, or -1 if there is nobody else."""
+        if self._size < 2:
+            return -1
+        slot = int(rng.integers(self._size - 1))
+        if slot >= self._index[exclude_id]:
+            slot += 1
+        return int(self._ids[slot])
+
+    def sample_many(self, rng, senders: np.ndarray) -> np.ndarray:
+        """One random peer per entry of `senders` (ids may repeat), all drawn in one call."""
+        senders = np.asarray(senders, dtype=np.int64)
+        if self._size < 2:
+            return np.full(len(senders), -1, dtype=np.int64)
+        own_slots = np.fromiter(
+            (self._index[id] for id in senders), dtype=np.int64, count=len(senders)
+        )
+        slots = rng.integers(self._size - 1, size=len(senders))
+        slots += slots >= own_slots
+        return self._ids[slots]
@@ -1,6 +1,6 @@
-from enum import Enum
+from enum import IntEnum
 
 
-class ProductEnum(str, Enum):
-    A = "product_a"
-    B = "product_b"
+class ProductEnum(IntEnum):  # small-int codes that index the per-product lookup tables
+    A = 0
+    B = 1
@@ -0,0 +1,72 @@
+from __future__ import annotations
+from typing import Callable
+import numpy as np
+
+
+class Recorder:
+    """Columnar store for daily metrics, preallocated for the whole run.
+
+    Metrics are registered once as name -> zero-argument sampling function, then `record` is
+    called every day and keeps every `stride`-th day (days 1, 1 + stride, ...). Nothing is
+    allocated per sample, and `column`/`columns` hand out views rather than copies.
+    """
+
+    _stride: int
+    _capacity: int
+    _size: int
+    _metrics: dict[str, Callable[[], float]]
+    _columns: dict[str, np.ndarray]
+
+    def __init__(self, days: int, stride: int = 1) -> None:
+        if stride < 1:
+            raise ValueError(f"stride must be >=1. Received: {stride}")
+        self._stride = stride
+        self._capacity = Recorder.samples_for(days, stride)
+        self._size = 0
+        self._metrics = {}
+        self._columns = {}
+
+    @staticmethod
+    def samples_for(days: int, stride: int) -> int:
+        return -(-days // stride)  # ceiling division
+
+    def register(self, name: str, sample: Callable[[], float], dtype=np.float64):
+        if self._size > 0:
+            raise RuntimeError(f"Cannot register '{name}' after recording has started")
+        self._metrics[name] = sample
+        self._columns[name] = np.zeros(self._capacity, dtype=dtype)
+
+    def bind(self, name: str, sample: Callable[[], float]):
+        """Points an already registered metric at a new sampling function, e.g. after unpickling."""
+        if name not in self._columns:
+            raise KeyError(f"No metric named '{name}' is registered")
+        self._metrics[name] = sample
+
+    def __getstate__(self) -> dict:
+        # sampling functions close over live objects and are rebound by the owner on load
+        state = self.__dict__.copy()
+        state["_metrics"] = dict.fromkeys(self._metrics)
+        return state
+
+    def record(self, day: int):
+        if (day - 1) % self._stride != 0:
+            return
+        if self._size == self._capacity:
+            raise IndexError(f"Recorder is full after {self._capacity} samples")
+        for name, sample in self._metrics.items():
+            self._columns[name][self._size] = sample()
+        self._size += 1
+
+    def stride(self) -> int:
+        return self._stride
+
+    def size(self) -> int:
+        return self._size
+
+    def column(self, name: str) -> np.ndarray:
+        view = self._columns[name][: self._size]
+        view.flags.writeable = False
+        return view
+
+    def columns(self) -> dict[str, np.ndarray]:
+        return {name: self.column(name) for name in self._columns}
@@ -0,0 +1,47 @@
+from __future__ import annotations
+import numpy as np
+
+# what each substream is drawn for, its index is part of the substream's spawn key
+PURPOSES = ["advertising", "shuffle", "lifespan", "word_of_mouth", "peers"]
+
+
+class RandomStreams:
+    """Dedicated random substreams per purpose and per agent, all derived from one seed.
+
+    With a single Generator every draw depends on how many numbers the agents before it took,
+    so the result is tied to the order agents are stepped in. Here agent i's k-th lifespan or
+    ad draw is the same number however the agents are ordered or split into shards. Outcomes
+    can still depend on the order where agents compete, e.g. for the last unit in stock.
+
+    Streams are spawned lazily from `seed` with spawn key (purpose, agent id + 1), so they do
+    not depend on the order agents first draw in. The world draws word-of-mouth recipients
+    for everyone at once, under the id -1.
+    """
+
+    _seed: np.random.SeedSequence
+    _streams: dict[tuple[str, int], np.random.Generator]
+
+    def __init__(self, seed: int | np.random.SeedSequence) -> None:
+        self._seed = (
+            seed
+            if isinstance(seed, np.random.SeedSequence)
+            else np.random.SeedSequence(seed)
+        )
+        self._streams = {}
+
+    def get(self, purpose: str, agent_id: int) -> np.random.Generator:
+        stream = self._streams.get((purpose, agent_id))
+        if stream is None:
+            if purpose not in PURPOSES:
+                raise ValueError(
+                    f"purpose must be one of {PURPOSES}. Received: {purpose}"
+                )
+            # agent id + 1 so the world's id of -1 gives a valid spawn key
+            seed = np.random.SeedSequence(
+                self._seed.entropy,
+                spawn_key=self._seed.spawn_key
+                + (PURPOSES.index(purpose), agent_id + 1),
+            )
+            stream = np.random.default_rng(seed)
+            self._streams[(purpose, agent_id)] = stream
+        return stream
@@ -2,8 +2,10 @@ from __future__ import annotations
 from collections import Counter
 from typing import TYPE_CHECKING
 from model._agent import AgentEnum, BaseAgent
-import random
-from .message import Message
+import numpy as np
+from .message import MESSAGE_CODE, Message, MessageBus, MessageType
+from .network import ContactNetwork
+from .peers import PeerSampler
 from . import customer
 from .product import ProductEnum
 
@@ -19,6 +21,8 @@ delivery_delay: int = (
 
 if TYPE_CHECKING:
     from .customer import Customer, CustomerStatesEnum
+    from .instrumentation import Profiler
+    from .streams import RandomStreams
 
 
 class World:
@@ -28,13 +32,17 @@ class World:
     _retailer_stock: dict[ProductEnum, float]
     _factory_stock: dict[ProductEnum, float]
     _production_rate: dict[ProductEnum, float]
-    _num_potential_users: int
-    _num_wants_any: int
-    _num_wants: dict[ProductEnum, int]
-    _num_uses: dict[ProductEnum, int]
-    _message_queue: list[Message]
-
-    def __init__(self) -> None:
+    _state_counts: list[int]  # customers per state, indexed by CustomerStatesEnum code
+    _message_bus: MessageBus
+    _peers: PeerSampler | ContactNetwork  # who word-of-mouth can reach
+    _wom_senders: list[int]  # one entry per word-of-mouth contact requested this tick
+    _wom_contents: list[int]  # MESSAGE_CODE codes
+    _debug_state_counts: (
+        bool  # recount every tick and compare against the running tallies
+    )
+    _streams: RandomStreams | None  # None: every draw comes from the rng passed in
+
+    def __init__(self, debug_state_counts: bool = False) -> None:
         self._now = 0
         self._agents = {}
         self._agents_by_type = {AgentEnum.CUSTOMER: []}
@@ -47,61 +55,89 @@ class World:
             ProductEnum.B: inital_factory_stock_B,
         }
         self._production_rate = {ProductEnum.A: 0, ProductEnum.B: 0}
-        self._num_potential_users = 0
-        self._num_wants_any = 0
-        self._num_wants = {ProductEnum.A: 0, ProductEnum.B: 0}
-        self._num_uses = {ProductEnum.A: 0, ProductEnum.B: 0}
-        self._message_queue = []
+        self._state_counts = [0] * len(customer.CustomerStatesEnum)
+        self._message_bus = MessageBus()
+        self._peers = PeerSampler()
+        self._wom_senders = []
+        self._wom_contents = []
+        self._debug_state_counts = debug_state_counts
+        self._profiler = None
+        self._streams = None
 
     def tick(self) -> None:
         self._now += 1
-        self.update_customer_state_counts()
+        if self._debug_state_counts:
+            self.verify_customer_state_counts()
 
     def now(self) -> int:
         return self._now
 
+    def num_potential_users(self) -> int:
+        return self._state_counts[customer.POTENTIAL_USER]
+
+    def num_wants(self, product: ProductEnum) -> int:
+        return self._state_counts[customer.WANTS_STATE[product]]
+
+    def num_uses(self, product: ProductEnum) -> int:
+        return self._state_counts[customer.USES_STATE[product]]
+
+    def num_wants_any(self) -> int:
+        return self._state_counts[customer.WANTS_ANY]
+
     def add_agent(self, agent: BaseAgent):
         if agent.id() in self._agents:
             exit(f"Agent with id already exists. Received: {agent.id}")
         self._agents[agent.id()] = agent
         self._agents_by_type[agent.type()].append(agent.id())
+        self._peers.add(agent.id())
+        if agent.type() == AgentEnum.CUSTOMER:
+            self.record_state_change(None, agent.state())
 
     def call_next(self, rng):
         self.update_production()
         self.deliver_to_retailer()
-        for _, agent in self._agents.items():
-            agent.next(rng)
+        if self._profiler is not None:
+            self._profiler.call_agents(self, self._agents.values(), rng, schedule=False)
+        else:
+            for _, agent in self._agents.items():
+                agent.next(rng)
         self.process_messages(rng)
 
-    def update_customer_state_counts(self):
-        from .customer import CustomerStatesEnum
-
-        self._num_wants = {product: 0 for product in ProductEnum}
-        self._num_uses = {product: 0 for product in ProductEnum}
-        potential_users = 0
-        users_wanting_any = 0
-
+    def record_state_change(
+        self,
+        old_state: CustomerStatesEnum | None,
+        new_state: CustomerStatesEnum,
+        count: int = 1,
+    ):
+        """Moves `count` customers between states in the running tallies (O(1) per call)."""
+        if self._profiler is not None:
+            self._profiler.count_transition(old_state, new_state, count)
+        if old_state is not None:
+            self._state_counts[old_state] -= count
+        self._state_counts[new_state] += count
+
+    def count_customer_states(self) -> dict[CustomerStatesEnum, int]:
+        """Full O(N) recount of customer states, only used to check the running tallies."""
+        counts = {state: 0 for state in customer.CustomerStatesEnum}
         for agent in self._agents.values():
             if isinstance(agent, customer.Customer):
-                if agent.state() == CustomerStatesEnum.POTENTIAL_USER:
-                    potential_users += 1
-                elif agent.state() == CustomerStatesEnum.WANTS_A:
-                    self._num_wants[ProductEnum.A] += 1
-                elif agent.state() == CustomerStatesEnum.WANTS_B:
-                    self._num_wants[ProductEnum.B] += 1
-                elif agent.state() == CustomerStatesEnum.USES_A:
-                    self._num_uses[ProductEnum.A] += 1
-                elif agent.state() == CustomerStatesEnum.USES_B:
-                    self._num_uses[ProductEnum.B] += 1
-                elif agent.state() == CustomerStatesEnum.WANTS_ANY:
-                    users_wanting_any += 1
-        self._num_potential_users = potential_users
-        self._num_wants_any = users_wanting_any
+                counts[agent.state()] += 1
+        return counts
+
+    def verify_customer_state_counts(self):
+        counts = self.count_customer_states()
+        tallies = {
+            state: self._state_counts[state] for state in customer.CustomerStatesEnum
+        }
+        if counts != tallies:
+            raise RuntimeError(
+                f"Customer state tallies drifted on day {self._now}. Recount: {counts}, tallies: {tallies}"
+            )
 
     def update_production(self):
         for product in ProductEnum:
             self._production_rate[product] = (
-                self._num_wants[product] + self._num_wants_any
+                self.num_wants(product) + self.num_wants_any()
             )
             self._factory_stock[product] += self._production_rate[product]
             print(
@@ -127,17 +163,63 @@ class World:
         self._retailer_stock[product] = self._retailer_stock[product] - 1
 
     def recieve_message(self, message: Message):
-        self._message_queue.append(message)
-
-    def get_random_agent_id(self, exclude_id: int) -> int:
-        agent_ids = [id for id in self._agents.keys() if id != exclude_id]
-        if not agent_ids:
-            return -1  # No other agents to send to
-        return random.choice(agent_ids)
+        self._message_bus.post(message.sender_id, message.recipient_id, message.content)
+
+    def use_contact_network(self, network: ContactNetwork):
+        """Word-of-mouth then only reaches a user's neighbours instead of anyone at random."""
+        if (
+            network.size() != len(self._agents)
+            or max(self._agents) != network.size() - 1
+        ):
+            raise ValueError(
+                f"The network needs one node per agent with ids 0..{len(self._agents) - 1}. Received {network.size()} nodes"
+            )
+        self._peers = network
+
+    def use_random_streams(self, streams: RandomStreams):
+        """Agents then draw from dedicated substreams instead of the rng they are given."""
+        self._streams = streams
+
+    def stream(self, rng, purpose: str, agent_id: int):
+        """The Generator an agent should draw from for `purpose`, see RandomStreams."""
+        if self._streams is None:
+            return rng
+        stream = self._streams.get(purpose, agent_id)
+        if self._profiler is not None:
+            return self._profiler.counting(stream)
+        return stream
+
+    def get_random_agent_id(self, rng, exclude_id: int) -> int:
+        return self._peers.sample(rng, exclude_id)  # -1 if there is no one to send to
+
+    def spread_word_of_mouth(self, sender_id: int, contacts: int, content: MessageType):
+        """Queues `contacts` messages from a user to random peers, drawn together at the end of the tick."""
+        self._wom_senders.extend([sender_id] * contacts)
+        self._wom_contents.extend([MESSAGE_CODE[content]] * contacts)
+
+    def deliver_word_of_mouth(self, rng):
+        if not self._wom_senders:
+            return
+        senders = np.array(self._wom_senders, dtype=np.int64)
+        recipients = self._peers.sample_many(self.stream(rng, "peers", -1), senders)
+        reached = recipients != -1  # checks if there is someone to send to
+        self._message_bus.post_many(
+            senders[reached],
+            recipients[reached],
+            np.array(self._wom_contents, dtype=np.int8)[reached],
+        )
+        self._wom_senders.clear()
+        self._wom_contents.clear()
 
     def process_messages(self, rng):
-        for message in self._message_queue:
+        self.deliver_word_of_mouth(rng)
+        if len(self._message_bus) == 0:
+            return
+        # customers only act on a buy message while they are potential users and always leave
+        # that state when they do, so later messages to the same recipient in a tick are no-ops
+        first = self._message_bus.first_per_recipient()
+        for message in self._message_bus.messages(first):
             recipient = self._agents.get(message.recipient_id)
             if recipient:
                 recipient.handle_message(message, rng)
-        self._message_queue.clear()
+        self._message_bus.clear()